@@ -1,12 +1,29 @@
-from flask import Flask, request, jsonify, send_from_directory, abort
+from flask import Flask, Response, request, jsonify, send_from_directory, abort, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import safe_join
 import os
+import json
+import functools
+import sqlite3
+import threading
 import traceback
 
 # Import the processing function you added to batball_video.py
 # Make sure batball_video.py contains process_video_for_highlight(...)
 from batball_video import process_video_for_highlight
+from model_registry import registry
+from preroll import PREROLL_MODES
+from replay import HIGHLIGHT_MODES
+from backends import BACKENDS, resolve_weights
+from parallel import process_video_parallel, unsupported_options
+from detection_cache import DetectionCache, replay_from_cache, file_hash
+from upload_store import UploadStore
+from chunked_upload import ChunkedUploads, UploadError, VIDEO_EXTENSIONS
+from media_index import MediaIndex, VIDEO_SORTS, CONTACT_SORTS, MAX_LIMIT
+from result_cache import ResultCache, result_key, output_config
+from delivery import DELIVERY_MODES
+from metrics import pipeline_metrics
+from jobs import JobManager, QueueFullError, DONE, FAILED, CANCELLED
 
 app = Flask(__name__)
 CORS(app)
@@ -22,17 +39,188 @@ os.makedirs(MODEL_FOLDER, exist_ok=True)
 BALL_MODEL = os.path.join(MODEL_FOLDER, "cricket_ball_detector.pt")
 BAT_MODEL = os.path.join(MODEL_FOLDER, "bestBat.pt")
 
+# detector inference backend: torch (.pt), onnx, openvino or openvino-int8
+# (exports made with `python export_models.py --backend ...`)
+DETECTOR_BACKEND = os.environ.get("DETECTOR_BACKEND", "torch")
+if DETECTOR_BACKEND not in BACKENDS:
+    raise ValueError(f"DETECTOR_BACKEND must be one of {', '.join(BACKENDS)}")
+if DETECTOR_BACKEND != "torch":
+    try:
+        BALL_MODEL = resolve_weights(BALL_MODEL, DETECTOR_BACKEND)
+        BAT_MODEL = resolve_weights(BAT_MODEL, DETECTOR_BACKEND)
+        print(f"[INFO] Detector backend: {DETECTOR_BACKEND}")
+    except FileNotFoundError as e:
+        print(f"[WARN] {e}; using the PyTorch models")
+        DETECTOR_BACKEND = "torch"
+
+# --- Highlight job queue ---
+# workers run process_video_for_highlight in the background; admission is
+# bounded so a burst of requests gets 429 instead of piling up
+HIGHLIGHT_WORKERS = int(os.environ.get("HIGHLIGHT_WORKERS", "1"))
+HIGHLIGHT_QUEUE_SIZE = int(os.environ.get("HIGHLIGHT_QUEUE_SIZE", "8"))
+# frames per ball-detector forward pass
+BALL_BATCH_SIZE = int(os.environ.get("BALL_BATCH_SIZE", "4"))
+# run decode / inference / encode as concurrent stages
+HIGHLIGHT_PIPELINED = os.environ.get("HIGHLIGHT_PIPELINED", "1") == "1"
+# default pre-roll mode: "ring" (frames kept in memory) or "seek" (re-decoded on contact)
+PREROLL_MODE = os.environ.get("PREROLL_MODE", "ring")
+# skip the ball detector on static frames (default off; ?motion_gate=1 per request)
+MOTION_GATE = os.environ.get("MOTION_GATE", "0") == "1"
+# run the detectors every k-th frame (tighter while the ball is in play); a
+# Kalman tracker fills the frames in between. 1 = detect every frame
+DETECT_STRIDE = int(os.environ.get("DETECT_STRIDE", "1"))
+ACTIVE_STRIDE = int(os.environ.get("ACTIVE_STRIDE", "1"))
+# ROI window side (640 space) used while the ball is tracked; 0 = full crop only
+ROI_SIZE = int(os.environ.get("ROI_SIZE", "0"))
+# split one video across this many worker processes (0/1 = single process)
+HIGHLIGHT_PARALLEL = int(os.environ.get("HIGHLIGHT_PARALLEL", "0"))
+# highlight assembly: "encode" re-encodes every frame, "copy" cuts it from the
+# source with ffmpeg stream copy (re-encodes if ffmpeg is missing or fails)
+HIGHLIGHT_MODE = os.environ.get("HIGHLIGHT_MODE", "encode")
+# finished highlight delivery: "hls" = faststart MP4 + 360p/720p HLS ladder
+# (needs ffmpeg, faststart only without it), "faststart" or "none"
+HIGHLIGHT_DELIVERY = os.environ.get("HIGHLIGHT_DELIVERY", "hls")
+# keep per-frame detections so /retune can re-cut highlights without inference
+DETECTION_CACHE = os.environ.get("DETECTION_CACHE", "1") == "1"
+detection_cache = DetectionCache(os.path.join(BASE_DIR, "cache", "detections")) if DETECTION_CACHE else None
+# uploads are stored once per content; finished highlights are reused for the
+# same (video, models, settings) until the cache passes RESULT_CACHE_MB (0 = off)
+upload_store = UploadStore(UPLOAD_FOLDER)
+RESULT_CACHE_MB = int(os.environ.get("RESULT_CACHE_MB", "2048"))
+result_cache = ResultCache(os.path.join(UPLOAD_FOLDER, "results"), RESULT_CACHE_MB * 1024 * 1024) if RESULT_CACHE_MB > 0 else None
+# resumable uploads (/uploads): largest single upload, bytes all open uploads may
+# still add, disk space always left free, largest PUT body, idle session lifetime
+UPLOAD_MAX_MB = int(os.environ.get("UPLOAD_MAX_MB", "8192"))
+UPLOAD_PENDING_MAX_MB = int(os.environ.get("UPLOAD_PENDING_MAX_MB", "32768"))
+UPLOAD_MIN_FREE_MB = int(os.environ.get("UPLOAD_MIN_FREE_MB", "1024"))
+UPLOAD_CHUNK_MAX_MB = int(os.environ.get("UPLOAD_CHUNK_MAX_MB", "64"))
+UPLOAD_SESSION_TTL_H = float(os.environ.get("UPLOAD_SESSION_TTL_H", "24"))
+chunked_uploads = ChunkedUploads(upload_store, UPLOAD_MAX_MB * 1024 * 1024, UPLOAD_PENDING_MAX_MB * 1024 * 1024,
+                                 UPLOAD_MIN_FREE_MB * 1024 * 1024, UPLOAD_SESSION_TTL_H * 3600)
+# SQLite index of uploads, runs and contacts behind /videos and /contacts
+media_index = MediaIndex(os.path.join(upload_store.store_dir, "index.db"))
+media_index.sync(UPLOAD_FOLDER, VIDEO_EXTENSIONS, upload_store.known_digest)
+_inflight = {}  # result key -> job producing it
+_inflight_lock = threading.Lock()
+job_manager = JobManager(workers=HIGHLIGHT_WORKERS, max_queue=HIGHLIGHT_QUEUE_SIZE)
+# seconds between keep-alive comments on an idle /jobs/<id>/events stream
+SSE_KEEPALIVE_S = float(os.environ.get("SSE_KEEPALIVE_S", "15"))
+
 # --- Routes ---
 
+def cached_result_key(video_path, safe_name, options, params=None):
+    """
+    Result cache key of a run, or None when caching is off or a hash can't be taken.
+    """
+    if result_cache is None:
+        return None
+    try:
+        model_hashes = [file_hash(BALL_MODEL), file_hash(BAT_MODEL)]
+        return result_key(upload_store.digest(safe_name), model_hashes, output_config(options, params))
+    except OSError as e:
+        print(f"[WARN] Result cache skipped: {e}")
+        return None
+
+def indexed(fn, name, kind):
+    """
+    Job callable that records the finished run and its contacts in the media index.
+    """
+    def run(**kwargs):
+        result = fn(**kwargs)
+        index_run(name, kind, result)
+        return result
+    return run
+
+def index_run(name, kind, result):
+    try:
+        media_index.record_run(name, kind, result)
+    except sqlite3.Error as e:
+        print(f"[WARN] Could not index the run of {name}: {e}")
+
+def submit_cached(key, process_fn, options, meta, kind="generate"):
+    """
+    Queues process_fn, writing into the result cache entry for key (if any).
+    A request for a key that is already being produced gets that job back.
+    The finished run is recorded in the media index as `kind`.
+    """
+    if key is None:
+        return job_manager.submit(indexed(process_fn, meta["filename"], kind), options, meta=meta)
+    with _inflight_lock:
+        job = _inflight.get(key)
+        if job is not None and not job.finished:
+            return job
+        job = job_manager.submit(indexed(functools.partial(result_cache.produce, key, process_fn),
+                                         meta["filename"], kind), options, meta=meta)
+        _inflight[key] = job
+        for k in [k for k, j in _inflight.items() if j.finished]:
+            del _inflight[k]
+        return job
+
+def cached_response(result, name=None):
+    """
+    Response for a result cache hit (same shape as a finished job's result).
+    The hit becomes the current run of `name` in the media index if it isn't yet.
+    """
+    if name is not None and media_index.current_result_key(name) != result.get("result_key"):
+        index_run(name, "cached", result)
+    return jsonify({
+        "message": "Highlight generated successfully",
+        "highlight_url": highlight_url(result["highlight_path"]),
+        "hls_url": hls_url(result),
+        "detail": result,
+        "cached": True
+    }), 200
+
+def highlight_url(path):
+    return f"http://localhost:5000/videos/{os.path.relpath(path, UPLOAD_FOLDER).replace(os.sep, '/')}"
+
+def hls_url(result):
+    """
+    URL of the result's HLS master playlist, or None without HLS delivery.
+    """
+    hls = (result.get("delivery") or {}).get("hls")
+    return highlight_url(hls["master"]) if hls else None
+
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok"}), 200
+    return jsonify({
+        "status": "ok",
+        "jobs": job_manager.stats(),
+        "detector_backend": DETECTOR_BACKEND,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "uploads": chunked_uploads.stats(),
+        "media_index": media_index.stats()
+    }), 200
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms and frame
+    counters of all finished runs, plus job queue gauges.
+    """
+    stats = job_manager.stats()
+    body = pipeline_metrics.render({
+        "jobs": ("Highlight jobs by status", stats["jobs"]),
+        "job_queue_size": ("Jobs waiting in the queue", stats["queue_size"]),
+        "job_queue_capacity": ("Job queue capacity", stats["queue_capacity"]),
+        "workers": ("Highlight worker threads", stats["workers"]),
+    })
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+@app.route("/models", methods=["GET"])
+def model_status():
+    """
+    Reports resident detector models with their load / warm-up times.
+    """
+    return jsonify(registry.stats()), 200
 
 @app.route("/upload", methods=["POST"])
 def upload_video():
     """
     Accepts multipart form-data with key 'video'.
-    Saves the file into uploads/ and returns filename + URL.
+    Stores the file content-addressed and returns filename + URL; the same
+    content uploaded again keeps its stored copy, and a different file with a
+    taken name is renamed to <name>_<hash8>.<ext>.
     """
     video = request.files.get("video")
     if not video:
@@ -44,9 +232,9 @@ def upload_video():
 
     # prevent directory traversal
     filename = os.path.basename(filename)
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
     try:
-        video.save(file_path)
+        filename, digest, deduplicated = upload_store.save(video.stream, filename)
+        media_index.add_video(filename, os.path.join(UPLOAD_FOLDER, filename), digest)
     except Exception as e:
         return jsonify({"error": f"Failed to save file: {e}"}), 500
 
@@ -54,13 +242,124 @@ def upload_video():
     return jsonify({
         "message": "Video uploaded successfully",
         "path": video_url,
-        "filename": filename
+        "filename": filename,
+        "sha256": digest,
+        "deduplicated": deduplicated
     }), 200
 
+def upload_error(e):
+    body = {"error": str(e)}
+    if e.offset is not None:
+        body["offset"] = e.offset
+    resp = jsonify(body)
+    if e.offset is not None:
+        resp.headers["Upload-Offset"] = str(e.offset)
+    return resp, e.status
+
+def upload_status(session, code=200):
+    resp = jsonify(dict(session, upload_url=f"http://localhost:5000/uploads/{session['upload_id']}",
+                        chunk_max_bytes=UPLOAD_CHUNK_MAX_MB * 1024 * 1024))
+    resp.headers["Upload-Offset"] = str(session["offset"])
+    resp.headers["Upload-Length"] = str(session["size"])
+    return resp, code
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    """
+    Starts a resumable upload. JSON body {"filename": ..., "size": <bytes>}.
+    Send the file with PUT /uploads/<id> (raw body, Upload-Offset header),
+    then POST /uploads/<id>/finalize. 413 / 507 when it doesn't fit the limits.
+    """
+    data = request.get_json(silent=True) or request.form
+    try:
+        size = int(data.get("size", 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "size must be an integer"}), 400
+    try:
+        session = chunked_uploads.create(data.get("filename"), size)
+    except UploadError as e:
+        return upload_error(e)
+    return upload_status(session, 201)
+
+@app.route("/uploads/<upload_id>", methods=["GET", "HEAD"])
+def get_upload(upload_id):
+    """
+    Current offset of an upload (also as the Upload-Offset header): where to resume.
+    """
+    try:
+        return upload_status(chunked_uploads.status(upload_id))
+    except UploadError as e:
+        return upload_error(e)
+
+@app.route("/uploads/<upload_id>", methods=["PUT", "PATCH"])
+def put_upload_chunk(upload_id):
+    """
+    Appends the raw request body at the Upload-Offset header (or ?offset=),
+    which must be the upload's current offset. After a broken connection,
+    GET / HEAD the upload and resume from the offset it reports.
+    """
+    try:
+        offset = int(request.headers.get("Upload-Offset", request.args.get("offset", "")))
+    except ValueError:
+        return jsonify({"error": "Upload-Offset header (or ?offset=) required"}), 400
+    length = request.content_length
+    if length is not None and length > UPLOAD_CHUNK_MAX_MB * 1024 * 1024:
+        return jsonify({"error": f"Chunk larger than {UPLOAD_CHUNK_MAX_MB} MB"}), 413
+    try:
+        return upload_status(chunked_uploads.write(upload_id, offset, request.stream))
+    except UploadError as e:
+        return upload_error(e)
+
+@app.route("/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    """
+    Completes an upload: stores it like /upload and returns the same fields.
+    ?sha256=<hex> checks the content; ?generate=1 also queues the highlight
+    (with the /generatehighlight query options) and adds its response as "highlight".
+    """
+    try:
+        filename, digest, deduplicated = chunked_uploads.finalize(upload_id, request.args.get("sha256"))
+        media_index.add_video(filename, os.path.join(UPLOAD_FOLDER, filename), digest)
+    except UploadError as e:
+        return upload_error(e)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to save file: {e}"}), 500
+
+    body = {
+        "message": "Video uploaded successfully",
+        "path": f"http://localhost:5000/videos/{filename}",
+        "filename": filename,
+        "sha256": digest,
+        "deduplicated": deduplicated
+    }
+    code = 200
+    if request.args.get("generate", "").lower() in ("1", "true", "yes"):
+        resp, code = generate_highlight(filename)
+        body["highlight"] = resp.get_json()
+    return jsonify(body), code
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+def abort_upload(upload_id):
+    """
+    Abandons an upload and frees its space.
+    """
+    try:
+        chunked_uploads.abort(upload_id)
+    except UploadError as e:
+        return upload_error(e)
+    return jsonify({"message": "Upload aborted"}), 200
+
+# /videos content types the mimetypes module gets wrong or may not know
+STREAM_MIMETYPES = {".mp4": "video/mp4", ".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
 @app.route("/videos/<path:filename>", methods=["GET"])
 def serve_uploaded_file(filename):
     """
-    Serves files from uploads/ via /videos/<filename>
+    Serves files from uploads/ via /videos/<filename>, with byte-range
+    requests (seeking / progressive playback) and ETag revalidation.
+    Result cache files are served as immutable.
     """
     try:
         file_path = safe_join(UPLOAD_FOLDER, filename)
@@ -68,7 +367,16 @@ def serve_uploaded_file(filename):
         abort(404)
     if not file_path or not os.path.exists(file_path):
         abort(404)
-    return send_from_directory(UPLOAD_FOLDER, filename, as_attachment=False)
+    mimetype = STREAM_MIMETYPES.get(os.path.splitext(file_path)[1].lower())
+    # result cache entries are keyed by content + settings and never rewritten;
+    # anything else (uploads/<name>_highlight.mp4, ...) is revalidated (max_age 0 = no-cache)
+    immutable = os.path.relpath(file_path, UPLOAD_FOLDER).split(os.sep)[0] == "results"
+    # conditional: Range / If-None-Match / If-Modified-Since answered with 206 / 304
+    response = send_from_directory(UPLOAD_FOLDER, filename, as_attachment=False, mimetype=mimetype,
+                                   conditional=True, etag=True, max_age=IMMUTABLE_MAX_AGE if immutable else 0)
+    if immutable:
+        response.cache_control.immutable = True
+    return response
 
 @app.route("/delete/<path:filename>", methods=["DELETE"])
 def delete_file(filename):
@@ -79,7 +387,8 @@ def delete_file(filename):
         safe_name = os.path.basename(filename)
         file_path = os.path.join(UPLOAD_FOLDER, safe_name)
         if os.path.exists(file_path):
-            os.remove(file_path)
+            upload_store.delete(safe_name)
+            media_index.remove_video(safe_name)
             return jsonify({"message": f"{safe_name} deleted successfully"}), 200
         else:
             return jsonify({"error": "File not found"}), 404
@@ -89,8 +398,21 @@ def delete_file(filename):
 @app.route("/generatehighlight/<path:filename>", methods=["POST"])
 def generate_highlight(filename):
     """
-    Trigger highlight generation for an uploaded video.
-    Calls process_video_for_highlight(...) and returns highlight URL on success.
+    Queue highlight generation for an uploaded video.
+    Returns 202 with a job id right away (poll /jobs/<id>), or 429 when the
+    queue is full. Pass ?wait=1 to block until the job finishes (legacy behaviour)
+    and ?preroll=seek to trade pre-roll memory for re-decoding on contact.
+    ?motion_gate=1|0 turns the static-frame gate in front of the ball detector on/off.
+    ?stride=k / ?active_stride=k set the detector stride (tracker fills the gaps).
+    ?roi=320 detects on a 320px window around the tracked ball (0 = off).
+    ?parallel=N splits the video across N worker processes.
+    ?highlight=copy|encode picks stream-copy or re-encoded highlight assembly.
+    ?delivery=hls|faststart|none: HLS ladder (hls_url in the result) plus a
+    faststart MP4, the faststart MP4 only, or the highlight as written.
+    ?profile=1 also writes a per-frame stage trace (Chrome / Perfetto JSON, see
+    trace_url in the result); profiled runs always process and aren't cached.
+    A finished highlight for the same video content, models and settings is
+    returned right away (200, "cached": true); ?refresh=1 regenerates it.
     """
     try:
         safe_name = os.path.basename(filename)
@@ -98,58 +420,423 @@ def generate_highlight(filename):
         if not os.path.exists(video_path):
             return jsonify({"error": "File not found"}), 404
 
+        preroll = request.args.get("preroll", PREROLL_MODE)
+        if preroll not in PREROLL_MODES:
+            return jsonify({"error": f"preroll must be one of {', '.join(PREROLL_MODES)}"}), 400
+
+        motion_gate = request.args.get("motion_gate", "1" if MOTION_GATE else "0") == "1"
+        profile = request.args.get("profile", "0") == "1"
+
+        highlight_mode = request.args.get("highlight", HIGHLIGHT_MODE)
+        if highlight_mode not in HIGHLIGHT_MODES:
+            return jsonify({"error": f"highlight must be one of {', '.join(HIGHLIGHT_MODES)}"}), 400
+        delivery = request.args.get("delivery", HIGHLIGHT_DELIVERY)
+        if delivery not in DELIVERY_MODES:
+            return jsonify({"error": f"delivery must be one of {', '.join(DELIVERY_MODES)}"}), 400
+
+        try:
+            detect_stride = int(request.args.get("stride", DETECT_STRIDE))
+            active_stride = int(request.args.get("active_stride", ACTIVE_STRIDE))
+            roi_size = int(request.args.get("roi", ROI_SIZE))
+        except ValueError:
+            return jsonify({"error": "stride, active_stride and roi must be integers"}), 400
+        if detect_stride < 1 or active_stride < 1:
+            return jsonify({"error": "stride and active_stride must be >= 1"}), 400
+        if roi_size < 0 or roi_size % 32:
+            return jsonify({"error": "roi must be 0 or a positive multiple of 32"}), 400
+
+        try:
+            parallel = int(request.args.get("parallel", HIGHLIGHT_PARALLEL))
+        except ValueError:
+            return jsonify({"error": "parallel must be an integer"}), 400
+
         base_name, _ = os.path.splitext(safe_name)
         highlight_out = os.path.join(UPLOAD_FOLDER, f"{base_name}_highlight.mp4")
         contact_frames_dir = os.path.join(UPLOAD_FOLDER, f"{base_name}_contact_frames")
-        os.makedirs(contact_frames_dir, exist_ok=True)
+
+        # force CPU for local testing; change to 'cuda' if you have GPU and torch configured
+        options = dict(
+            video_path=video_path,
+            out_highlight_path=highlight_out,
+            contact_frames_root=contact_frames_dir,
+            ball_model_path=BALL_MODEL,
+            bat_model_path=BAT_MODEL,
+            device="cpu",
+            batch_size=BALL_BATCH_SIZE,
+            pipelined=HIGHLIGHT_PIPELINED,
+            preroll=preroll,
+            motion_gate=motion_gate,
+            detect_stride=detect_stride,
+            active_stride=active_stride,
+            roi_size=roi_size,
+            detection_cache=detection_cache,
+            highlight_mode=highlight_mode,
+            delivery=delivery,
+            profile=profile
+        )
+        process_fn = process_video_for_highlight
+        if parallel > 1:
+            unsupported = unsupported_options(options)
+            if unsupported:
+                return jsonify({"error": f"parallel mode doesn't support: {', '.join(unsupported)}"}), 400
+            process_fn = process_video_parallel
+            options["workers"] = parallel
+
+        key = None if profile else cached_result_key(video_path, safe_name, options)
+        if key is not None and request.args.get("refresh", "") != "1":
+            result = result_cache.get(key)
+            if result is not None:
+                print("▶️ Cached highlight:", video_path, key)
+                return cached_response(result, safe_name)
+
+        try:
+            job = submit_cached(key, process_fn, options, meta={"filename": safe_name})
+        except QueueFullError as e:
+            return jsonify({"message": "Server busy, try again later", "error": str(e)}), 429
 
         # Logging to console for debugging (Flask terminal)
-        print("▶️ Processing started:", video_path)
+        print("▶️ Processing queued:", video_path, "job", job.id)
+
+        if request.args.get("wait", "").lower() in ("1", "true", "yes"):
+            job.wait()
+            return job_result(job.id)
+
+        return jsonify({
+            "message": "Highlight job queued",
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"http://localhost:5000/jobs/{job.id}",
+            "events_url": f"http://localhost:5000/jobs/{job.id}/events",
+            "result_url": f"http://localhost:5000/jobs/{job.id}/result"
+        }), 202
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"message": "Server error", "error": str(e)}), 500
+
+# contact / highlight parameters /retune accepts, with their types
+RETUNE_PARAMS = {
+    "conf": float,
+    "contact_radius": float,
+    "contact_min_gap": int,
+    "pre_frames": int,
+    "post_frames": int,
+    "ball_seen_frames": int,
+    "ball_miss_frames": int,
+    "linger_frames": int,
+}
+
+@app.route("/retune/<path:filename>", methods=["POST"])
+def retune_highlight(filename):
+    """
+    Re-cut the highlight of an already processed video with new contact /
+    highlight parameters (query args, see RETUNE_PARAMS), replaying the cached
+    detections instead of running the models again. 404 when the video has
+    no cached detections; otherwise queued like /generatehighlight (?wait=1 blocks,
+    ?highlight / ?delivery as there)
+    and answered from the result cache when this combination was cut before.
+    """
+    try:
+        if detection_cache is None:
+            return jsonify({"error": "Detection cache is disabled"}), 404
+        safe_name = os.path.basename(filename)
+        video_path = os.path.join(UPLOAD_FOLDER, safe_name)
+        if not os.path.exists(video_path):
+            return jsonify({"error": "File not found"}), 404
+
+        highlight_mode = request.args.get("highlight", HIGHLIGHT_MODE)
+        if highlight_mode not in HIGHLIGHT_MODES:
+            return jsonify({"error": f"highlight must be one of {', '.join(HIGHLIGHT_MODES)}"}), 400
+        delivery = request.args.get("delivery", HIGHLIGHT_DELIVERY)
+        if delivery not in DELIVERY_MODES:
+            return jsonify({"error": f"delivery must be one of {', '.join(DELIVERY_MODES)}"}), 400
+
+        params = {}
+        for name, cast in RETUNE_PARAMS.items():
+            if name in request.args:
+                try:
+                    params[name] = cast(request.args[name])
+                except ValueError:
+                    return jsonify({"error": f"{name} must be a number"}), 400
+                if params[name] < 0:
+                    return jsonify({"error": f"{name} must be >= 0"}), 400
+
+        cached = detection_cache.load(detection_cache.key(video_path, BALL_MODEL, BAT_MODEL,
+                                                          upload_store.digest(safe_name)))
+        if cached is None:
+            return jsonify({"error": "No cached detections; run /generatehighlight first (runs with a "
+                                     "detector stride, ROI or motion gate aren't cached)"}), 404
+        if params.get("conf", cached.record_conf) < cached.record_conf:
+            return jsonify({"error": f"conf must be >= {cached.record_conf} (the cached threshold)"}), 400
+
+        base_name, _ = os.path.splitext(safe_name)
+        options = dict(
+            video_path=video_path,
+            out_highlight_path=os.path.join(UPLOAD_FOLDER, f"{base_name}_highlight.mp4"),
+            contact_frames_root=os.path.join(UPLOAD_FOLDER, f"{base_name}_contact_frames"),
+            ball_model_path=BALL_MODEL,
+            bat_model_path=BAT_MODEL,
+            cache=detection_cache,
+            device="cpu",
+            highlight_mode=highlight_mode,
+            delivery=delivery,
+            **params
+        )
+        key = cached_result_key(video_path, safe_name, {"highlight_mode": highlight_mode, "delivery": delivery},
+                                params)
+        if key is not None:
+            result = result_cache.get(key)
+            if result is not None:
+                return cached_response(result, safe_name)
         try:
-            # force CPU for local testing; change to 'cuda' if you have GPU and torch configured
-            result = process_video_for_highlight(
-                video_path=video_path,
-                out_highlight_path=highlight_out,
-                contact_frames_root=contact_frames_dir,
-                ball_model_path=BALL_MODEL,
-                bat_model_path=BAT_MODEL,
-                device="cpu"
-            )
-        except Exception as e:
-            print("Processing internal error:", e)
-            traceback.print_exc()
-            return jsonify({"message": "Processing failed", "error": str(e)}), 500
-
-        print("✅ Processing finished:", result)
-
-        highlight_url = f"http://localhost:5000/videos/{os.path.basename(highlight_out)}"
+            job = submit_cached(key, replay_from_cache, options, meta={"filename": safe_name, "retune": params},
+                                kind="retune")
+        except QueueFullError as e:
+            return jsonify({"message": "Server busy, try again later", "error": str(e)}), 429
+
+        print("▶️ Re-tune queued:", video_path, "job", job.id, params)
+
+        if request.args.get("wait", "").lower() in ("1", "true", "yes"):
+            job.wait()
+            return job_result(job.id)
+
         return jsonify({
-            "message": "Highlight generated successfully",
-            "highlight_url": highlight_url,
-            "detail": result
-        }), 200
+            "message": "Re-tune job queued",
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"http://localhost:5000/jobs/{job.id}",
+            "events_url": f"http://localhost:5000/jobs/{job.id}/events",
+            "result_url": f"http://localhost:5000/jobs/{job.id}/result"
+        }), 202
 
     except Exception as e:
         traceback.print_exc()
         return jsonify({"message": "Server error", "error": str(e)}), 500
 
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """
+    Status, progress and timing of a highlight job.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    """
+    Highlight URL and contact payload of a finished job.
+    202 while the job is still queued/running.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    if job.status == DONE:
+        body = {
+            "message": "Highlight generated successfully",
+            "highlight_url": highlight_url(job.result['highlight_path']),
+            "hls_url": hls_url(job.result),
+            "detail": job.result,
+            "job": job.to_dict()
+        }
+        if job.result.get("trace"):
+            body["trace_url"] = highlight_url(job.result["trace"]["path"])
+        return jsonify(body), 200
+    if job.status == FAILED:
+        return jsonify({"message": "Processing failed", "error": job.error, "job": job.to_dict()}), 500
+    if job.status == CANCELLED:
+        return jsonify({"message": "Processing cancelled", "job": job.to_dict()}), 409
+    return jsonify({"message": "Processing not finished", "job": job.to_dict()}), 202
+
+def contact_event(contact):
+    return {
+        "frame_idx": contact["frame_idx"],
+        "ball": contact.get("ball"),
+        "bat": contact.get("bat"),
+        "img_url": highlight_url(contact["img"])
+    }
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Server-Sent Events stream of a job: "progress" (frames, fps), a "contact"
+    event as soon as each contact is found (frame, mapped ball / bat, image URL),
+    then one "done" / "failed" / "cancelled" event and the stream ends.
+    Progress is coalesced: a slow client gets the latest state, never a
+    backlog, and the worker never waits on the stream.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def stream():
+        version = None
+        sent = 0
+        last_frames = None
+        while True:
+            changed = job.wait_change(version, timeout=SSE_KEEPALIVE_S)
+            if changed == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = changed
+            state = job.to_dict()
+            new = job.contacts[sent:]
+            sent += len(new)
+            for contact in new:
+                yield sse("contact", contact_event(contact))
+            if state["frames_done"] != last_frames:
+                last_frames = state["frames_done"]
+                yield sse("progress", {k: state[k] for k in ("status", "progress", "frames_done", "total_frames", "fps")})
+            if job.finished:
+                final = {"job": state, "result_url": f"http://localhost:5000/jobs/{job.id}/result"}
+                if job.status == DONE:
+                    final["highlight_url"] = highlight_url(job.result["highlight_path"])
+                    final["contacts"] = len(job.result["contacts"])
+                yield sse(job.status, final)
+                return
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    """
+    Cancel a queued or running highlight job.
+    """
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+def media_url(path):
+    """
+    URL of a file under uploads/ on the host the request came in on.
+    """
+    if not path:
+        return None
+    return f"{request.host_url}videos/{os.path.relpath(path, UPLOAD_FOLDER).replace(os.sep, '/')}"
+
+def query_args(casts):
+    """
+    Typed query args {name: cast}; missing ones are None. Raises ValueError naming the bad arg.
+    """
+    out = {}
+    for name, cast in casts.items():
+        value = request.args.get(name)
+        if value is None or value == "":
+            out[name] = None
+            continue
+        try:
+            out[name] = cast(value)
+        except ValueError:
+            raise ValueError(f"{name} has an invalid value: {value!r}")
+    return out
+
+def flag(value):
+    return value.lower() in ("1", "true", "yes")
+
+def page(items, total, limit, offset):
+    return {
+        "items": items,
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + len(items) if offset + len(items) < total else None
+    }
+
 @app.route("/videos", methods=["GET"])
 def list_videos():
     """
-    Returns list of video URLs from uploads/ (only common video file extensions).
+    Uploaded videos from the media index. Without query args: the plain list
+    of video URLs. With any of ?limit= (default 50, max 500) &offset=
+    &q=<name part> &processed=1|0 &min_contacts=N &sort=added|name|contacts|duration|processed
+    &order=asc|desc: a page {items, total, limit, offset, next_offset} with
+    each video's stream properties and current run.
     """
     try:
-        files = [
-            f"http://localhost:5000/videos/{name}"
-            for name in os.listdir(UPLOAD_FOLDER)
-            if name.lower().endswith(('.mp4', '.mov', '.avi', '.mkv'))
-        ]
-        return jsonify(files), 200
+        if not request.args:
+            return jsonify([f"{request.host_url}videos/{name}" for name in media_index.video_names()]), 200
+        try:
+            args = query_args({"limit": int, "offset": int, "q": str, "processed": flag, "min_contacts": int,
+                               "sort": str, "order": str})
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        sort = args["sort"] or "added"
+        if sort not in VIDEO_SORTS:
+            return jsonify({"error": f"sort must be one of {', '.join(VIDEO_SORTS)}"}), 400
+        limit = min(MAX_LIMIT, max(1, args["limit"] or 50))
+        offset = max(0, args["offset"] or 0)
+        rows, total = media_index.list_videos(q=args["q"], processed=args["processed"], min_contacts=args["min_contacts"],
+                                              sort=sort, desc=(args["order"] or "desc") != "asc",
+                                              limit=limit, offset=offset)
+        items = [{
+            "name": row["name"],
+            "url": f"{request.host_url}videos/{row['name']}",
+            "sha256": row["sha256"],
+            "size_bytes": row["size_bytes"],
+            "fps": row["fps"],
+            "frames": row["frames"],
+            "duration_s": row["frames"] / row["fps"] if row["frames"] and row["fps"] else None,
+            "width": row["width"],
+            "height": row["height"],
+            "added_at": row["added_at"],
+            "run": None if row["run_id"] is None else {
+                "id": row["run_id"],
+                "kind": row["kind"],
+                "finished_at": row["finished_at"],
+                "contacts": row["contacts"],
+                "highlight_url": media_url(row["highlight_path"]),
+                "highlight_frames": row["highlight_frames"]
+            }
+        } for row in rows]
+        return jsonify(page(items, total, limit, offset)), 200
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route("/contacts", methods=["GET"])
+def query_contacts():
+    """
+    Contacts across videos from the media index, one page at a time:
+    ?video=<name> &min_ball_conf= &min_bat_conf= &from_s= &to_s= (time in the
+    video) &all_runs=1 (also superseded runs) &sort=time|ball_conf|bat_conf|recent
+    &order=asc|desc &limit= (default 100, max 500) &offset=.
+    """
+    try:
+        args = query_args({"video": str, "min_ball_conf": float, "min_bat_conf": float, "from_s": float,
+                           "to_s": float, "all_runs": flag, "sort": str, "order": str, "limit": int, "offset": int})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    sort = args["sort"] or "time"
+    if sort not in CONTACT_SORTS:
+        return jsonify({"error": f"sort must be one of {', '.join(CONTACT_SORTS)}"}), 400
+    limit = min(MAX_LIMIT, max(1, args["limit"] or 100))
+    offset = max(0, args["offset"] or 0)
+    rows, total = media_index.query_contacts(
+        video=os.path.basename(args["video"]) if args["video"] else None, min_ball_conf=args["min_ball_conf"],
+        min_bat_conf=args["min_bat_conf"], from_s=args["from_s"], to_s=args["to_s"], all_runs=bool(args["all_runs"]),
+        sort=sort, desc=args["order"] == "desc", limit=limit, offset=offset)
+    items = [{
+        "video": row["video"],
+        "run_id": row["run_id"],
+        "frame_idx": row["frame_idx"],
+        "time_s": row["time_s"],
+        "frame_highlight": row["frame_highlight"],
+        "ball": None if row["ball_conf"] is None else {"conf": row["ball_conf"], "x": row["ball_x"], "y": row["ball_y"]},
+        "bat": None if row["bat_conf"] is None else {"conf": row["bat_conf"], "pts": row["bat_pts"]},
+        "img_url": media_url(row["img"]),
+        "highlight_url": media_url(row["highlight_path"])
+    } for row in rows]
+    return jsonify(page(items, total, limit, offset)), 200
+
 # --- Run server ---
 if __name__ == "__main__":
+    # load + warm up detectors once so the first highlight request doesn't pay for it
+    registry.preload([BALL_MODEL, BAT_MODEL], device="cpu")
     # Use debug=True for local development; remove or set False in production
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,109 @@
+import os
+import glob
+import json
+
+import cv2
+
+# -----------------------------------------------------
+# DETECTOR INFERENCE BACKENDS
+# The detectors always go through ultralytics' YOLO API; the backend only
+# decides which weights it loads. "torch" uses the .pt files, the others
+# the exported models next to them (ultralytics runs .onnx with ONNX
+# Runtime and *_openvino_model/ directories with OpenVINO), so the result
+# parsing in detection.py is the same for all of them. Exports are made
+# once with `python export_models.py`; dynamic input shapes keep ROI crops
+# (imgsz=roi_size) and batched ball inference working.
+# -----------------------------------------------------
+
+BACKENDS = ("torch", "onnx", "openvino", "openvino-int8")
+
+
+def exported_path(pt_path, backend):
+    """
+    Where the export of pt_path for `backend` lives (ultralytics' naming).
+    """
+    stem, _ = os.path.splitext(pt_path)
+    if backend == "torch":
+        return pt_path
+    if backend == "onnx":
+        return stem + ".onnx"
+    if backend == "openvino":
+        return stem + "_openvino_model"
+    if backend == "openvino-int8":
+        return stem + "_int8_openvino_model"
+    raise ValueError(f"Unknown detector backend {backend!r}, expected one of {BACKENDS}")
+
+
+def resolve_weights(pt_path, backend):
+    """
+    Weights to load for `backend`; raises FileNotFoundError when the export is missing.
+    """
+    path = exported_path(pt_path, backend)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{backend} model not found: {path} "
+                                f"(run: python export_models.py --backend {backend})")
+    return path
+
+
+def export(pt_path, backend, imgsz=640, calib_data=None):
+    """
+    Exports pt_path for `backend` with ultralytics and returns the output path.
+    openvino-int8 needs calib_data (a dataset yaml, see write_calibration_set).
+    """
+    from ultralytics import YOLO
+
+    if backend == "torch":
+        return pt_path
+    model = YOLO(pt_path)
+    if backend == "onnx":
+        out = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    elif backend == "openvino":
+        out = model.export(format="openvino", imgsz=imgsz, dynamic=True)
+    elif backend == "openvino-int8":
+        if calib_data is None:
+            raise ValueError("openvino-int8 export needs a calibration set (calib_data)")
+        out = model.export(format="openvino", imgsz=imgsz, dynamic=True, int8=True, data=calib_data)
+    else:
+        raise ValueError(f"Unknown detector backend {backend!r}, expected one of {BACKENDS}")
+    return str(out)
+
+
+def write_calibration_set(video_paths, out_dir, frames=300, names=None, crop_size=640):
+    """
+    Samples `frames` evenly spaced 640 crops (as the pipeline feeds the
+    detectors) from the videos into out_dir/images and writes the dataset
+    yaml ultralytics' INT8 calibration reads. Returns the yaml path.
+    """
+    from engine import adaptive_square_crop
+
+    image_dir = os.path.join(out_dir, "images")
+    os.makedirs(image_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(image_dir, "*.jpg")):
+        os.remove(old)
+    per_video = max(1, frames // max(1, len(video_paths)))
+    written = 0
+    for v, video_path in enumerate(video_paths):
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            print(f"[WARN] Skipping calibration video {video_path}: could not open")
+            continue
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        step = max(1, total // per_video)
+        for idx in range(0, max(total, 1), step)[:per_video]:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            cv2.imwrite(os.path.join(image_dir, f"{v:02d}_{idx:06d}.jpg"), adaptive_square_crop(frame, crop_size))
+            written += 1
+        cap.release()
+    if not written:
+        raise RuntimeError("No calibration frames could be read")
+    print(f"[INFO] Wrote {written} calibration frames to {image_dir}")
+
+    yaml_path = os.path.join(out_dir, "calib.yaml")
+    with open(yaml_path, "w") as f:
+        # JSON is valid YAML; images without labels are fine for calibration
+        json.dump({"path": os.path.abspath(out_dir), "train": "images", "val": "images",
+                   "names": names or {0: "object"}}, f, indent=2)
+    return yaml_path
@@ -0,0 +1,126 @@
+"""
+Contact-frame parity and CPU throughput of the exported detector backends
+against the PyTorch models.
+
+    cd backend
+    python export_models.py --backend onnx
+    python -m benchmarks.backend_parity uploads/match.mp4 --backends torch onnx openvino
+
+For every backend the full pipeline runs on the videos; contacts are
+matched to the torch run within --tolerance frames. Throughput is measured
+on --bench-frames crops of the first video, per detector and batch size.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import cv2
+
+from backends import resolve_weights
+from batball_video import process_video_for_highlight, adaptive_square_crop, CROP_SIZE, CONF_THRESH, IOU
+from detection import detect_balls_batch, detect_bats
+from model_registry import registry
+
+
+def match_contacts(ref, got, tolerance):
+    """
+    Greedy one-to-one matching of contact frames within `tolerance` frames.
+    """
+    unmatched = sorted(got)
+    matched = []
+    for r in sorted(ref):
+        best = min(unmatched, key=lambda g: abs(g - r), default=None)
+        if best is not None and abs(best - r) <= tolerance:
+            matched.append((r, best))
+            unmatched.remove(best)
+    return {
+        "reference": len(ref),
+        "found": len(got),
+        "matched": len(matched),
+        "exact": sum(1 for r, g in matched if r == g),
+        "missed": sorted(set(ref) - {r for r, _ in matched}),
+        "extra": unmatched,
+        "recall": len(matched) / len(ref) if ref else 1.0,
+        "precision": len(matched) / len(got) if got else 1.0,
+    }
+
+
+def sample_crops(video_path, n):
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or n)
+    step = max(1, total // n)
+    crops = []
+    for idx in range(0, total, step):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        ret, frame = cap.read()
+        if not ret or len(crops) >= n:
+            break
+        crops.append(adaptive_square_crop(frame, CROP_SIZE))
+    cap.release()
+    return crops
+
+
+def throughput(ball_path, bat_path, crops, batch_sizes):
+    ball_model = registry.get(ball_path, "cpu")
+    bat_model = registry.get(bat_path, "cpu")
+    report = {}
+    for b in batch_sizes:
+        t0 = time.perf_counter()
+        for i in range(0, len(crops), b):
+            detect_balls_batch(ball_model, crops[i:i + b], CONF_THRESH, IOU)
+        dt = time.perf_counter() - t0
+        report[f"ball_batch{b}_fps"] = len(crops) / dt if dt > 0 else None
+    t0 = time.perf_counter()
+    for crop in crops:
+        detect_bats(bat_model, crop, CONF_THRESH, CROP_SIZE)
+    dt = time.perf_counter() - t0
+    report["bat_fps"] = len(crops) / dt if dt > 0 else None
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("videos", nargs="+")
+    ap.add_argument("--ball", default=os.path.join("models", "cricket_ball_detector.pt"))
+    ap.add_argument("--bat", default=os.path.join("models", "bestBat.pt"))
+    ap.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    ap.add_argument("--tolerance", type=int, default=2, help="contact frame tolerance")
+    ap.add_argument("--batch-size", type=int, default=4)
+    ap.add_argument("--bench-frames", type=int, default=200)
+    args = ap.parse_args()
+
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    crops = sample_crops(args.videos[0], args.bench_frames)
+    report = {"videos": args.videos, "tolerance": args.tolerance, "backends": {}}
+    reference = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            ball = resolve_weights(args.ball, backend)
+            bat = resolve_weights(args.bat, backend)
+            entry = {"videos": [], "throughput": throughput(ball, bat, crops, sorted({1, args.batch_size}))}
+            for video in args.videos:
+                out = os.path.join(tmp, backend, os.path.basename(video))
+                res = process_video_for_highlight(
+                    video_path=video,
+                    out_highlight_path=None,
+                    contact_frames_root=os.path.join(out, "contact_frames"),
+                    ball_model_path=ball,
+                    bat_model_path=bat,
+                    batch_size=args.batch_size)
+                frames = [c["frame_idx"] for c in res["contacts"]]
+                if backend == "torch":
+                    reference[video] = frames
+                entry["videos"].append({
+                    "video": video,
+                    "contacts": frames,
+                    "pipeline_fps": res["fps"],
+                    "parity": match_contacts(reference[video], frames, args.tolerance)
+                })
+            report["backends"][backend] = entry
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Parity check + micro-benchmark for contact.find_contact vs the shapely loop.
+
+    cd backend
+    python -m benchmarks.contact_kernel --cases 20000
+"""
+import argparse
+import math
+import time
+import numpy as np
+
+from contact import find_contact, find_contact_shapely
+
+
+def random_case(rng, radius, degenerate=0.3, max_balls=3, max_bats=3):
+    """
+    Ball candidates scattered around a few bat quads: rotated rectangles
+    (like OBB output) plus, with probability `degenerate`, self-intersecting /
+    collinear / random quads to exercise the shapely fallbacks.
+    """
+    bats = []
+    for _ in range(rng.integers(1, max_bats + 1)):
+        kind = rng.random() if rng.random() < degenerate else None
+        cx, cy = rng.uniform(100, 540, size=2)
+        if kind is None:
+            w, h = rng.uniform(4, 120), rng.uniform(4, 30)
+            a = rng.uniform(0, math.pi)
+            c, s = math.cos(a), math.sin(a)
+            corners = [(-w / 2, -h / 2), (w / 2, -h / 2), (w / 2, h / 2), (-w / 2, h / 2)]
+            pts = [[int(cx + x * c - y * s), int(cy + x * s + y * c)] for x, y in corners]
+        elif kind < 1 / 3:
+            # bow-tie (invalid)
+            pts = [[int(cx), int(cy)], [int(cx + 40), int(cy + 20)],
+                   [int(cx + 40), int(cy)], [int(cx), int(cy + 20)]]
+        elif kind < 2 / 3:
+            # collinear / repeated corners
+            x0, y0 = int(cx), int(cy)
+            pts = [[x0, y0], [x0 + 10, y0], [x0 + 20, y0], [x0 + 10 * int(rng.integers(0, 2)), y0]]
+        else:
+            pts = rng.integers(0, 640, size=(4, 2)).tolist()
+        bats.append((pts, float(rng.uniform(0.2, 1.0))))
+
+    balls = []
+    for _ in range(rng.integers(1, max_balls + 1)):
+        pts, _ = bats[rng.integers(0, len(bats))]
+        px, py = pts[rng.integers(0, 4)]
+        if rng.random() < 0.3:
+            # integer offsets at exactly / around the radius
+            dx, dy = rng.integers(-radius - 1, radius + 2, size=2)
+        else:
+            dx, dy = rng.normal(0, 25, size=2)
+        balls.append((int(round(px + dx)), int(round(py + dy)), float(rng.uniform(0.2, 1.0))))
+    return balls, bats
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", type=int, default=20000)
+    ap.add_argument("--radius", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cases = [random_case(rng, args.radius) for _ in range(args.cases)]
+
+    mismatches = 0
+    # radius 0 (accepted by /retune) is its own case: shapely's buffer is empty
+    for radius in sorted({0, args.radius}):
+        hits = 0
+        failed = 0
+        for balls, bats in cases:
+            ref = find_contact_shapely(balls, bats, radius)
+            got = find_contact(balls, bats, radius)
+            if ref != got:
+                failed += 1
+                if failed <= 5:
+                    print("MISMATCH", radius, balls, bats, ref, got)
+            hits += ref[0] is not None
+        mismatches += failed
+        print(f"parity (radius {radius}): {args.cases} cases, {hits} contacts, {failed} mismatches")
+
+    # timing: typical frames (1-3 OBB rectangles, few balls) and crowded frames
+    timing_sets = (
+        ("typical", [random_case(rng, args.radius, degenerate=0.0) for _ in range(args.cases)]),
+        ("crowded", [random_case(rng, args.radius, degenerate=0.0, max_balls=8, max_bats=6)
+                     for _ in range(args.cases // 4)]),
+    )
+    for label, frames in timing_sets:
+        for name, fn in (("shapely", find_contact_shapely), ("numpy", find_contact)):
+            t0 = time.perf_counter()
+            for balls, bats in frames:
+                fn(balls, bats, args.radius)
+            dt = time.perf_counter() - t0
+            print(f"{label:8s} {name:8s} {dt * 1e6 / len(frames):8.1f} us/frame")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,67 @@
+"""
+Check that per-frame detections are only kept when something uses them
+(record_detections=True or a detection cache): on a synthetic clip with
+stub detectors, every config must find its contacts and, without
+recording, keep no ball / bat / gated frames at all.
+
+    cd backend
+    python -m benchmarks.detection_recording
+    python -m benchmarks.detection_recording --configs '{}' '{"roi_size": 320}'
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from batball_video import process_video_for_highlight
+from benchmarks.pipeline_suite import make_clip, StubDetector
+
+
+def run(video, out_dir, config, record_detections):
+    return process_video_for_highlight(
+        video_path=video,
+        out_highlight_path=os.path.join(out_dir, "highlight.mp4"),
+        contact_frames_root=os.path.join(out_dir, "contact_frames"),
+        ball_model_path="stub-ball",
+        bat_model_path="stub-bat",
+        stages={"detect": StubDetector},
+        record_detections=record_detections,
+        **config)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", default="640x360", help="WIDTHxHEIGHT")
+    ap.add_argument("--frames", type=int, default=240)
+    ap.add_argument("--configs", nargs="+",
+                    default=['{}', '{"batch_size": 4, "pipelined": true}', '{"motion_gate": true}',
+                             '{"detect_stride": 2}', '{"roi_size": 320}'],
+                    help="process_video_for_highlight keyword arguments, one JSON object per config")
+    args = ap.parse_args()
+    width, height = (int(v) for v in args.size.lower().split("x"))
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, "clip.mp4")
+        make_clip(video, width, height, args.frames)
+        for i, text in enumerate(args.configs):
+            config = json.loads(text)
+            off = run(video, os.path.join(tmp, f"off_{i}"), config, False)
+            on = run(video, os.path.join(tmp, f"on_{i}"), config, True)
+            problems = []
+            if not off["contacts"]:
+                problems.append("no contacts")
+            if any(off["recorded"].values()):
+                problems.append(f"recorded without record_detections: {off['recorded']}")
+            if off["detections"] is not None:
+                problems.append("detections returned without record_detections")
+            if not on["recorded"]["balls"]:
+                problems.append("nothing recorded with record_detections")
+            failures += bool(problems)
+            print(f"{text:45s} {len(off['contacts'])} contacts, recorded off {off['recorded']} "
+                  f"on {on['recorded']} {'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,57 @@
+"""
+Recall / skip-rate check for the motion gate: runs the same video with and
+without the gate and compares the contact frames.
+
+    cd backend
+    python -m benchmarks.motion_gate_recall uploads/session.mp4 \
+        --ball models/cricket_ball_detector.pt --bat models/bestBat.pt --on 6 --off 3 --hold 8
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from batball_video import process_video_for_highlight
+from motion_gate import DEFAULT_GATE, contact_recall
+
+
+def run(video, ball, bat, out_dir, motion_gate):
+    return process_video_for_highlight(
+        video_path=video,
+        out_highlight_path=os.path.join(out_dir, "highlight.mp4"),
+        contact_frames_root=os.path.join(out_dir, "contact_frames"),
+        ball_model_path=ball,
+        bat_model_path=bat,
+        motion_gate=motion_gate,
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("video")
+    ap.add_argument("--ball", default=os.path.join("models", "cricket_ball_detector.pt"))
+    ap.add_argument("--bat", default=os.path.join("models", "bestBat.pt"))
+    ap.add_argument("--tolerance", type=int, default=2, help="frames a gated contact may drift")
+    for key, value in DEFAULT_GATE.items():
+        ap.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = ap.parse_args()
+    gate = {key: getattr(args, key) for key in DEFAULT_GATE}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = run(args.video, args.ball, args.bat, os.path.join(tmp, "ungated"), None)
+        gated = run(args.video, args.ball, args.bat, os.path.join(tmp, "gated"), gate)
+
+    report = {
+        "gate": gate,
+        "ungated_contacts": [c["frame_idx"] for c in base["contacts"]],
+        "gated_contacts": [c["frame_idx"] for c in gated["contacts"]],
+        "recall": contact_recall(base["contacts"], gated["contacts"], args.tolerance),
+        "skip": gated["motion_gate"],
+        "ungated_s": base["elapsed_s"],
+        "gated_s": gated["elapsed_s"],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
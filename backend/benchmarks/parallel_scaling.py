@@ -0,0 +1,63 @@
+"""
+Wall-clock scaling of parallel chunked processing against the sequential
+run, with a check that contacts and highlight length match. Every worker
+count runs with and without the pipelined decoder, since chunks start
+mid-video and the decoder must index their frames from the chunk start.
+
+    cd backend
+    python -m benchmarks.parallel_scaling uploads/match.mp4 --workers 2 4 8 \
+        --ball models/cricket_ball_detector.pt --bat models/bestBat.pt
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+
+from batball_video import process_video_for_highlight
+from parallel import process_video_parallel
+
+
+def run(fn, video, ball, bat, out_dir, **kwargs):
+    return fn(
+        video_path=video,
+        out_highlight_path=os.path.join(out_dir, "highlight.mp4"),
+        contact_frames_root=os.path.join(out_dir, "contact_frames"),
+        ball_model_path=ball,
+        bat_model_path=bat,
+        **kwargs
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("video")
+    ap.add_argument("--ball", default=os.path.join("models", "cricket_ball_detector.pt"))
+    ap.add_argument("--bat", default=os.path.join("models", "bestBat.pt"))
+    ap.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    ap.add_argument("--batch-size", type=int, default=4)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seq = run(process_video_for_highlight, args.video, args.ball, args.bat,
+                  os.path.join(tmp, "seq"), batch_size=args.batch_size)
+        seq_contacts = [c["frame_idx"] for c in seq["contacts"]]
+        report = {"sequential_s": seq["elapsed_s"], "contacts": len(seq_contacts), "parallel": []}
+        for n, pipelined in itertools.product(args.workers, (False, True)):
+            par = run(process_video_parallel, args.video, args.ball, args.bat,
+                      os.path.join(tmp, f"par{n}{'p' if pipelined else ''}"), workers=n,
+                      batch_size=args.batch_size, pipelined=pipelined)
+            report["parallel"].append({
+                "workers": n,
+                "pipelined": pipelined,
+                "elapsed_s": par["elapsed_s"],
+                "speedup": seq["elapsed_s"] / par["elapsed_s"] if par["elapsed_s"] else None,
+                "contacts_match": [c["frame_idx"] for c in par["contacts"]] == seq_contacts,
+                "highlight_frames_match": par["highlight_frames"] == seq["highlight_frames"],
+                "merge_detected_frames": (par.get("parallel") or {}).get("merge_detected_frames"),
+            })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
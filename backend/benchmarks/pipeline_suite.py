@@ -0,0 +1,300 @@
+"""
+Offline pipeline benchmark: synthetic cricket clips, stub or real detectors.
+
+    cd backend
+    python -m benchmarks.pipeline_suite
+    python -m benchmarks.pipeline_suite --sizes 1280x720 1920x1080 --frames 300 900 \
+        --ball-ms 8 --bat-ms 12 --configs '{}' '{"batch_size": 4, "pipelined": true}'
+    python -m benchmarks.pipeline_suite --compare benchmarks/results/old.json
+
+Writes clips with a moving ball blob hitting a rotating bat rectangle (one
+delivery per --cycle frames), then runs process_video_for_highlight on every
+clip x detector x config. "stub" detectors find the coloured shapes by
+thresholding and sleep --ball-ms / --bat-ms per image, so no weights are
+needed; "real" uses --ball / --bat when the files exist. Each case runs in a
+fresh process and reports pipeline FPS, per-stage FPS, peak RSS and (in a
+second, traced run) the tracemalloc allocation peak. Results are saved as
+JSON; --compare prints the FPS change against an earlier results file.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from batball_video import process_video_for_highlight
+from contact import find_contact
+from engine import YoloDetector
+
+BALL_BGR = (0, 0, 230)
+BAT_BGR = (0, 220, 0)
+HIT_AT = 0.6  # fraction of the cycle at which the ball reaches the bat
+
+
+# --- synthetic clips ---
+def bat_polygon(i, cycle, size, ox, oy):
+    """
+    Bat rectangle at frame i: pivots at the bottom centre of the square crop area.
+    """
+    angle = math.radians(30 + 90 * (i % cycle) / cycle)
+    length, width = size * 0.28, max(4, size * 0.03)
+    px, py = ox + size * 0.5, oy + size * 0.75
+    cx, cy = px + 0.5 * length * math.cos(angle), py - 0.5 * length * math.sin(angle)
+    return cv2.boxPoints(((cx, cy), (length, width), -math.degrees(angle))), (cx, cy)
+
+
+def make_clip(path, width, height, frames, cycle=60, fps=30):
+    """
+    Writes the clip and returns the frames at which the ball touches the bat.
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    size = min(width, height)
+    ox, oy = (width - size) // 2, (height - size) // 2
+    radius = max(3, size // 80)
+    hits = []
+    base = np.full((height, width, 3), 40, np.uint8)
+    base[::16, :] = 70  # pitch lines, so frames aren't flat
+    for i in range(frames):
+        frame = base.copy()
+        poly, _ = bat_polygon(i, cycle, size, ox, oy)
+        cv2.fillPoly(frame, [poly.astype(np.int32)], BAT_BGR)
+        phase = (i % cycle) / cycle
+        if 0.15 <= phase <= 0.8:
+            start = (ox + size * 0.1, oy + size * 0.2)
+            hit_frame = i - (i % cycle) + int(HIT_AT * cycle)
+            _, target = bat_polygon(hit_frame, cycle, size, ox, oy)
+            t = (phase - 0.15) / (HIT_AT - 0.15)
+            if t > 1:  # rebound the way it came
+                t = 2 - t
+            bx = start[0] + t * (target[0] - start[0])
+            by = start[1] + t * (target[1] - start[1])
+            cv2.circle(frame, (int(bx), int(by)), radius, BALL_BGR, -1)
+            if i == hit_frame:
+                hits.append(i)
+        writer.write(frame)
+    writer.release()
+    return hits
+
+
+# --- detectors ---
+class StubDetector:
+    """
+    Detect stage that finds the synthetic ball / bat by colour and sleeps
+    ball_ms / bat_ms per image to stand in for model latency.
+    """
+
+    def __init__(self, config, ball_model_path, bat_model_path, ball_ms=0.0, bat_ms=0.0):
+        self.ball_ms = ball_ms
+        self.bat_ms = bat_ms
+
+    def balls(self, crops, frame_indices, imgsz=None):
+        if self.ball_ms:
+            time.sleep(self.ball_ms * len(crops) / 1000.0)
+        out = []
+        for crop in crops:
+            pts = cv2.findNonZero(cv2.inRange(crop, (0, 0, 150), (90, 90, 255)))
+            if pts is None or len(pts) < 3:
+                out.append([])
+                continue
+            x, y, w, h = cv2.boundingRect(pts)
+            out.append([(int(round(x + w / 2.0)), int(round(y + h / 2.0)), 0.9)])
+        return out
+
+    def bats(self, crop, frame_idx, imgsz=None):
+        if self.bat_ms:
+            time.sleep(self.bat_ms / 1000.0)
+        mask = cv2.inRange(crop, (0, 150, 0), (90, 255, 90))
+        cnts, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not cnts:
+            return []
+        box = cv2.boxPoints(cv2.minAreaRect(max(cnts, key=cv2.contourArea)))
+        return [(box.astype(int).tolist(), 0.9)]
+
+
+class TimedDetector:
+    """
+    Wraps a detect stage and counts images / seconds per detector.
+    """
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.counts = {"ball": [0, 0.0], "bat": [0, 0.0]}
+
+    def balls(self, crops, frame_indices, imgsz=None):
+        t0 = time.perf_counter()
+        out = self.detector.balls(crops, frame_indices, imgsz=imgsz)
+        self.counts["ball"][0] += len(crops)
+        self.counts["ball"][1] += time.perf_counter() - t0
+        return out
+
+    def bats(self, crop, frame_idx, imgsz=None):
+        t0 = time.perf_counter()
+        out = self.detector.bats(crop, frame_idx, imgsz=imgsz)
+        self.counts["bat"][0] += 1
+        self.counts["bat"][1] += time.perf_counter() - t0
+        return out
+
+
+def stage_fps(items, seconds):
+    return {"items": items, "seconds": seconds, "fps": items / seconds if seconds > 0 else None}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024.0
+
+
+def run_case(case):
+    """
+    One pipeline run (in its own process, so the RSS peak is this run's).
+    """
+    timers = {}
+    contact_time = [0, 0.0]
+
+    def make_detector(config, ball_path, bat_path):
+        if case["detector"] == "stub":
+            det = StubDetector(config, ball_path, bat_path, case["ball_ms"], case["bat_ms"])
+        else:
+            det = YoloDetector(config, ball_path, bat_path)
+        timers["detector"] = TimedDetector(det)
+        return timers["detector"]
+
+    def timed_contact(balls, bats, radius):
+        t0 = time.perf_counter()
+        out = find_contact(balls, bats, radius)
+        contact_time[0] += 1
+        contact_time[1] += time.perf_counter() - t0
+        return out
+
+    if case["trace"]:
+        tracemalloc.start()
+    res = process_video_for_highlight(
+        video_path=case["video"],
+        out_highlight_path=os.path.join(case["out"], "highlight.mp4"),
+        contact_frames_root=os.path.join(case["out"], "contact_frames"),
+        ball_model_path=case["ball"],
+        bat_model_path=case["bat"],
+        stages={"detect": make_detector, "contact": timed_contact},
+        **case["config"])
+    if case["trace"]:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"alloc_peak_mb": peak / (1 << 20), "alloc_end_mb": current / (1 << 20)}
+
+    counts = timers["detector"].counts
+    stages = {
+        "ball_detect": stage_fps(*counts["ball"]),
+        "bat_detect": stage_fps(*counts["bat"]),
+        "contact": stage_fps(*contact_time),
+    }
+    if res["stages"]:  # pipelined: decode / infer / write threads
+        for name in ("decode", "infer", "write"):
+            s = res["stages"][name]
+            stages[name] = stage_fps(s["items"], s["busy_s"])
+    return {
+        "frames": res["frames"],
+        "elapsed_s": res["elapsed_s"],
+        "fps": res["fps"],
+        "contacts": [c["frame_idx"] for c in res["contacts"]],
+        "highlight_frames": res["highlight_frames"],
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def in_subprocess(fn, arg):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(fn, (arg,))
+
+
+def compare(old, new):
+    """
+    FPS change per case between two results files (matched by case name).
+    """
+    before = {r["case"]: r for r in old["results"]}
+    for r in new["results"]:
+        o = before.get(r["case"])
+        if o is None or not o.get("fps") or not r.get("fps"):
+            continue
+        change = 100.0 * (r["fps"] - o["fps"]) / o["fps"]
+        print(f"{r['case']:<60} {o['fps']:8.1f} -> {r['fps']:8.1f} fps ({change:+.1f}%)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", nargs="+", default=["640x360", "1280x720"], help="WIDTHxHEIGHT")
+    ap.add_argument("--frames", nargs="+", type=int, default=[300])
+    ap.add_argument("--cycle", type=int, default=60, help="frames per delivery")
+    ap.add_argument("--detectors", nargs="+", choices=["stub", "real"], default=["stub", "real"],
+                    help="'real' is skipped when the weights are missing")
+    ap.add_argument("--ball", default=os.path.join("models", "cricket_ball_detector.pt"))
+    ap.add_argument("--bat", default=os.path.join("models", "bestBat.pt"))
+    ap.add_argument("--ball-ms", type=float, default=5.0, help="stub ball detector latency per image")
+    ap.add_argument("--bat-ms", type=float, default=5.0, help="stub bat detector latency per image")
+    ap.add_argument("--configs", nargs="+", default=['{}', '{"batch_size": 4, "pipelined": true}'],
+                    help="process_video_for_highlight keyword arguments, one JSON object per config")
+    ap.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc run")
+    ap.add_argument("--out", default=None, help="results JSON (default: benchmarks/results/pipeline_<time>.json)")
+    ap.add_argument("--compare", help="earlier results JSON to compare FPS against")
+    args = ap.parse_args()
+
+    detectors = list(args.detectors)
+    if "real" in detectors and not (os.path.exists(args.ball) and os.path.exists(args.bat)):
+        print(f"[INFO] Skipping real detectors: {args.ball} / {args.bat} not found")
+        detectors.remove("real")
+    configs = [json.loads(c) for c in args.configs]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            width, height = (int(v) for v in size.lower().split("x"))
+            for frames in args.frames:
+                video = os.path.join(tmp, f"clip_{width}x{height}_{frames}.mp4")
+                hits = make_clip(video, width, height, frames, args.cycle)
+                for detector in detectors:
+                    for config in configs:
+                        name = f"{width}x{height}/{frames}f/{detector}/{json.dumps(config, sort_keys=True)}"
+                        case = {"video": video, "detector": detector, "config": config,
+                                "ball": args.ball, "bat": args.bat,
+                                "ball_ms": args.ball_ms, "bat_ms": args.bat_ms,
+                                "out": os.path.join(tmp, f"out_{len(results)}"), "trace": False}
+                        print(f"▶ {name}")
+                        entry = {"case": name, "size": [width, height], "frames": frames,
+                                 "detector": detector, "config": config, "expected_contacts": hits}
+                        entry.update(in_subprocess(run_case, case))
+                        if not args.no_alloc:
+                            entry.update(in_subprocess(run_case, dict(case, trace=True)))
+                        print(f"  {entry['fps']:.1f} fps, {len(entry['contacts'])}/{len(hits)} contacts, "
+                              f"peak RSS {entry['peak_rss_mb'] or 0:.0f} MB")
+                        results.append(entry)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cpu_count": os.cpu_count(),
+        "stub_latency_ms": {"ball": args.ball_ms, "bat": args.bat_ms},
+        "results": results,
+    }
+    out = args.out or os.path.join("benchmarks", "results", f"pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results: {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Pre-roll buffer benchmark: deque of frame copies (old loop) vs FrameRing.
+
+    cd backend
+    python -m benchmarks.preroll_buffer --width 3840 --height 2160 --frames 90
+
+Writes a synthetic clip to a temp dir, then reads it back both ways and
+reports read throughput, bytes allocated for frame buffers and the
+tracemalloc peak.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+
+import cv2
+import numpy as np
+
+from frame_ring import RingReader
+
+
+def make_clip(path, width, height, frames, fps=30):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    base = np.full((height, width, 3), 40, np.uint8)
+    for i in range(frames):
+        frame = base.copy()
+        cv2.circle(frame, (int(width * (0.1 + 0.8 * i / max(1, frames))), height // 2), 12, (0, 0, 230), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def run_deque(path, pre_frames):
+    cap = cv2.VideoCapture(path)
+    frame_buffer = deque(maxlen=pre_frames)
+    allocated = 0
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_buffer.append((n, frame.copy()))
+        allocated += 2 * frame.nbytes  # decoder output + the copy
+        n += 1
+    dt = time.perf_counter() - t0
+    cap.release()
+    return n, dt, allocated
+
+
+def run_ring(path, pre_frames):
+    cap = cv2.VideoCapture(path)
+    reader = RingReader(cap, pre_frames + 1)
+    allocated = 0
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        ret, frame = reader.read()
+        if not ret:
+            break
+        if n == 0:
+            allocated += reader.ring.nbytes + frame.nbytes  # ring + the first (shape-probing) decode
+        elif reader.ring.get(n) is not frame and not np.shares_memory(reader.ring.get(n), frame):
+            allocated += frame.nbytes
+        n += 1
+    dt = time.perf_counter() - t0
+    reader.release()
+    return n, dt, allocated
+
+
+def measure(fn, path, pre_frames):
+    tracemalloc.start()
+    n, dt, allocated = fn(path, pre_frames)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "frames": n,
+        "fps": n / dt if dt > 0 else None,
+        "allocated_mb": allocated / 1e6,
+        "allocated_mb_per_frame": allocated / 1e6 / max(1, n),
+        "peak_traced_mb": peak / 1e6,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--width", type=int, default=3840)
+    ap.add_argument("--height", type=int, default=2160)
+    ap.add_argument("--frames", type=int, default=90)
+    ap.add_argument("--pre-frames", type=int, default=20)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "clip.mp4")
+        make_clip(path, args.width, args.height, args.frames)
+        for name, fn in (("deque+copy", run_deque), ("ring", run_ring)):
+            r = measure(fn, path, args.pre_frames)
+            print(f"{name:11s} {r['frames']} frames  {r['fps']:7.1f} fps  "
+                  f"alloc {r['allocated_mb']:8.1f} MB ({r['allocated_mb_per_frame']:.1f} MB/frame)  "
+                  f"peak {r['peak_traced_mb']:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
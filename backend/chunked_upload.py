@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+
+from upload_store import CHUNK
+
+# -----------------------------------------------------
+# RESUMABLE CHUNKED UPLOADS
+# init -> PUT chunks at the current offset -> finalize. Chunk bodies are
+# written straight to uploads/.store/partial/<id>.part and fed to a
+# running sha256 as they arrive, so nothing is buffered or read twice.
+# A dropped connection keeps every byte that made it; the client asks for
+# the offset and carries on from there. The container header is checked
+# once the first SNIFF_BYTES are in, and finalize hands the file to the
+# UploadStore (deduplicated, hard-linked) with a rename instead of a copy.
+# Space is bounded up front: per-upload size, the bytes all open uploads
+# may still add, and the free disk space left over.
+# -----------------------------------------------------
+
+PARTIAL_DIR = "partial"
+SNIFF_BYTES = 512  # bytes needed to tell the container
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+
+# ISO BMFF (mp4 / mov) top-level boxes a file may start with
+MP4_BOXES = (b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot")
+
+
+class UploadError(Exception):
+    """
+    Rejected upload request; `status` is the HTTP status to answer with,
+    `offset` the server's current offset when the client is out of step.
+    """
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def sniff_container(head):
+    """
+    Container of a file from its first bytes: "mp4", "mkv", "avi" or None.
+    """
+    if len(head) >= 8 and head[4:8] in MP4_BOXES:
+        return "mp4"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "mkv"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    return None
+
+
+class _Session:
+    def __init__(self, upload_id, filename, size, offset=0, created_at=None, container=None):
+        self.id = upload_id
+        self.filename = filename
+        self.size = size
+        self.offset = offset
+        self.created_at = created_at or time.time()
+        self.updated_at = self.created_at
+        self.container = container
+        self.hasher = None  # sha256 of bytes [0, offset); rebuilt from the file after a restart
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "size": self.size,
+            "offset": self.offset,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "container": self.container,
+        }
+
+
+class ChunkedUploads:
+    """
+    Open upload sessions, kept on disk next to their data so they survive a
+    restart. Sessions idle for more than ttl_s are removed.
+    """
+
+    def __init__(self, store, max_bytes, max_pending_bytes, min_free_bytes=0, ttl_s=24 * 3600):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.max_pending_bytes = max_pending_bytes
+        self.min_free_bytes = min_free_bytes
+        self.ttl_s = ttl_s
+        self.partial_dir = os.path.join(store.store_dir, PARTIAL_DIR)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sessions = {}
+        for name in os.listdir(self.partial_dir):
+            if name.endswith(".json"):
+                self._load(name[:-5])
+
+    def _part(self, upload_id):
+        return os.path.join(self.partial_dir, upload_id + ".part")
+
+    def _meta(self, upload_id):
+        return os.path.join(self.partial_dir, upload_id + ".json")
+
+    def _load(self, upload_id):
+        try:
+            with open(self._meta(upload_id)) as f:
+                d = json.load(f)
+            s = _Session(upload_id, d["filename"], d["size"], created_at=d["created_at"], container=d["container"])
+            s.updated_at = d["updated_at"]
+            # the data file is the truth: it may be ahead of the last saved offset
+            s.offset = min(os.path.getsize(self._part(upload_id)), s.size)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] Dropping unreadable upload session {upload_id}: {e}")
+            self._remove_files(upload_id)
+            return
+        self._sessions[upload_id] = s
+
+    def _save(self, s):
+        tmp = self._meta(s.id) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(s.to_dict(), f)
+        os.replace(tmp, self._meta(s.id))
+
+    def _remove_files(self, upload_id):
+        for path in (self._part(upload_id), self._meta(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _drop(self, s):
+        with self._lock:
+            self._sessions.pop(s.id, None)
+        self._remove_files(s.id)
+
+    def _get(self, upload_id):
+        with self._lock:
+            s = self._sessions.get(upload_id)
+        if s is None:
+            raise UploadError("Upload not found", 404)
+        return s
+
+    def _hash(self, s):
+        if s.hasher is None:
+            h = hashlib.sha256()
+            with open(self._part(s.id), "rb") as f:
+                remaining = s.offset
+                while remaining > 0:
+                    block = f.read(min(CHUNK, remaining))
+                    if not block:
+                        break
+                    h.update(block)
+                    remaining -= len(block)
+            s.hasher = h
+        return s.hasher
+
+    def _check_container(self, s):
+        with open(self._part(s.id), "rb") as f:
+            container = sniff_container(f.read(SNIFF_BYTES))
+        if container is None:
+            self._drop(s)
+            raise UploadError("Not a supported video file (expected MP4 / MOV, MKV or AVI)", 415)
+        s.container = container
+
+    def expire(self):
+        """
+        Removes sessions idle for longer than ttl_s; returns how many.
+        """
+        now = time.time()
+        with self._lock:
+            stale = [s for s in self._sessions.values() if now - s.updated_at > self.ttl_s and not s.lock.locked()]
+        for s in stale:
+            print(f"[INFO] Upload {s.id} ({s.filename}) expired at {s.offset}/{s.size} bytes")
+            self._drop(s)
+        return len(stale)
+
+    def create(self, filename, size):
+        """
+        Opens an upload of `size` bytes, once it fits the size and space limits.
+        """
+        filename = os.path.basename(filename or "")
+        if not filename:
+            raise UploadError("Empty filename")
+        if not filename.lower().endswith(VIDEO_EXTENSIONS):
+            raise UploadError(f"Unsupported file type; expected one of {', '.join(VIDEO_EXTENSIONS)}", 415)
+        if size <= 0:
+            raise UploadError("size must be a positive number of bytes")
+        if size > self.max_bytes:
+            raise UploadError(f"Upload too large ({size} > {self.max_bytes} bytes)", 413)
+        self.expire()
+        with self._lock:
+            pending = sum(s.size - s.offset for s in self._sessions.values())
+            if pending + size > self.max_pending_bytes:
+                raise UploadError("Too many uploads in progress, try again later", 507)
+            if shutil.disk_usage(self.partial_dir).free - pending - size < self.min_free_bytes:
+                raise UploadError("Not enough disk space for this upload", 507)
+            s = _Session(uuid.uuid4().hex, filename, size)
+            s.hasher = hashlib.sha256()
+            open(self._part(s.id), "wb").close()
+            self._save(s)
+            self._sessions[s.id] = s
+        return s.to_dict()
+
+    def status(self, upload_id):
+        return self._get(upload_id).to_dict()
+
+    def write(self, upload_id, offset, stream):
+        """
+        Appends the chunk read from `stream` at `offset`, which has to be the
+        session's current offset (409 otherwise, with the right one).
+        Bytes that arrived before a broken connection are kept.
+        """
+        s = self._get(upload_id)
+        if not s.lock.acquire(blocking=False):
+            raise UploadError("Another chunk of this upload is still being written", 409, s.offset)
+        try:
+            if offset != s.offset:
+                raise UploadError(f"Offset mismatch: upload is at byte {s.offset}", 409, s.offset)
+            h = self._hash(s)
+            with open(self._part(s.id), "r+b") as f:
+                # anything past the offset is from a write that never completed
+                f.seek(s.offset)
+                f.truncate()
+                try:
+                    while True:
+                        block = stream.read(min(CHUNK, s.size - s.offset + 1))
+                        if not block:
+                            break
+                        if s.offset + len(block) > s.size:
+                            raise UploadError(f"Chunk runs past the declared size of {s.size} bytes", 413, s.offset)
+                        f.write(block)
+                        h.update(block)
+                        s.offset += len(block)
+                finally:
+                    s.updated_at = time.time()
+                    f.flush()
+                    self._save(s)
+            if s.container is None and (s.offset >= SNIFF_BYTES or s.offset == s.size):
+                self._check_container(s)
+                self._save(s)
+            return s.to_dict()
+        finally:
+            s.lock.release()
+
+    def finalize(self, upload_id, sha256=None):
+        """
+        Moves a complete upload into the UploadStore. Returns (name, sha256, deduplicated).
+        A given sha256 that doesn't match discards the upload (422).
+        """
+        s = self._get(upload_id)
+        if not s.lock.acquire(blocking=False):
+            raise UploadError("A chunk of this upload is still being written", 409, s.offset)
+        try:
+            if s.offset != s.size:
+                raise UploadError(f"Upload incomplete: {s.offset} of {s.size} bytes", 409, s.offset)
+            if s.container is None:
+                self._check_container(s)
+            digest = self._hash(s).hexdigest()
+            if sha256 and sha256.lower() != digest:
+                self._drop(s)
+                raise UploadError(f"sha256 mismatch: received content hashes to {digest}", 422)
+            name, deduplicated = self.store.adopt(self._part(s.id), s.filename, digest)
+            self._drop(s)
+            print(f"[INFO] Upload {s.id} finished: {name} ({s.size} bytes, {s.container})")
+            return name, digest, deduplicated
+        finally:
+            s.lock.release()
+
+    def abort(self, upload_id):
+        s = self._get(upload_id)
+        if not s.lock.acquire(blocking=False):
+            raise UploadError("A chunk of this upload is still being written", 409, s.offset)
+        try:
+            self._drop(s)
+        finally:
+            s.lock.release()
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "open": len(sessions),
+            "pending_bytes": sum(s.size - s.offset for s in sessions),
+            "max_pending_bytes": self.max_pending_bytes,
+        }
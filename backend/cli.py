@@ -0,0 +1,86 @@
+"""
+Runs the highlight pipeline on a video from the command line.
+
+    cd backend
+    python cli.py uploads/match.mp4 --out out/match
+    python cli.py uploads/match.mp4 --config tuned.json --batch-size 4 --pipelined true
+    python cli.py rtsp://camera/stream --live --out out/live
+    python cli.py uploads/match.mp4 --live --realtime --max-latency-s 0.5
+
+--config is a JSON file of engine.PipelineConfig settings; every setting
+also has its own flag (--contact-radius, --detect-stride, ...), which wins
+over the file. Writes <out>/highlight.mp4 and <out>/contact_frames/.
+
+--live reads the video as a live source (camera index, stream URL, named
+pipe or a file still being written; --realtime plays a recorded file back
+at its frame rate) and writes each contact as its own clip in
+<out>/contact_frames/ as soon as it's complete; see live.py.
+"""
+import os
+import json
+import argparse
+
+from engine import PipelineConfig, HighlightEngine
+from live import run_live, LIVE_BUFFER_S
+
+MODEL_FOLDER = os.path.join(os.getcwd(), "models")
+
+
+def parse_value(text):
+    """
+    Flag value as JSON when it parses (numbers, true/false, null, objects), else the string.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("video")
+    ap.add_argument("--out", default="output")
+    ap.add_argument("--ball", default=os.path.join(MODEL_FOLDER, "cricket_ball_detector.pt"))
+    ap.add_argument("--bat", default=os.path.join(MODEL_FOLDER, "bestBat.pt"))
+    ap.add_argument("--no-highlight", action="store_true", help="only find contacts")
+    ap.add_argument("--config", help="JSON file of pipeline settings")
+    ap.add_argument("--live", action="store_true", help="treat the video as a live source")
+    ap.add_argument("--realtime", action="store_true", help="--live: play a recorded file back in real time")
+    ap.add_argument("--buffer-s", type=float, default=LIVE_BUFFER_S, help="--live: seconds of frames buffered before dropping")
+    ap.add_argument("--idle-timeout", type=float, default=5.0, help="--live: seconds without a frame that end the stream")
+    for name, default in PipelineConfig.FIELDS.items():
+        ap.add_argument("--" + name.replace("_", "-"), dest=name, type=parse_value, default=None,
+                        help=f"default: {json.dumps(default)}")
+    args = ap.parse_args()
+
+    overrides = {name: getattr(args, name) for name in PipelineConfig.FIELDS if getattr(args, name) is not None}
+    config = PipelineConfig.from_file(args.config, **overrides) if args.config else PipelineConfig(**overrides)
+
+    if args.live:
+        res = run_live(args.video, args.out, args.ball, args.bat, config, realtime=args.realtime,
+                       buffer_s=args.buffer_s, idle_timeout=args.idle_timeout, highlight=not args.no_highlight)
+    else:
+        out_highlight = None if args.no_highlight else os.path.join(args.out, "highlight.mp4")
+        res = HighlightEngine(config).run(args.video, out_highlight, os.path.join(args.out, "contact_frames"),
+                                          args.ball, args.bat)
+    summary = {
+        "contacts": [c["frame_idx"] for c in res["contacts"]],
+        "highlight_path": res["highlight_path"],
+        "highlight_frames": res["highlight_frames"],
+        "contacts_json": res["contacts_json"],
+        "frames": res["frames"],
+        "fps": res["fps"],
+    }
+    if res["delivery"] is not None:
+        summary["delivery"] = res["delivery"]
+    if res["clips"] is not None:
+        summary["clips"] = [c["path"] for c in res["clips"]]
+    if res["source"] is not None:
+        summary["source"] = res["source"]
+        summary["latency"] = res["metrics"]["latency"]
+        summary["shed_frames"] = res["metrics"]["counters"]["shed"]
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+
+# -----------------------------------------------------
+# PER-CONTACT HIGHLIGHT CLIPS
+# With clips=True every contact also gets its own short clip of
+# [contact - pre_frames, contact + post_frames], released the moment its
+# last frame is written so a live run can hand it out while the stream
+# keeps going. Overlapping windows each get all of their frames. A
+# recorder is only used from one thread: the frame loop, or the writer
+# thread of a pipelined run.
+# -----------------------------------------------------
+
+
+class ClipRecorder:
+    """
+    Frames come in through write(idx, frame) in frame order and go to every
+    open clip whose window holds them. clip_cb(clip) is called after a clip's
+    file is closed; lag_fn(idx) (live sources) gives the clip's latency.
+    """
+
+    def __init__(self, root, fps, size, open_writer, pre_frames, post_frames, clip_cb=None, lag_fn=None):
+        self.root = root
+        self.fps = fps
+        self.size = size
+        self.open_writer = open_writer
+        self.pre_frames = pre_frames
+        self.post_frames = post_frames
+        self.clip_cb = clip_cb
+        self.lag_fn = lag_fn
+        self.clips = []  # finished clips, in the order they were closed
+        self._open = []  # [clip, writer, last written idx]
+
+    def start(self, contact_idx):
+        path = os.path.join(self.root, f"clip_{contact_idx:06d}.mp4")
+        writer = self.open_writer(path, self.fps, self.size)
+        if writer is None:
+            print(f"[WARN] No clip written for the contact at frame {contact_idx}")
+            return
+        clip = {"frame_idx": contact_idx, "path": path, "first_frame": None,
+                "last_frame": None, "frames": 0, "latency_s": None}
+        self._open.append([clip, writer, contact_idx - self.pre_frames - 1])
+
+    def write(self, idx, frame):
+        for entry in list(self._open):
+            clip, writer, last = entry
+            if idx <= last:
+                continue  # pre-roll another clip already took
+            writer.write(frame)
+            entry[2] = idx
+            if clip["first_frame"] is None:
+                clip["first_frame"] = idx
+            clip["last_frame"] = idx
+            clip["frames"] += 1
+            if idx >= clip["frame_idx"] + self.post_frames:
+                self._finish(entry)
+
+    def close(self):
+        """
+        Releases clips the stream ended inside of (shorter post-roll).
+        """
+        for entry in list(self._open):
+            self._finish(entry)
+
+    def _finish(self, entry):
+        clip, writer, last = entry
+        writer.release()
+        self._open.remove(entry)
+        if self.lag_fn is not None and clip["last_frame"] is not None:
+            clip["latency_s"] = self.lag_fn(clip["last_frame"])
+        self.clips.append(clip)
+        print(f"[CLIP] {clip['path']} ({clip['frames']} frames)")
+        if self.clip_cb is not None:
+            self.clip_cb(dict(clip))
@@ -0,0 +1,96 @@
+import math
+import numpy as np
+
+# -----------------------------------------------------
+# BALL-BAT CONTACT TEST
+# Vectorized replacement for the per-pair shapely check
+#     Point(cx, cy).buffer(r).intersects(Polygon(pts)) and Polygon(pts).is_valid
+# All ball candidates are tested against all bat quads in one NumPy pass.
+# shapely's buffer is a 64-gon inscribed in the circle, so pairs whose
+# distance falls in the thin band between that polygon and the true circle,
+# and quads that aren't strictly convex (possibly invalid), are decided by
+# shapely itself to keep results identical.
+# -----------------------------------------------------
+
+BUFFER_SEGMENTS = 64  # shapely default: quad_segs=16 per quarter circle
+_EPS = 1e-9
+_NEXT = [1, 2, 3, 0]
+
+
+def find_contact_shapely(balls, bats, radius):
+    """
+    Reference implementation (the original loop). Returns (ball, bat) or (None, None).
+    """
+    from shapely.geometry import Point, Polygon
+
+    for (cx, cy, bconf) in balls:
+        ball_area = Point(cx, cy).buffer(radius)
+        for (pts, bat_conf) in bats:
+            poly = Polygon(pts)
+            if poly.is_valid and ball_area.intersects(poly):
+                return (cx, cy, float(bconf)), (pts, float(bat_conf))
+    return None, None
+
+
+def _pair_shapely(ball, bat, radius):
+    return find_contact_shapely([ball], [bat], radius)[0] is not None
+
+
+def contact_matrix(centers, quads, radius):
+    """
+    centers: (B, 2) ball centres, quads: (K, 4, 2) bat corners.
+    Returns a (B, K) int8 matrix: 1 = contact, 0 = no contact,
+    2 = undecided (must be checked against shapely).
+    """
+    if radius <= 0:
+        # shapely's buffer of 0 (or less) is empty and intersects nothing, even inside the quad
+        return np.zeros((len(centers), len(quads)), dtype=np.int8)
+    c = np.array(centers, dtype=np.float64).reshape(-1, 2)
+    q = np.array(quads, dtype=np.float64).reshape(-1, 4, 2)
+    e = q[:, _NEXT] - q                                           # (K, 4, 2) edge vectors
+    ex, ey = e[..., 0], e[..., 1]
+    qx, qy = q[..., 0], q[..., 1]
+
+    turns = ex * ey[:, _NEXT] - ey * ex[:, _NEXT]
+    convex = (turns > 0).all(axis=1) | (turns < 0).all(axis=1)   # strictly convex -> valid
+    orient = np.sign(turns[:, :1])                                # (K, 1)
+
+    rx = c[:, 0, None, None] - qx                                 # (B, K, 4)
+    ry = c[:, 1, None, None] - qy
+    inside = ((ex * ry - ey * rx) * orient >= 0).all(axis=2)      # (B, K)
+
+    elen2 = ex * ex + ey * ey
+    elen2[elen2 == 0] = 1.0
+    t = (rx * ex + ry * ey) / elen2
+    np.maximum(t, 0.0, out=t)
+    np.minimum(t, 1.0, out=t)
+    dx = rx - t * ex
+    dy = ry - t * ey
+    d2 = (dx * dx + dy * dy).min(axis=2)                          # (B, K)
+
+    inner = radius * math.cos(math.pi / BUFFER_SEGMENTS) - _EPS
+    outer = radius + _EPS
+    status = np.where(inside | (d2 < inner * inner), 1, np.where(d2 > outer * outer, 0, 2)).astype(np.int8)
+    status[:, ~convex] = 2
+    return status
+
+
+def find_contact(balls, bats, radius):
+    """
+    First (ball, bat) pair in contact, in the same ball-major order as the
+    shapely loop. balls: [(cx, cy, conf)], bats: [(pts, conf)].
+    Returns (ball, bat) or (None, None).
+    """
+    if not balls or not bats:
+        return None, None
+    centers = [(b[0], b[1]) for b in balls]
+    quads = [pts for pts, _ in bats]
+    if any(len(q) != 4 for q in quads):
+        return find_contact_shapely(balls, bats, radius)
+
+    status = contact_matrix(centers, quads, radius)
+    for i, j in zip(*np.nonzero(status)):
+        (cx, cy, bconf), (pts, bat_conf) = balls[i], bats[j]
+        if status[i, j] == 1 or _pair_shapely(balls[i], bats[j], radius):
+            return (cx, cy, float(bconf)), (pts, float(bat_conf))
+    return None, None
@@ -0,0 +1,221 @@
+import os
+import shutil
+import struct
+import cv2
+import stream_copy
+
+# -----------------------------------------------------
+# HIGHLIGHT DELIVERY
+# Runs after the highlight is assembled so phones can start playing it
+# without downloading the whole file:
+#   faststart -> the MP4's moov atom (the index a player needs first) is
+#                moved in front of the media data, in place. Pure Python,
+#                no re-encode: only the chunk offset tables are shifted.
+#   hls       -> faststart plus an H.264 HLS ladder (HLS_LADDER heights, no
+#                taller than the source) in <highlight>_hls/ with a
+#                master.m3u8 and HLS_SEGMENT_S second segments, so playback
+#                starts after the first segment. Needs ffmpeg; skipped with a
+#                warning without it.
+# -----------------------------------------------------
+
+DELIVERY_MODES = ("none", "faststart", "hls")
+
+# (height, video bitrate) of each HLS rendition
+HLS_LADDER = ((360, 800_000), (720, 2_500_000))
+HLS_SEGMENT_S = 2
+HLS_PROFILE = ("main", "4d40")  # x264 profile, RFC 6381 profile_idc + constraint flags (Main: set1)
+# H.264 levels (level_idc, max frame size, max macroblocks / s), lowest first
+H264_LEVELS = ((30, 1620, 40500), (31, 3600, 108000), (32, 5120, 216000), (40, 8192, 245760),
+               (42, 8704, 522240), (50, 22080, 589824), (51, 36864, 983040))
+
+COPY_CHUNK = 1 << 20
+# boxes on the path from moov down to the chunk offset tables
+CONTAINER_BOXES = (b"moov", b"trak", b"mdia", b"minf", b"stbl")
+
+
+class DeliveryError(Exception):
+    pass
+
+
+def _boxes(f, start, end):
+    """
+    (type, offset, size, header size) of the boxes in [start, end) of file f.
+    """
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, kind = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - pos  # runs to the end of the file
+        if size < header or pos + size > end:
+            raise DeliveryError(f"Corrupt MP4 box {kind!r} at byte {pos}")
+        yield kind, pos, size, header
+        pos += size
+
+
+def _shift_offsets(moov, delta):
+    """
+    Adds delta to every stco / co64 chunk offset inside the moov box bytes (in place).
+    """
+    def walk(start, end):
+        pos = start
+        while pos + 8 <= end:
+            size, kind = struct.unpack_from(">I4s", moov, pos)
+            header = 8
+            if size == 1:
+                size = struct.unpack_from(">Q", moov, pos + 8)[0]
+                header = 16
+            if size < header or pos + size > end:
+                raise DeliveryError(f"Corrupt box {kind!r} inside moov")
+            body = pos + header
+            if kind in CONTAINER_BOXES:
+                walk(body, pos + size)
+            elif kind in (b"stco", b"co64"):
+                count = struct.unpack_from(">I", moov, body + 4)[0]
+                fmt, width = (">I", 4) if kind == b"stco" else (">Q", 8)
+                for i in range(count):
+                    at = body + 8 + i * width
+                    value = struct.unpack_from(fmt, moov, at)[0] + delta
+                    if kind == b"stco" and value > 0xFFFFFFFF:
+                        raise DeliveryError("Chunk offsets overflow 32 bits after moving moov")
+                    struct.pack_into(fmt, moov, at, value)
+            pos += size
+
+    walk(0, len(moov))
+
+
+def faststart(path):
+    """
+    Moves the moov box of an MP4 in front of its mdat (rewrites the file).
+    Returns False when it already was there.
+    """
+    end = os.path.getsize(path)
+    with open(path, "rb") as f:
+        boxes = list(_boxes(f, 0, end))
+        kinds = [b[0] for b in boxes]
+        if b"moov" not in kinds or b"mdat" not in kinds:
+            raise DeliveryError(f"{path} has no moov / mdat box")
+        moov_i = kinds.index(b"moov")
+        mdat_i = kinds.index(b"mdat")
+        if moov_i < mdat_i:
+            return False
+        _, moov_pos, moov_size, _ = boxes[moov_i]
+        f.seek(moov_pos)
+        moov = bytearray(f.read(moov_size))
+        _shift_offsets(moov, moov_size)
+        order = boxes[:mdat_i] + [None] + [b for b in boxes[mdat_i:] if b[0] != b"moov"]
+        tmp = path + ".faststart"
+        try:
+            with open(tmp, "wb") as out:
+                for box in order:
+                    if box is None:
+                        out.write(moov)
+                        continue
+                    f.seek(box[1])
+                    remaining = box[2]
+                    while remaining > 0:
+                        block = f.read(min(COPY_CHUNK, remaining))
+                        if not block:
+                            raise DeliveryError(f"{path} ended inside box {box[0]!r}")
+                        out.write(block)
+                        remaining -= len(block)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return True
+
+
+def h264_level(width, height, fps):
+    """
+    Lowest H.264 level_idc that fits the frame size and rate.
+    """
+    mbs = ((width + 15) // 16) * ((height + 15) // 16)
+    for level, max_fs, max_mbps in H264_LEVELS:
+        if mbs <= max_fs and mbs * fps <= max_mbps:
+            return level
+    raise DeliveryError(f"No H.264 level for {width}x{height} at {fps:.1f} fps")
+
+
+def hls_dir(highlight_path):
+    return os.path.splitext(highlight_path)[0] + "_hls"
+
+
+def hls_ladder(src, out_dir, ladder=HLS_LADDER, segment_s=HLS_SEGMENT_S):
+    """
+    Encodes the HLS renditions of src into out_dir and writes master.m3u8.
+    Each rendition is encoded at an explicit profile and level, which also
+    give its CODECS string (highlights carry no audio).
+    Returns {"master": path, "renditions": [{height, width, bitrate, codecs, playlist}]}.
+    """
+    if shutil.which(stream_copy.FFMPEG) is None:
+        raise DeliveryError("ffmpeg not found")
+    cap = cv2.VideoCapture(src)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    src_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    src_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    if not src_w or not src_h:
+        raise DeliveryError(f"Could not read {src}")
+    # no upscaling, but always the smallest rendition
+    rungs = [r for r in ladder if r[0] <= src_h] or [min(ladder)]
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    gop = max(1, int(round(fps * segment_s)))  # a keyframe at every segment start
+    renditions = []
+    for height, bitrate in rungs:
+        height = min(height, src_h)
+        width = int(round(src_w * height / src_h / 2.0)) * 2
+        playlist = os.path.join(out_dir, f"{height}p.m3u8")
+        level = h264_level(width, height, fps)
+        stream_copy._run([
+            stream_copy.FFMPEG, "-y", "-v", "error", "-i", src,
+            "-map", "0:v:0", "-an",
+            "-vf", f"scale={width}:{height}",
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", HLS_PROFILE[0],
+            "-level:v", f"{level / 10:.1f}", "-pix_fmt", "yuv420p",
+            "-b:v", str(bitrate), "-maxrate", str(int(bitrate * 1.1)), "-bufsize", str(int(bitrate * 1.5)),
+            "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+            "-f", "hls", "-hls_time", str(segment_s), "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(out_dir, f"{height}p_%03d.ts"),
+            playlist])
+        renditions.append({"height": height, "width": width, "bitrate": bitrate,
+                           "codecs": f"avc1.{HLS_PROFILE[1]}{level:02x}", "playlist": playlist})
+    master = os.path.join(out_dir, "master.m3u8")
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for r in renditions:
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={int(r["bitrate"] * 1.1)},'
+                     f'RESOLUTION={r["width"]}x{r["height"]},CODECS="{r["codecs"]}"')
+        lines.append(os.path.basename(r["playlist"]))
+    with open(master, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return {"master": master, "renditions": renditions}
+
+
+def deliver(highlight_path, mode="faststart"):
+    """
+    Delivery stage for a finished highlight (see DELIVERY_MODES). Failures
+    only cost the optimisation: they're reported and the highlight stays as it is.
+    Returns {"mode", "faststart", "hls", "error"}; faststart is what was done:
+    "moved" (moov moved to the front), "already" (it was there) or None.
+    """
+    report = {"mode": mode, "faststart": None, "hls": None, "error": None}
+    if mode == "none" or not highlight_path or not os.path.exists(highlight_path):
+        return report
+    try:
+        report["faststart"] = "moved" if faststart(highlight_path) else "already"
+    except (DeliveryError, OSError, struct.error) as e:
+        print(f"[WARN] Faststart skipped for {highlight_path}: {e}")
+        report["error"] = str(e)
+    if mode == "hls":
+        try:
+            report["hls"] = hls_ladder(highlight_path, hls_dir(highlight_path))
+            print(f"[INFO] HLS ladder written: {report['hls']['master']}")
+        except (DeliveryError, stream_copy.StreamCopyError, OSError) as e:
+            print(f"[WARN] HLS renditions skipped: {e}")
+            report["error"] = str(e)
+    return report
@@ -0,0 +1,102 @@
+# -----------------------------------------------------
+# DETECTOR HELPERS
+# Parsing of YOLO results into the (cx, cy, conf) ball tuples and
+# (pts, conf) bat polygons used by the frame loops, plus a batched
+# ball-inference call. imgsz=None keeps the model's default input size.
+# Bat parsing takes the Colab script's rules for both loops: a bat model
+# without an OBB head yields its axis-aligned boxes as four-corner
+# polygons. The Flask path used to read OBB results only and found no bats
+# with such a model; OBB models give the same polygons as before.
+# -----------------------------------------------------
+
+
+def parse_ball_result(r0):
+    """
+    Converts one ultralytics Results object into [(cx, cy, conf), ...] in 640 space.
+    """
+    balls = []
+    if r0 is not None and hasattr(r0, 'boxes') and r0.boxes is not None and len(r0.boxes) > 0:
+        boxes_xyxy = r0.boxes.xyxy.cpu().numpy()
+        confs = r0.boxes.conf.cpu().numpy()
+        for (x1, y1, x2, y2), conf in zip(boxes_xyxy, confs):
+            cx = int(round((x1 + x2) / 2.0))
+            cy = int(round((y1 + y2) / 2.0))
+            balls.append((cx, cy, float(conf)))
+    return balls
+
+
+def _size_kw(imgsz):
+    return {} if imgsz is None else {"imgsz": imgsz}
+
+
+def detect_balls(ball_model, crop, conf, iou, frame_idx=None, imgsz=None):
+    """
+    Single-frame ball detection. Failures are logged and treated as "no ball".
+    """
+    try:
+        ball_results = ball_model(crop, conf=conf, iou=iou, classes=[0], **_size_kw(imgsz))
+        if ball_results and len(ball_results) > 0:
+            return parse_ball_result(ball_results[0])
+    except Exception as e:
+        print(f"[WARN] Ball detection failed at frame {frame_idx}: {e}")
+    return []
+
+
+def detect_balls_batch(ball_model, crops, conf, iou, frame_indices=None, imgsz=None):
+    """
+    Runs the ball detector once over a list of 640x640 crops.
+    Returns one ball list per crop, in input order. If the batched call
+    fails the crops are retried one by one so a single bad frame only
+    loses its own detections (same as the sequential path).
+    """
+    if frame_indices is None:
+        frame_indices = [None] * len(crops)
+    if len(crops) == 1:
+        return [detect_balls(ball_model, crops[0], conf, iou, frame_indices[0], imgsz)]
+
+    try:
+        ball_results = ball_model(list(crops), conf=conf, iou=iou, classes=[0], **_size_kw(imgsz))
+        if ball_results is not None and len(ball_results) == len(crops):
+            return [parse_ball_result(r) for r in ball_results]
+        print(f"[WARN] Batched ball detection returned {len(ball_results or [])} results "
+              f"for {len(crops)} frames; retrying per frame")
+    except Exception as e:
+        print(f"[WARN] Batched ball detection failed ({e}); retrying per frame")
+
+    return [detect_balls(ball_model, c, conf, iou, i, imgsz) for c, i in zip(crops, frame_indices)]
+
+
+def parse_bat_results(bat_results):
+    """
+    Oriented boxes -> [(pts, conf), ...] with pts as four [x, y] corners.
+    Models without an OBB head fall back to their axis-aligned boxes
+    (previously Colab-only; the Flask path ignored them).
+    """
+    bats = []
+    for r in bat_results or []:
+        obb_attr = getattr(r, 'obb', None)
+        if obb_attr is not None and getattr(obb_attr, 'xyxyxyxy', None) is not None:
+            obb_boxes = obb_attr.xyxyxyxy.cpu().numpy()
+            obb_confs = obb_attr.conf.cpu().numpy()
+            for box_flat, conf in zip(obb_boxes, obb_confs):
+                pts = box_flat.reshape(4, 2).astype(int).tolist()
+                bats.append((pts, float(conf)))
+        elif hasattr(r, 'boxes') and r.boxes is not None and len(r.boxes) > 0:
+            boxes_xyxy = r.boxes.xyxy.cpu().numpy()
+            confs = r.boxes.conf.cpu().numpy()
+            for (x1, y1, x2, y2), conf in zip(boxes_xyxy, confs):
+                pts = [[int(x1), int(y1)], [int(x2), int(y1)],
+                       [int(x2), int(y2)], [int(x1), int(y2)]]
+                bats.append((pts, float(conf)))
+    return bats
+
+
+def detect_bats(bat_model, crop, conf, imgsz, frame_idx=None):
+    """
+    Single-frame bat detection. Failures are logged and treated as "no bat".
+    """
+    try:
+        return parse_bat_results(bat_model.predict(source=crop, imgsz=imgsz, conf=conf, verbose=False))
+    except Exception as e:
+        print(f"[WARN] Bat detection failed at frame {frame_idx}: {e}")
+    return []
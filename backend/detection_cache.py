@@ -0,0 +1,351 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+import cv2
+import numpy as np
+
+import batball_video
+from engine import adaptive_square_crop, annotate_contact, contact_record, set_highlight_positions, ProcessingCancelled
+from detection import detect_balls, detect_bats
+from model_registry import registry
+from metrics import RunMetrics, pipeline_metrics
+from delivery import deliver
+from replay import BallState, replay_contacts, highlight_ranges, FrameFetcher, export_highlight
+
+# -----------------------------------------------------
+# PER-FRAME DETECTION CACHE
+# Raw ball boxes and bat OBBs (with confidences) of every frame the
+# detectors ran on, stored per (video hash, ball weights hash, bat weights
+# hash) as flat NumPy arrays plus per-frame offsets (CSR layout), so an
+# entry is memory-mapped and any frame is an O(1) slice. replay_from_cache
+# re-runs only the state machine, contact test and highlight cut with new
+# parameters; frames the new parameters need but the cache lacks (e.g.
+# former cooldown frames) are detected on demand and added to the entry.
+# -----------------------------------------------------
+
+CACHE_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+_hash_lock = threading.Lock()
+_hash_memo = {}  # (abspath, size, mtime) -> sha256 hex
+
+
+def file_hash(path):
+    """
+    sha256 of a file, memoized per (path, size, mtime). For a directory (an
+    exported OpenVINO model) it hashes the names and hashes of its files.
+    """
+    if os.path.isdir(path):
+        h = hashlib.sha256()
+        for dirpath, dirnames, files in sorted(os.walk(path)):
+            dirnames.sort()
+            for name in sorted(files):
+                full = os.path.join(dirpath, name)
+                h.update(os.path.relpath(full, path).encode())
+                h.update(file_hash(full).encode())
+        return h.hexdigest()
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    with _hash_lock:
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+def remember_hash(path, digest):
+    """
+    Seeds file_hash with a digest computed elsewhere (e.g. while uploading).
+    """
+    st = os.stat(path)
+    with _hash_lock:
+        _hash_memo[(os.path.abspath(path), st.st_size, st.st_mtime)] = digest
+
+
+def _pack(by_frame, n_frames, width):
+    """
+    {frame: [rows]} -> (ran flags, offsets, flat rows) for frames 0..n_frames-1.
+    """
+    ran = np.zeros(n_frames, np.uint8)
+    offsets = np.zeros(n_frames + 1, np.int64)
+    rows = []
+    for idx in range(n_frames):
+        items = by_frame.get(idx)
+        if items is not None:
+            ran[idx] = 1
+            rows.extend(items)
+        offsets[idx + 1] = len(rows)
+    return ran, offsets, np.asarray(rows, np.float64).reshape(-1, width)
+
+
+class CachedDetections:
+    """
+    Read-only, memory-mapped view of one cache entry.
+    balls(idx) / bats(idx) return None for frames the detector didn't run on.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.n_frames = self.meta["n_frames"]
+        self.record_conf = self.meta["record_conf"]
+        load = lambda name: np.load(os.path.join(path, name + ".npy"), mmap_mode='r')
+        self.ball_ran, self.ball_offsets, self.ball_rows = load("ball_ran"), load("ball_offsets"), load("ball_rows")
+        self.bat_ran, self.bat_offsets, self.bat_rows = load("bat_ran"), load("bat_offsets"), load("bat_rows")
+
+    def balls(self, idx):
+        if idx >= self.n_frames or not self.ball_ran[idx]:
+            return None
+        rows = self.ball_rows[self.ball_offsets[idx]:self.ball_offsets[idx + 1]]
+        return [(int(x), int(y), float(c)) for x, y, c in rows]
+
+    def bats(self, idx):
+        if idx >= self.n_frames or not self.bat_ran[idx]:
+            return None
+        rows = self.bat_rows[self.bat_offsets[idx]:self.bat_offsets[idx + 1]]
+        return [([[int(r[0]), int(r[1])], [int(r[2]), int(r[3])], [int(r[4]), int(r[5])], [int(r[6]), int(r[7])]],
+                 float(r[8])) for r in rows]
+
+    def to_dicts(self):
+        balls = {idx: self.balls(idx) for idx in np.flatnonzero(self.ball_ran).tolist()}
+        bats = {idx: self.bats(idx) for idx in np.flatnonzero(self.bat_ran).tolist()}
+        return balls, bats
+
+
+class DetectionCache:
+    """
+    Directory of cache entries, one subdirectory per key.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, video_path, ball_model_path, bat_model_path, video_hash=None):
+        video_hash = video_hash or file_hash(video_path)
+        return f"{video_hash[:24]}_{file_hash(ball_model_path)[:12]}_{file_hash(bat_model_path)[:12]}"
+
+    def load(self, key):
+        path = os.path.join(self.root, key)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        cached = CachedDetections(path)
+        if cached.meta.get("version") != CACHE_VERSION:
+            return None
+        return cached
+
+    def store(self, key, n_frames, balls, bats, meta=None):
+        """
+        Saves {frame: [(cx, cy, conf)]} / {frame: [(pts, conf)]}, merged with
+        what the entry already holds. Written to a temp dir, then swapped in.
+        """
+        with self._lock:
+            old = self.load(key)
+            if old is not None:
+                old_balls, old_bats = old.to_dicts()
+                old_balls.update(balls)
+                old_bats.update(bats)
+                balls, bats = old_balls, old_bats
+                n_frames = max(n_frames, old.n_frames)
+                meta = dict(old.meta, **(meta or {}))
+            meta = dict(meta or {}, version=CACHE_VERSION, n_frames=n_frames, updated_at=time.time())
+
+            final = os.path.join(self.root, key)
+            tmp = f"{final}.tmp-{os.getpid()}-{threading.get_ident()}"
+            os.makedirs(tmp, exist_ok=True)
+            ball_ran, ball_offsets, ball_rows = _pack(balls, n_frames, 3)
+            bat_ran, bat_offsets, bat_rows = _pack(
+                {i: [[c for p in pts for c in p] + [conf] for pts, conf in v] for i, v in bats.items()}, n_frames, 9)
+            for name, arr in (("ball_ran", ball_ran), ("ball_offsets", ball_offsets), ("ball_rows", ball_rows),
+                              ("bat_ran", bat_ran), ("bat_offsets", bat_offsets), ("bat_rows", bat_rows)):
+                np.save(os.path.join(tmp, name + ".npy"), arr)
+            with open(os.path.join(tmp, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+            if os.path.exists(final):
+                shutil.rmtree(final)
+            os.replace(tmp, final)
+            return final
+
+
+class FrameDetections:
+    """
+    Per-frame detections from recorded results (dicts and/or a cache entry),
+    detecting frames that are missing on demand. `conf` above the recorded
+    confidence filters the recorded boxes (same result as running the
+    detector at that confidence).
+    """
+
+    def __init__(self, video_path, ball_model_path, bat_model_path, device='cpu',
+                 balls=None, bats=None, cached=None, record_conf=None, conf=None):
+        self.video_path = video_path
+        self.ball_model_path = ball_model_path
+        self.bat_model_path = bat_model_path
+        self.device = device
+        self.balls = balls if balls is not None else {}
+        self.bats = bats if bats is not None else {}
+        self.cached = cached
+        self.record_conf = record_conf if record_conf is not None else batball_video.CONF_THRESH
+        self.conf = conf if conf is not None else self.record_conf
+        if self.conf < self.record_conf:
+            raise ValueError(f"Detections were recorded at conf {self.record_conf}; "
+                             f"a lower threshold ({self.conf}) needs a fresh run")
+        self.new_balls = {}
+        self.new_bats = {}
+        self.fetcher = FrameFetcher(video_path)
+        self._crop_idx = None
+        self._crop = None
+        self.frame_size = None
+
+    def crop(self, frame_idx):
+        if self._crop_idx != frame_idx:
+            frame = self.fetcher.get(frame_idx)
+            self.frame_size = (frame.shape[1], frame.shape[0])
+            self._crop = adaptive_square_crop(frame, batball_video.CROP_SIZE)
+            self._crop_idx = frame_idx
+        return self._crop
+
+    def _lookup(self, frame_idx, recorded, cached_fn):
+        items = recorded.get(frame_idx)
+        if items is None and self.cached is not None:
+            items = cached_fn(frame_idx)
+        return items
+
+    def get_balls(self, frame_idx):
+        balls = self._lookup(frame_idx, self.balls, self.cached.balls if self.cached else None)
+        if balls is None:
+            ball_model = registry.get(self.ball_model_path, self.device)
+            balls = detect_balls(ball_model, self.crop(frame_idx), self.record_conf, batball_video.IOU, frame_idx)
+            self.balls[frame_idx] = self.new_balls[frame_idx] = balls
+        if self.conf > self.record_conf:
+            balls = [b for b in balls if b[2] >= self.conf]
+        return balls
+
+    def get_bats(self, frame_idx):
+        bats = self._lookup(frame_idx, self.bats, self.cached.bats if self.cached else None)
+        if bats is None:
+            bat_model = registry.get(self.bat_model_path, self.device)
+            bats = detect_bats(bat_model, self.crop(frame_idx), self.record_conf, batball_video.CROP_SIZE, frame_idx)
+            self.bats[frame_idx] = self.new_bats[frame_idx] = bats
+        if self.conf > self.record_conf:
+            bats = [b for b in bats if b[1] >= self.conf]
+        return bats
+
+    def release(self):
+        self.fetcher.release()
+
+
+def replay_outputs(video_path, out_highlight_path, contact_frames_root, n_frames, detections,
+                   contact_radius=None, contact_min_gap=None, pre_frames=None, post_frames=None,
+                   ball_seen_frames=None, ball_miss_frames=None, linger_frames=None, highlight_mode="encode",
+                   contact_cb=None):
+    """
+    Contact decisions over `detections` (a FrameDetections), then the contact
+    JPEGs, contact_info.json and highlight, as the frame loop would write them.
+    Unset parameters default to the batball_video constants; contact_cb(contact)
+    is called as each contact's JPEG is written.
+    Returns (contacts, highlight frames written, json path, highlight mode used).
+    """
+    bv = batball_video
+    ball_state = BallState(bv.BALL_SEEN_FRAMES if ball_seen_frames is None else ball_seen_frames,
+                           bv.BALL_MISS_FRAMES if ball_miss_frames is None else ball_miss_frames,
+                           bv.LINGER_FRAMES if linger_frames is None else linger_frames)
+    found = replay_contacts(n_frames, detections.get_balls, detections.get_bats,
+                            bv.CONTACT_RADIUS if contact_radius is None else contact_radius,
+                            bv.CONTACT_MIN_GAP if contact_min_gap is None else contact_min_gap, ball_state)
+    os.makedirs(contact_frames_root, exist_ok=True)
+    contacts = []
+    for frame_idx, contact_ball, contact_bat in found:
+        print(f"[CONTACT] Detected at frame {frame_idx}")
+        img_path = os.path.join(contact_frames_root, f"contact_{frame_idx:06d}.jpg")
+        cv2.imwrite(img_path, annotate_contact(detections.crop(frame_idx), contact_ball, contact_bat))
+        contacts.append(contact_record(frame_idx, img_path, contact_ball, contact_bat,
+                                       detections.frame_size, batball_video.CROP_SIZE))
+        if contact_cb is not None:
+            contact_cb(contacts[-1])
+    detections.release()
+
+    written, mode_used = 0, None
+    if out_highlight_path:
+        os.makedirs(os.path.dirname(out_highlight_path), exist_ok=True)
+        ranges = highlight_ranges([c["frame_idx"] for c in contacts], n_frames,
+                                  bv.PRE_FRAMES if pre_frames is None else pre_frames,
+                                  bv.POST_FRAMES if post_frames is None else post_frames)
+        written, mode_used = export_highlight(video_path, out_highlight_path, ranges, highlight_mode)
+        set_highlight_positions(contacts, ranges)
+
+    json_path = os.path.join(contact_frames_root, "contact_info.json")
+    with open(json_path, "w") as jf:
+        json.dump(contacts, jf, indent=2)
+    return contacts, written, json_path, mode_used
+
+
+def replay_from_cache(video_path, out_highlight_path, contact_frames_root, ball_model_path, bat_model_path,
+                      cache, device='cpu', video_hash=None, conf=None, highlight_mode="encode",
+                      delivery="faststart", progress_cb=None, cancel_event=None, contact_cb=None, **params):
+    """
+    Re-runs contact detection and the highlight cut for a video whose
+    detections are cached, with new parameters (conf, contact_radius,
+    contact_min_gap, pre_frames, post_frames, ball_seen_frames,
+    ball_miss_frames, linger_frames). The new highlight goes through
+    delivery.deliver(delivery). Raises LookupError without a cache entry.
+    """
+    t_start = time.perf_counter()
+    key = cache.key(video_path, ball_model_path, bat_model_path, video_hash)
+    cached = cache.load(key)
+    if cached is None:
+        raise LookupError(f"No cached detections for {video_path}")
+    if cancel_event is not None and cancel_event.is_set():
+        raise ProcessingCancelled("Cancelled before replay")
+
+    detections = FrameDetections(video_path, ball_model_path, bat_model_path, device,
+                                 cached=cached, record_conf=cached.record_conf, conf=conf)
+    contacts, written, json_path, mode_used = replay_outputs(video_path, out_highlight_path, contact_frames_root,
+                                                             cached.n_frames, detections,
+                                                             highlight_mode=highlight_mode, contact_cb=contact_cb,
+                                                             **params)
+    t_delivery = time.perf_counter()
+    delivered = deliver(out_highlight_path, delivery)
+    delivery_s = time.perf_counter() - t_delivery
+    if detections.new_balls or detections.new_bats:
+        # frames detected on demand make the next re-tune cheaper
+        cache.store(key, cached.n_frames, detections.new_balls, detections.new_bats)
+    if progress_cb is not None:
+        progress_cb(cached.n_frames, cached.n_frames)
+    elapsed = time.perf_counter() - t_start
+    metrics = RunMetrics()
+    metrics.observe("replay", elapsed - delivery_s, cached.n_frames)
+    metrics.observe("delivery", delivery_s)
+    metrics.counters.update(frames=cached.n_frames, inferred=len(detections.new_balls), written=written,
+                            bat_invocations=len(detections.new_bats), contacts=len(contacts))
+    pipeline_metrics.record(metrics)
+
+    print(f"✅ Replayed {cached.n_frames} frames from cache in {elapsed:.2f}s")
+    return {
+        "highlight_path": out_highlight_path,
+        "contacts_json": json_path,
+        "contacts": contacts,
+        "frames": cached.n_frames,
+        "highlight_frames": written,
+        "highlight_mode": mode_used,
+        "delivery": delivered,
+        "elapsed_s": elapsed,
+        "fps": cached.n_frames / elapsed if elapsed > 0 else None,
+        "metrics": metrics.to_dict(),
+        "replay": {
+            "cache_key": key,
+            "params": dict(params, conf=detections.conf),
+            "detected_on_demand": {"balls": len(detections.new_balls), "bats": len(detections.new_bats)}
+        }
+    }
@@ -0,0 +1,774 @@
+import os
+import cv2
+import json
+import time
+import numpy as np
+from collections import deque
+import stream_copy
+from model_registry import registry
+from detection import detect_balls_batch, detect_bats
+from contact import find_contact
+from stages import FrameDecoder, HighlightSink, StageStats, open_highlight_writer
+from frame_ring import RingReader
+from preroll import SeekingReader, PREROLL_MODES
+from motion_gate import MotionGate
+from tracking import BallTracker, BatTracker
+from roi import roi_window, cut, balls_to_crop, bats_to_crop
+from replay import BallState, highlight_ranges, export_highlight, HIGHLIGHT_MODES
+from metrics import RunMetrics, TraceWriter, pipeline_metrics
+from clips import ClipRecorder
+from delivery import deliver, DELIVERY_MODES
+
+# -----------------------------------------------------
+# HIGHLIGHT PIPELINE ENGINE
+# The one frame loop behind the Flask app, the CLI and the Colab script.
+# PipelineConfig holds the thresholds, sizes, device and run options;
+# HighlightEngine runs the loop over swappable stages:
+#   source  -> the capture (cv2.VideoCapture, or live.LiveCapture for a live source)
+#   decode  -> reader the frames come from (pre-roll ring / seeking reader)
+#   gate    -> static-frame gate in front of the ball detector (or None)
+#   detect  -> ball / bat detector
+#   track   -> (ball tracker, bat tracker) or (None, None)
+#   contact -> ball-bat contact test
+#   sink    -> highlight VideoWriter (or None)
+# The finished highlight then goes through delivery.deliver (faststart MP4,
+# optionally an HLS ladder) as config.delivery says.
+# Pass stages={"contact": my_find_contact, ...} to try a different
+# implementation of one stage with everything else unchanged.
+# -----------------------------------------------------
+
+PROGRESS_EVERY = 10  # frames between progress callbacks
+
+
+class ProcessingCancelled(Exception):
+    pass
+
+
+class PipelineConfig:
+    """
+    Settings of one pipeline run. Unknown names raise TypeError; see
+    process_video_for_highlight for what the run options do.
+    """
+
+    FIELDS = {
+        # detector / contact thresholds and sizes
+        "crop_size": 640,
+        "conf": 0.24,
+        "iou": 0.5,
+        "contact_radius": 5,
+        "contact_min_gap": 16,
+        "pre_frames": 20,
+        "post_frames": 20,
+        "ball_seen_frames": 2,
+        "ball_miss_frames": 5,
+        "linger_frames": 7,
+        "device": "cpu",
+        # run options
+        "batch_size": 1,
+        "pipelined": False,
+        "decode_queue": 8,
+        "write_queue": 32,
+        "preroll": "ring",
+        "motion_gate": None,
+        "detect_stride": 1,
+        "active_stride": 1,
+        "tracker": None,
+        "roi_size": 0,
+        "highlight_mode": "encode",
+        "delivery": "faststart",
+        "profile": False,
+        # live / streaming output
+        "clips": False,
+        "max_latency_s": 0,
+    }
+
+    def __init__(self, **kwargs):
+        unknown = set(kwargs) - set(self.FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown pipeline setting(s): {', '.join(sorted(unknown))}")
+        for name, default in self.FIELDS.items():
+            setattr(self, name, kwargs.get(name, default))
+        if self.preroll not in PREROLL_MODES:
+            raise ValueError(f"Unknown preroll mode {self.preroll!r}, expected one of {PREROLL_MODES}")
+        if self.highlight_mode not in HIGHLIGHT_MODES:
+            raise ValueError(f"Unknown highlight mode {self.highlight_mode!r}, expected one of {HIGHLIGHT_MODES}")
+        if self.delivery not in DELIVERY_MODES:
+            raise ValueError(f"Unknown delivery mode {self.delivery!r}, expected one of {DELIVERY_MODES}")
+        self.batch_size = max(1, int(self.batch_size))
+        self.detect_stride = max(1, int(self.detect_stride))
+        self.active_stride = max(1, int(self.active_stride))
+        self.roi_size = int(self.roi_size or 0)
+        self.max_latency_s = float(self.max_latency_s or 0)
+        if self.tracker is None:
+            self.tracker = self.detect_stride > 1 or self.active_stride > 1 or self.roi_size > 0
+        if self.roi_size and not self.tracker:
+            raise ValueError("roi_size needs the tracker (tracker=False given)")
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def replace(self, **changes):
+        return PipelineConfig(**dict(self.to_dict(), **changes))
+
+    @classmethod
+    def from_file(cls, path, **overrides):
+        """
+        Config from a JSON file of settings (missing ones keep their defaults).
+        """
+        with open(path) as f:
+            return cls(**dict(json.load(f), **overrides))
+
+
+def adaptive_square_crop(frame, target_size=640):
+    h, w = frame.shape[:2]
+    size = min(h, w)
+    x1 = (w - size) // 2
+    y1 = (h - size) // 2
+    return cv2.resize(frame[y1:y1+size, x1:x1+size], (target_size, target_size))
+
+
+def annotate_contact(cropped, contact_ball, contact_bat):
+    """
+    Copy of the 640 crop with the contact bat polygon and ball drawn on it.
+    """
+    ann = cropped.copy()
+    if contact_bat:
+        pts, conf = contact_bat
+        cv2.polylines(ann, [np.array(pts, np.int32)], True, (0,255,0), 2)
+    if contact_ball:
+        cx, cy, _ = contact_ball
+        cv2.circle(ann, (cx, cy), 5, (0,0,255), -1)
+    return ann
+
+
+def contact_record(frame_idx, img_path, contact_ball, contact_bat, frame_size, crop_size=640):
+    """
+    contact_info.json entry: the contact frame, its JPEG and the ball / bat
+    in 640-crop and original-frame coordinates.
+    """
+    w, h = frame_size
+    side = min(w, h)
+    x0, y0 = (w - side) // 2, (h - side) // 2
+    scale = side / float(crop_size)
+
+    def to_orig(x, y):
+        return int(x0 + round(x * scale)), int(y0 + round(y * scale))
+
+    ball = None
+    if contact_ball:
+        bx, by, bconf = contact_ball
+        ox, oy = to_orig(bx, by)
+        ball = {"x_640": bx, "y_640": by, "conf": bconf, "x_orig": ox, "y_orig": oy}
+    bat = None
+    if contact_bat:
+        pts, bconf = contact_bat
+        bat = {"pts_640": pts, "conf": bconf, "pts_orig": [list(to_orig(x, y)) for x, y in pts]}
+    return {"frame_idx": frame_idx, "img": img_path, "ball": ball, "bat": bat, "frame_highlight": None}
+
+
+def set_highlight_positions(contacts, ranges):
+    """
+    Fills each contact's frame_highlight: its frame index inside the highlight
+    made of `ranges` (contacts merged into one range share its frames).
+    """
+    for c in contacts:
+        offset = 0
+        for a, b in ranges:
+            if a <= c["frame_idx"] <= b:
+                c["frame_highlight"] = offset + c["frame_idx"] - a
+                break
+            offset += b - a + 1
+
+
+def stage_report(decoder, sink, loop_s):
+    """
+    Per-stage utilization of a pipelined run (None for the single-threaded path).
+    The inference stage is the main loop minus the time it sat waiting on the
+    decoder or on a full write queue.
+    """
+    if decoder is None:
+        return None
+    infer = StageStats("infer")
+    infer.items = decoder.stats.items
+    infer.wait_s = decoder.consumer_wait_s + sink.producer_wait_s
+    infer.busy_s = max(0.0, loop_s - infer.wait_s)
+    return {
+        "wall_s": loop_s,
+        "decode": decoder.stats.to_dict(loop_s),
+        "infer": infer.to_dict(loop_s),
+        "write": sink.stats.to_dict(loop_s),
+    }
+
+
+# --- default stages ---
+class YoloDetector:
+    """
+    Detect stage: the resident ultralytics models from the registry.
+    """
+
+    def __init__(self, config, ball_model_path, bat_model_path):
+        self.config = config
+        self.ball_model = registry.get(ball_model_path, config.device)
+        self.bat_model = registry.get(bat_model_path, config.device)
+
+    def balls(self, crops, frame_indices, imgsz=None):
+        return detect_balls_batch(self.ball_model, crops, self.config.conf, self.config.iou, frame_indices, imgsz=imgsz)
+
+    def bats(self, crop, frame_idx, imgsz=None):
+        return detect_bats(self.bat_model, crop, self.config.conf, imgsz or self.config.crop_size, frame_idx)
+
+
+def open_capture(video_path, config):
+    return cv2.VideoCapture(video_path)
+
+
+def make_reader(cap, video_path, config, start_idx, pre_frames):
+    """
+    Decode stage. The pre-roll ring is decoded into in place and must cover
+    pre_frames behind the current frame plus everything read ahead of it.
+    """
+    read_ahead = config.batch_size + 3 + (config.decode_queue if config.pipelined else 0)
+    if config.preroll == "seek":
+        # only timestamps are kept, for the full pre-roll whatever pre_frames is
+        return SeekingReader(cap, video_path, config.pre_frames, start_idx=start_idx,
+                             history=config.pre_frames + read_ahead)
+    return RingReader(cap, pre_frames + read_ahead, start_idx=start_idx)
+
+
+def make_gate(config):
+    return MotionGate.from_config(config.motion_gate)
+
+
+def make_trackers(config):
+    """
+    Track stage: constant-velocity trackers (stride mode / failed detections).
+    """
+    if not config.tracker:
+        return None, None
+    max_age = max(15, 2 * max(config.detect_stride, config.active_stride))
+    return BallTracker(config.conf, max_age=max_age), BatTracker(config.conf, max_age=max_age)
+
+
+DEFAULT_STAGES = {
+    "source": open_capture,
+    "decode": make_reader,
+    "gate": make_gate,
+    "detect": YoloDetector,
+    "track": make_trackers,
+    "contact": find_contact,
+    "sink": open_highlight_writer,
+}
+
+
+class HighlightEngine:
+    def __init__(self, config=None, stages=None):
+        self.config = config or PipelineConfig()
+        unknown = set(stages or {}) - set(DEFAULT_STAGES)
+        if unknown:
+            raise TypeError(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+        self.stages = dict(DEFAULT_STAGES, **(stages or {}))
+
+    def run(self, video_path, out_highlight_path, contact_frames_root, ball_model_path, bat_model_path,
+            progress_cb=None, cancel_event=None, frame_range=None, record_detections=False,
+            detection_cache=None, contact_cb=None, clip_cb=None):
+        """
+        Runs the pipeline on one video; see process_video_for_highlight.
+        With config.clips every contact is also written as its own clip and
+        clip_cb(clip) is called as soon as that file is complete.
+        Returns: dict containing output paths, contacts and timing
+        """
+        cfg = self.config
+        t_start = time.perf_counter()
+        perf = time.perf_counter
+        metrics = RunMetrics()
+        gate = self.stages["gate"](cfg)
+        find_contact = self.stages["contact"]
+        batch_size = cfg.batch_size
+        detect_stride, active_stride, roi_size = cfg.detect_stride, cfg.active_stride, cfg.roi_size
+        if roi_size or frame_range or cfg.tracker or cfg.motion_gate:
+            # replay_contacts models neither the tracker (stride / ROI) nor the gate, so
+            # a replay of these runs wouldn't reproduce them; only plain runs are cached
+            detection_cache = None
+        record = record_detections or detection_cache is not None
+        # ensure output directories
+        os.makedirs(contact_frames_root, exist_ok=True)
+        if out_highlight_path:
+            os.makedirs(os.path.dirname(out_highlight_path), exist_ok=True)
+
+        # resident models (loaded + warmed up once per process, reloaded if weights change)
+        detector = self.stages["detect"](cfg, ball_model_path, bat_model_path)
+
+        if cfg.device == 'cpu':
+            print("Running on CPU — slower but works for local testing.")
+
+        # open video
+        cap = self.stages["source"](video_path, cfg)
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open video: {video_path}")
+        # live sources: seconds since frame i was captured (None for files)
+        lag_fn = getattr(cap, "lag_s", None)
+
+        orig_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        orig_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+
+        print(f"🎞️ Loaded video {video_path} ({orig_w}x{orig_h}, {fps:.1f} FPS, {total_frames} frames)")
+
+        first_idx, stop_idx = frame_range or (0, None)
+        if first_idx > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first_idx)
+            pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+            if pos != first_idx:
+                # frame indices must match a sequential run (parallel merge): decode forward instead
+                print(f"[WARN] Seek to frame {first_idx} landed on {pos}; skipping forward from the start")
+                cap.release()
+                cap = self.stages["source"](video_path, cfg)
+                for skipped in range(first_idx):
+                    if not cap.grab():
+                        raise RuntimeError(f"Video ended at frame {skipped} before chunk start {first_idx}")
+                lag_fn = getattr(cap, "lag_s", None)
+
+        # setup VideoWriter (stream-copy mode cuts the highlight after the loop instead)
+        copy_highlight = bool(out_highlight_path) and cfg.highlight_mode == "copy" and frame_range is None
+        if copy_highlight and not stream_copy.available():
+            print("[WARN] ffmpeg not found; re-encoding the highlight")
+            copy_highlight = False
+        highlight_writer = None
+        if out_highlight_path and not copy_highlight:
+            highlight_writer = self.stages["sink"](out_highlight_path, fps, (orig_w, orig_h))
+        highlight_used = "copy" if copy_highlight else "encode"
+        delivery = None
+        clips = None
+        if cfg.clips:
+            clips = ClipRecorder(contact_frames_root, fps, (orig_w, orig_h), self.stages["sink"],
+                                 cfg.pre_frames, cfg.post_frames, clip_cb, lag_fn)
+        writes_frames = bool(highlight_writer) or clips is not None
+
+        # main vars
+        ball_state = BallState(cfg.ball_seen_frames, cfg.ball_miss_frames, cfg.linger_frames)
+        ball_active = False
+        last_contact_frame = -9999
+        skip_until = -1
+        # (last contact, end of cooldown, last post-window frame) — one tuple so the
+        # decoder thread always sees a consistent snapshot
+        skip_state = (last_contact_frame, skip_until, -1)
+        post_frames_left = 0
+        clip_until = -1  # last frame an open clip still needs
+        last_written_idx = -1
+        written_frames = 0
+        contacts = []
+        # raw detections per frame (only frames the detector actually ran on)
+        recorded_balls = {}
+        recorded_bats = {}
+        gated_frames = set()  # frames the gate kept from the detector: not recorded
+
+        ball_tracker, bat_tracker = self.stages["track"](cfg)
+        next_detect_idx = 0
+        ball_inferences = 0
+        bat_inferences = 0
+        roi_inferences = 0
+        tracked_frames = 0
+        cooldown_frames = 0
+        stride_frames = 0
+        gated_count = 0
+        shed_frames = 0
+        pending = deque()  # read-ahead frames: (frame, cropped, balls, detected, roi)
+
+        # no pre-roll without an in-loop writer
+        reader = self.stages["decode"](cap, video_path, cfg, first_idx, cfg.pre_frames if writes_frames else 0)
+
+        def frame_needed(idx):
+            """
+            False for frames nobody will look at: inside the cooldown window (no
+            inference), past the highlight post-window and too early to be pre-roll
+            of the next possible contact. Those are grabbed without decoding.
+            """
+            lc, su, post_until = skip_state
+            if not (lc < idx <= su):
+                return True
+            if not writes_frames:
+                return False
+            if idx <= post_until:
+                return True
+            return cfg.preroll == "ring" and idx > su - cfg.pre_frames
+
+        # per-frame stage spans for the trace file (profile=True only)
+        tracer = None
+        if cfg.profile:
+            tracer = metrics.trace = TraceWriter(os.path.join(contact_frames_root, "trace.json"))
+
+        # decode -> inference -> write stages
+        decoder = None
+        sink = None
+        t_loop = time.perf_counter()
+        if cfg.pipelined:
+            decoder = FrameDecoder(reader, maxsize=cfg.decode_queue, need_fn=frame_needed, metrics=metrics,
+                                   start_idx=first_idx)
+            sink = HighlightSink(highlight_writer, maxsize=cfg.write_queue, metrics=metrics)
+            if highlight_writer:
+                highlight_writer = sink
+
+        def read_frame(idx):
+            if decoder is not None:
+                return decoder.read()
+            t0 = perf()
+            ret, frame = reader.read(frame_needed(idx))
+            if frame is not None:
+                metrics.observe("decode", perf() - t0, frame=idx)
+            return ret, frame
+
+        def save_contact(record, ann):
+            """
+            Writes the contact JPEG, then reports the contact (contact_cb) once the file exists.
+            """
+            done = None if contact_cb is None else (lambda: contact_cb(record))
+            if sink is not None:
+                sink.imwrite(record["img"], ann, done=done)
+                return
+            t0 = perf()
+            cv2.imwrite(record["img"], ann)
+            metrics.observe("jpeg_write", perf() - t0, frame=record["frame_idx"])
+            if done is not None:
+                done()
+
+        def write_frame(idx, frame, label="postroll_write"):
+            if sink is not None:
+                # a ring slot stays reserved until the writer thread is done with it
+                reader.hold(idx)
+                sink.write(frame, done=lambda: reader.unhold(idx), frame_idx=idx, label=label)
+            else:
+                t0 = perf()
+                highlight_writer.write(frame)
+                metrics.observe("video_write", perf() - t0, frame=idx, label=label)
+
+        def clip_frame(idx, frame, label="clip_write"):
+            if sink is not None:
+                reader.hold(idx)
+                sink.call(lambda: clips.write(idx, frame), done=lambda: reader.unhold(idx), frame_idx=idx, label=label)
+            else:
+                t0 = perf()
+                clips.write(idx, frame)
+                metrics.observe("video_write", perf() - t0, frame=idx, label=label)
+
+        def release_io():
+            if decoder is not None:
+                decoder.close()
+            reader.release()
+            if clips is not None:
+                # after the queued clip frames; clips the stream ended inside of are cut short
+                if sink is not None:
+                    sink.call(clips.close)
+                else:
+                    clips.close()
+            if sink is not None:
+                sink.release()  # flushes pending writes, releases the VideoWriter
+            elif highlight_writer:
+                highlight_writer.release()
+
+        frame_idx = first_idx
+        frame_t0 = None
+        while True:
+            if tracer is not None:
+                # one "frame" span per loop iteration, around that frame's stage spans
+                now = perf()
+                if frame_t0 is not None:
+                    tracer.span("frame", frame_t0, now - frame_t0, frame_idx - 1)
+                frame_t0 = now
+            if lag_fn is not None and frame_idx > first_idx:
+                latency = lag_fn(frame_idx - 1)
+                if latency is not None:
+                    metrics.observe_latency(latency)
+            if stop_idx is not None and frame_idx >= stop_idx:
+                break
+            if cancel_event is not None and cancel_event.is_set():
+                release_io()
+                if tracer is not None:
+                    tracer.close()
+                print(f"[INFO] Processing cancelled at frame {frame_idx}")
+                raise ProcessingCancelled(f"Cancelled at frame {frame_idx}")
+            if progress_cb is not None and frame_idx % PROGRESS_EVERY == 0:
+                progress_cb(frame_idx - first_idx, total_frames)
+
+            if not pending:
+                batch = []
+                while len(batch) < batch_size:
+                    ret, frame = read_frame(frame_idx + len(batch))
+                    if not ret:
+                        break
+                    batch.append(frame)
+                if not batch:
+                    break
+
+                # frames already inside the cooldown window are never inferred
+                crops = [None] * len(batch)
+                infer = [i for i in range(len(batch))
+                         if not (frame_idx + i > last_contact_frame and frame_idx + i <= skip_until)]
+                if infer:
+                    t0 = perf()
+                    for i in infer:
+                        crops[i] = adaptive_square_crop(batch[i], cfg.crop_size)
+                    metrics.observe("resize", perf() - t0, len(infer), frame=frame_idx)
+                ball_lists = [None] * len(batch)
+                detected_flags = [True] * len(batch)
+                if cfg.max_latency_s and lag_fn is not None and infer:
+                    lag = lag_fn(frame_idx)
+                    if lag is not None and lag > cfg.max_latency_s:
+                        # behind the live source: these frames go to the tracker only until it catches up
+                        for i in infer:
+                            ball_lists[i] = []
+                            detected_flags[i] = False
+                        shed_frames += len(infer)
+                        infer = []
+                if detect_stride > 1 or active_stride > 1:
+                    # only every stride-th frame goes to the detector; the tracker fills the rest
+                    stride = active_stride if ball_active else detect_stride
+                    for i in infer:
+                        if frame_idx + i >= next_detect_idx:
+                            next_detect_idx = frame_idx + i + stride
+                        else:
+                            ball_lists[i] = []
+                            detected_flags[i] = False
+                    stride_frames += len(infer) - sum(1 for i in infer if detected_flags[i])
+                    infer = [i for i in infer if detected_flags[i]]
+                if gate is not None:
+                    # static frames skip the ball detector and count as "no ball"
+                    for i in infer:
+                        if not gate.update(crops[i]):
+                            ball_lists[i] = []
+                            gated_count += 1
+                            if record:
+                                gated_frames.add(frame_idx + i)
+                    infer = [i for i in infer if ball_lists[i] is None]
+                # ROI windows around the tracked ball, predicted i+1 frames past the last step:
+                # (window, bat inside it) per frame, None = full crop
+                windows = [None] * len(batch)
+                if roi_size and ball_active and ball_tracker.alive and ball_tracker.misses == 0:
+                    for i in infer:
+                        ball_est = ball_tracker.estimate(i + 1)
+                        bat_est = bat_tracker.estimate(i + 1)
+                        win = None
+                        if bat_est is not None:
+                            win = roi_window(ball_est[:2], bat_est[0], roi_size, bound=cfg.crop_size)
+                        if win is not None:
+                            windows[i] = (win, True)
+                        else:
+                            win = roi_window(ball_est[:2], None, roi_size, bound=cfg.crop_size)
+                            windows[i] = (win, False) if win is not None else None
+                full = [i for i in infer if windows[i] is None]
+                in_roi = [i for i in infer if windows[i] is not None]
+                if full:
+                    ball_inferences += len(full)
+                    t0 = perf()
+                    detected = detector.balls([crops[i] for i in full], [frame_idx + i for i in full])
+                    metrics.observe("ball_infer", perf() - t0, len(full), frame=frame_idx + full[0])
+                    for i, balls in zip(full, detected):
+                        ball_lists[i] = balls
+                if in_roi:
+                    ball_inferences += len(in_roi)
+                    roi_inferences += len(in_roi)
+                    t0 = perf()
+                    detected = detector.balls([cut(crops[i], windows[i][0], roi_size) for i in in_roi],
+                                              [frame_idx + i for i in in_roi], imgsz=roi_size)
+                    metrics.observe("ball_infer", perf() - t0, len(in_roi), frame=frame_idx + in_roi[0], label="ball_infer_roi")
+                    for i, balls in zip(in_roi, detected):
+                        ball_lists[i] = balls_to_crop(balls, windows[i][0])
+                pending.extend(zip(batch, crops, ball_lists, detected_flags, windows))
+
+            frame, cropped, balls_current, detected, window = pending.popleft()
+
+            # skip cooldown window
+            if frame_idx > last_contact_frame and frame_idx <= skip_until:
+                cooldown_frames += 1
+                if post_frames_left > 0 and highlight_writer:
+                    write_frame(frame_idx, frame)
+                    last_written_idx = frame_idx
+                    written_frames += 1
+                    post_frames_left -= 1
+                if frame_idx <= clip_until:
+                    clip_frame(frame_idx, frame)
+                frame_idx += 1
+                continue
+
+            if cropped is None:
+                t0 = perf()
+                cropped = adaptive_square_crop(frame, cfg.crop_size)
+                metrics.observe("resize", perf() - t0, frame=frame_idx)
+            if balls_current is None:
+                ball_inferences += 1
+                t0 = perf()
+                balls_current = detector.balls([cropped], [frame_idx])[0]
+                metrics.observe("ball_infer", perf() - t0, frame=frame_idx)
+            bats_current = []
+
+            # --- update ball state (only on frames the detector actually saw) ---
+            if detected:
+                ball_active = ball_state.update(bool(balls_current))
+                if record and frame_idx not in gated_frames:
+                    recorded_balls[frame_idx] = list(balls_current)
+
+            # ---------- BAT DETECTION ----------
+            if ball_active and detected:
+                bat_inferences += 1
+                t0 = perf()
+                if window is not None and window[1]:
+                    win = window[0]
+                    bats_current = bats_to_crop(detector.bats(cut(cropped, win, roi_size), frame_idx, roi_size), win)
+                else:
+                    bats_current = detector.bats(cropped, frame_idx)
+                metrics.observe("bat_infer", perf() - t0, frame=frame_idx)
+                if record:
+                    recorded_bats[frame_idx] = list(bats_current)
+
+            # ---------- TRACKING ----------
+            # Kalman prediction stands in for skipped or failed detections
+            if ball_tracker is not None:
+                ball_tracker.step(balls_current, detected)
+                bat_tracker.step(bats_current, detected and ball_active)
+                if not balls_current:
+                    est = ball_tracker.estimate()
+                    if est is not None:
+                        balls_current = [est]
+                        tracked_frames += 1
+                if ball_active and not bats_current:
+                    est = bat_tracker.estimate()
+                    if est is not None:
+                        bats_current = [est]
+
+            # ---------- CONTACT DETECTION ----------
+            t0 = perf()
+            contact_ball, contact_bat = find_contact(balls_current, bats_current, cfg.contact_radius)
+            metrics.observe("contact", perf() - t0, frame=frame_idx)
+            contact_found = contact_ball is not None
+
+            # ---------- IF CONTACT ----------
+            if contact_found and frame_idx > last_contact_frame + cfg.contact_min_gap:
+                print(f"[CONTACT] Detected at frame {frame_idx}")
+                if tracer is not None:
+                    tracer.instant("contact_detected", frame_idx)
+                last_contact_frame = frame_idx
+                skip_until = frame_idx + cfg.contact_min_gap
+                skip_state = (last_contact_frame, skip_until, frame_idx + cfg.post_frames if writes_frames else -1)
+                if ball_tracker is not None:
+                    # the cooldown window is never tracked; start fresh after it
+                    ball_tracker.reset()
+                    bat_tracker.reset()
+
+                img_path = os.path.join(contact_frames_root, f"contact_{frame_idx:06d}.jpg")
+                contact = contact_record(frame_idx, img_path, contact_ball, contact_bat, (orig_w, orig_h), cfg.crop_size)
+                if clips is not None:
+                    contact["clip"] = os.path.join(contact_frames_root, f"clip_{frame_idx:06d}.mp4")
+                contacts.append(contact)
+                save_contact(contact, annotate_contact(cropped, contact_ball, contact_bat))
+
+                # write highlight clip: pre_frames before the contact that weren't written yet,
+                # then the contact frame + post_frames through the post-window write below
+                if highlight_writer:
+                    for idx, buf_frame in reader.unwritten(frame_idx, cfg.pre_frames, last_written_idx):
+                        write_frame(idx, buf_frame, "preroll_write")
+                        last_written_idx = idx
+                        written_frames += 1
+                    post_frames_left = cfg.post_frames + 1
+                if clips is not None:
+                    if sink is not None:
+                        sink.call(lambda c=frame_idx: clips.start(c))
+                    else:
+                        clips.start(frame_idx)
+                    for idx, buf_frame in reader.unwritten(frame_idx, cfg.pre_frames, -1):
+                        clip_frame(idx, buf_frame, "clip_preroll_write")
+                    clip_until = frame_idx + cfg.post_frames
+
+            if post_frames_left > 0 and highlight_writer:
+                write_frame(frame_idx, frame)
+                last_written_idx = frame_idx
+                written_frames += 1
+                post_frames_left -= 1
+            if frame_idx <= clip_until:
+                clip_frame(frame_idx, frame)
+
+            frame_idx += 1
+
+        release_io()
+        loop_s = time.perf_counter() - t_loop
+
+        if progress_cb is not None:
+            progress_cb(frame_idx - first_idx, max(total_frames, frame_idx - first_idx))
+
+        if highlight_writer or copy_highlight:
+            ranges = highlight_ranges([c["frame_idx"] for c in contacts], frame_idx, cfg.pre_frames, cfg.post_frames)
+            if copy_highlight:
+                t0 = perf()
+                written_frames, highlight_used = export_highlight(video_path, out_highlight_path, ranges, "copy")
+                metrics.observe("highlight_export", perf() - t0, written_frames)
+            set_highlight_positions(contacts, ranges)
+            t0 = perf()
+            delivery = deliver(out_highlight_path, cfg.delivery)
+            metrics.observe("delivery", perf() - t0)
+
+        json_path = os.path.join(contact_frames_root, "contact_info.json")
+        with open(json_path, "w") as jf:
+            json.dump(contacts, jf, indent=2)
+
+        cache_key = None
+        if detection_cache is not None:
+            try:
+                cache_key = detection_cache.key(video_path, ball_model_path, bat_model_path)
+                detection_cache.store(cache_key, frame_idx, recorded_balls, recorded_bats,
+                                      meta={"record_conf": cfg.conf, "fps": fps, "width": orig_w, "height": orig_h})
+            except OSError as e:
+                print(f"[WARN] Could not store detections in cache: {e}")
+                cache_key = None
+        elapsed = time.perf_counter() - t_start
+        for name, n in (("frames", frame_idx - first_idx), ("inferred", ball_inferences),
+                        ("skipped_cooldown", cooldown_frames), ("skipped_stride", stride_frames),
+                        ("skipped_gate", gated_count), ("written", written_frames),
+                        ("bat_invocations", bat_inferences), ("contacts", len(contacts)),
+                        ("dropped", getattr(cap, "dropped", 0)), ("shed", shed_frames),
+                        ("clips", len(clips.clips) if clips is not None else 0)):
+            metrics.count(name, n)
+        pipeline_metrics.record(metrics)
+        trace = tracer.close() if tracer is not None else None
+
+        if highlight_writer or copy_highlight:
+            print(f"✅ Done! Saved highlight: {out_highlight_path}")
+        print(f"✅ Contacts JSON: {json_path}")
+
+        return {
+            "highlight_path": out_highlight_path,
+            "contacts_json": json_path,
+            "contacts": contacts,
+            "frames": frame_idx - first_idx,
+            "highlight_frames": written_frames,
+            "highlight_mode": highlight_used,
+            "delivery": delivery,
+            "grabbed_frames": reader.grabbed,
+            "elapsed_s": elapsed,
+            "fps": (frame_idx - first_idx) / elapsed if elapsed > 0 else None,
+            "stages": stage_report(decoder, sink, loop_s),
+            "preroll": reader.stats(),
+            "motion_gate": gate.stats() if gate is not None else None,
+            "first_frame": first_idx,
+            "detections": {"balls": recorded_balls, "bats": recorded_bats} if record_detections else None,
+            # frames whose detections were kept for the detection cache / parallel merge
+            "recorded": {"balls": len(recorded_balls), "bats": len(recorded_bats), "gated": len(gated_frames)},
+            "detection_cache": cache_key,
+            "metrics": metrics.to_dict(),
+            "trace": trace,
+            "clips": clips.clips if clips is not None else None,
+            "source": cap.stats() if hasattr(cap, "stats") else None,
+            "tracking": {
+                "detect_stride": detect_stride,
+                "active_stride": active_stride,
+                "tracker": bool(cfg.tracker),
+                "ball_inferences": ball_inferences,
+                "bat_inferences": bat_inferences,
+                "roi_size": roi_size or None,
+                "roi_inferences": roi_inferences,
+                "tracked_frames": tracked_frames,
+                "shed_frames": shed_frames
+            },
+            "models": {
+                "ball": registry.entry_stats(ball_model_path, cfg.device),
+                "bat": registry.entry_stats(bat_model_path, cfg.device)
+            }
+        }
@@ -0,0 +1,46 @@
+"""
+Exports the ball and bat detectors for a faster CPU inference backend.
+
+    cd backend
+    python export_models.py --backend onnx
+    python export_models.py --backend openvino
+    python export_models.py --backend openvino-int8 --calib uploads/match1.mp4 uploads/match2.mp4
+
+Then start the server with DETECTOR_BACKEND=<backend>.
+"""
+import os
+import argparse
+
+from backends import BACKENDS, export, write_calibration_set
+
+MODEL_FOLDER = os.path.join(os.getcwd(), "models")
+DEFAULT_MODELS = [os.path.join(MODEL_FOLDER, "cricket_ball_detector.pt"),
+                  os.path.join(MODEL_FOLDER, "bestBat.pt")]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], default="onnx")
+    ap.add_argument("--models", nargs="+", default=DEFAULT_MODELS)
+    ap.add_argument("--imgsz", type=int, default=640)
+    ap.add_argument("--calib", nargs="*", default=[], help="videos to sample INT8 calibration frames from")
+    ap.add_argument("--calib-frames", type=int, default=300)
+    ap.add_argument("--calib-dir", default=os.path.join("cache", "calibration"))
+    args = ap.parse_args()
+
+    if args.backend == "openvino-int8" and not args.calib:
+        ap.error("openvino-int8 needs --calib videos")
+
+    for pt_path in args.models:
+        calib_data = None
+        if args.backend == "openvino-int8":
+            from ultralytics import YOLO
+            names = YOLO(pt_path).names
+            calib_data = write_calibration_set(args.calib, os.path.join(args.calib_dir, os.path.basename(pt_path)),
+                                               frames=args.calib_frames, names=names)
+        out = export(pt_path, args.backend, imgsz=args.imgsz, calib_data=calib_data)
+        print(f"✅ {os.path.basename(pt_path)} -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import threading
+import numpy as np
+
+# -----------------------------------------------------
+# PRE-ROLL RING BUFFER
+# One preallocated (capacity, H, W, 3) uint8 block. Frames are decoded
+# straight into its slots (cap.read(slot)), so the frame loop does no
+# per-frame allocation or copy. Frame i always lives in slot i % capacity.
+# -----------------------------------------------------
+
+
+class FrameRing:
+    """
+    Fixed ring of decoded frames. A slot that still has a pending
+    highlight write (hold / release) is not handed out again until the
+    writer is done with it.
+    """
+
+    def __init__(self, capacity, shape, dtype=np.uint8):
+        self.capacity = capacity
+        self.frames = np.empty((capacity,) + tuple(shape), dtype=dtype)
+        self.indices = np.full(capacity, -1, dtype=np.int64)
+        self._holds = [0] * capacity
+        self._cond = threading.Condition()
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes
+
+    def acquire(self, frame_idx):
+        """
+        Returns the slot array frame `frame_idx` should be decoded into.
+        Blocks while an earlier frame in that slot is still queued for writing.
+        """
+        pos = frame_idx % self.capacity
+        with self._cond:
+            while self._holds[pos]:
+                self._cond.wait()
+            self.indices[pos] = -1
+        return self.frames[pos]
+
+    def commit(self, frame_idx):
+        self.indices[frame_idx % self.capacity] = frame_idx
+
+    def get(self, frame_idx):
+        pos = frame_idx % self.capacity
+        if self.indices[pos] != frame_idx:
+            return None
+        return self.frames[pos]
+
+    def hold(self, frame_idx):
+        with self._cond:
+            self._holds[frame_idx % self.capacity] += 1
+
+    def release(self, frame_idx):
+        with self._cond:
+            self._holds[frame_idx % self.capacity] -= 1
+            self._cond.notify_all()
+
+    def unwritten(self, before_idx, count, last_written_idx):
+        """
+        Ordered (oldest first) [(idx, frame_view)] of up to `count` frames
+        preceding `before_idx` that are still in the ring and were not
+        written yet (idx > last_written_idx).
+        """
+        start = max(before_idx - count, last_written_idx + 1, 0)
+        out = []
+        for idx in range(start, before_idx):
+            frame = self.get(idx)
+            if frame is not None:
+                out.append((idx, frame))
+        return out
+
+
+class RingReader:
+    """
+    cap.read() replacement that decodes into a FrameRing. The ring is
+    allocated from the first decoded frame's shape. If the decoder hands
+    back its own buffer instead of filling the slot, the frame is copied
+    in; a mid-stream resolution change raises.
+    """
+
+    def __init__(self, cap, capacity, start_idx=0):
+        self.cap = cap
+        self.capacity = capacity
+        self.ring = None
+        self.next_idx = start_idx  # index of the next frame cap returns
+        self.grabbed = 0
+
+    def read(self, need=True):
+        """
+        need=False only advances the stream (cap.grab(), no decode) and
+        returns (True, None); the slot is left empty.
+        """
+        if not need and self.ring is not None:
+            if not self.cap.grab():
+                return False, None
+            self.ring.acquire(self.next_idx)
+            self.next_idx += 1
+            self.grabbed += 1
+            return True, None
+        if self.ring is None:
+            ret, frame = self.cap.read()
+            if not ret:
+                return False, None
+            self.ring = FrameRing(self.capacity, frame.shape, frame.dtype)
+            slot = self.ring.acquire(0)
+            np.copyto(slot, frame)
+        else:
+            slot = self.ring.acquire(self.next_idx)
+            ret, frame = self.cap.read(slot)
+            if not ret:
+                return False, None
+            if frame is not slot:
+                if frame.shape != slot.shape:
+                    raise RuntimeError(f"Frame size changed mid-stream: {frame.shape} vs {slot.shape}")
+                np.copyto(slot, frame)
+        self.ring.commit(self.next_idx)
+        self.next_idx += 1
+        return True, slot
+
+    # --- pre-roll interface shared with preroll.SeekingReader ---
+
+    def unwritten(self, before_idx, count, last_written_idx):
+        if self.ring is None:
+            return []
+        return self.ring.unwritten(before_idx, count, last_written_idx)
+
+    def hold(self, frame_idx):
+        self.ring.hold(frame_idx)
+
+    def unhold(self, frame_idx):
+        self.ring.release(frame_idx)
+
+    def stats(self):
+        return {
+            "mode": "ring",
+            "capacity": self.capacity,
+            "buffer_bytes": self.ring.nbytes if self.ring is not None else 0,
+            "grabbed_frames": self.grabbed,
+        }
+
+    def release(self):
+        self.cap.release()
@@ -0,0 +1,221 @@
+import queue
+import threading
+import time
+import traceback
+import uuid
+
+# -----------------------------------------------------
+# IN-PROCESS HIGHLIGHT JOB QUEUE
+# A bounded queue feeding a fixed pool of worker threads. Jobs report
+# progress through a callback and can be cancelled while queued or
+# running (the pipeline polls the job's cancel event between frames).
+# Contacts are appended to the job as they're found; watchers block on
+# wait_change() and read the latest state, so the worker never waits on them.
+# -----------------------------------------------------
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, fn, kwargs, meta=None):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.kwargs = kwargs
+        self.meta = meta or {}
+        self.status = QUEUED
+        self.progress = 0.0
+        self.frames_done = 0
+        self.total_frames = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.contacts = []  # contact records in the order they were found
+        self.cancel_event = threading.Event()
+        self._done = threading.Event()
+        self._version = 0
+        self._changed = threading.Condition()
+
+    def _notify(self):
+        with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    def update_progress(self, frames_done, total_frames):
+        self.frames_done = frames_done
+        self.total_frames = total_frames
+        if total_frames > 0:
+            self.progress = min(1.0, frames_done / float(total_frames))
+        self._notify()
+
+    def add_contact(self, contact):
+        self.contacts.append(dict(contact))
+        self._notify()
+
+    def wait_change(self, version, timeout=None):
+        """
+        Blocks until the job changed since `version` (progress, contact or
+        status) or timeout; returns the current version.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def to_dict(self):
+        now = time.time()
+        queued_s = (self.started_at or self.finished_at or now) - self.created_at
+        run_s = None
+        if self.started_at is not None:
+            run_s = (self.finished_at or now) - self.started_at
+        fps = None
+        if run_s:
+            fps = self.frames_done / run_s
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "frames_done": self.frames_done,
+            "total_frames": self.total_frames,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queued_s": queued_s,
+            "run_s": run_s,
+            "fps": fps,
+            "error": self.error,
+            **self.meta,
+        }
+
+
+class JobManager:
+    """
+    Runs submitted callables on `workers` background threads.
+    At most `max_queue` jobs may wait; further submissions raise QueueFullError.
+    """
+
+    def __init__(self, workers=1, max_queue=8, max_history=200):
+        self.max_history = max_history
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._order = []
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"highlight-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn, kwargs, meta=None):
+        """
+        Queues fn(**kwargs, progress_cb=..., cancel_event=..., contact_cb=...) and returns the Job.
+        """
+        job = Job(fn, kwargs, meta)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(f"Job queue is full ({self._queue.maxsize} waiting)")
+            self._jobs[job.id] = job
+            self._order.append(job.id)
+            self._evict()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Flags a job as cancelled. Queued jobs are dropped when dequeued,
+        running jobs stop at the next frame boundary.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return job
+        # same lock as the worker's QUEUED -> RUNNING step: a job cancelled
+        # while queued never starts
+        with self._lock:
+            if job.finished:
+                return job
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+        return job
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {s: 0 for s in (QUEUED, RUNNING) + FINISHED_STATES}
+        for job in jobs:
+            counts[job.status] += 1
+        return {
+            "workers": len(self._threads),
+            "queue_size": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "jobs": counts,
+        }
+
+    def _evict(self):
+        # drop the oldest finished jobs once the history grows past max_history
+        while len(self._order) > self.max_history:
+            for i, job_id in enumerate(self._order):
+                if self._jobs[job_id].finished:
+                    del self._jobs[job_id]
+                    del self._order[i]
+                    break
+            else:
+                break
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job._done.set()
+        job._notify()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with self._lock:
+                    if job.cancel_event.is_set() or job.finished:
+                        if not job.finished:
+                            self._finish(job, CANCELLED)
+                        continue
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                try:
+                    result = job.fn(**job.kwargs,
+                                    progress_cb=job.update_progress,
+                                    cancel_event=job.cancel_event,
+                                    contact_cb=job.add_contact)
+                except Exception as e:
+                    if job.cancel_event.is_set():
+                        self._finish(job, CANCELLED)
+                    else:
+                        traceback.print_exc()
+                        self._finish(job, FAILED, error=str(e))
+                else:
+                    job.progress = 1.0
+                    self._finish(job, DONE, result=result)
+            finally:
+                self._queue.task_done()
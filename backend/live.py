@@ -0,0 +1,211 @@
+import os
+import time
+import threading
+from collections import deque
+import cv2
+import numpy as np
+from engine import PipelineConfig, HighlightEngine
+
+# -----------------------------------------------------
+# LIVE SOURCES
+# Runs the HighlightEngine on a source that is still being produced: a
+# camera index or stream URL, a named pipe, a file another process keeps
+# appending to, or (realtime=True) a recorded file played back at its own
+# frame rate. Latency stays bounded two ways:
+#   - frames wait in a buffer of at most buffer_s seconds; when the
+#     pipeline can't keep up the oldest are dropped
+#   - once a frame is older than max_latency_s the detectors are skipped
+#     (tracker only) until the loop has caught up
+# Each contact is written as its own clip as soon as its post window
+# closes (config.clips). Latency, dropped and shed frame numbers go into
+# the run's metrics and the /metrics totals.
+# -----------------------------------------------------
+
+LIVE_MAX_LATENCY_S = 0.5  # default max_latency_s of a live run
+LIVE_BUFFER_S = 2.0       # default source buffer; longer than max_latency_s, so frames
+                          # are shed (tracker only) well before any get dropped
+LATENCY_RING = 1024       # capture times kept for lag_s() lookups
+POLL_S = 0.05             # wait between reads once the source ran dry
+
+
+class LiveCapture:
+    """
+    cv2.VideoCapture stand-in that reads the source on a background thread.
+    Frame i is the i-th frame handed out (dropped frames get no index);
+    lag_s(i) is how long ago it was read from the source. A source that
+    gives no new frame for idle_timeout seconds has ended; a plain file is
+    reopened at its next frame meanwhile in case it's still growing.
+    """
+
+    def __init__(self, source, realtime=False, buffer_s=LIVE_BUFFER_S, idle_timeout=5.0):
+        self.source = int(source) if str(source).isdigit() else source
+        self.realtime = realtime
+        self.idle_timeout = idle_timeout
+        self.is_file = isinstance(self.source, str) and os.path.exists(self.source) and not os.path.isdir(self.source)
+        self.read_frames = 0  # frames read from the source
+        self.delivered = 0
+        self.dropped = 0
+        self._cap = self._open()
+        self.opened = self._cap.isOpened()
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.buffer_frames = max(1, int(round(buffer_s * self.fps)))
+        self._buf = deque()
+        self._cond = threading.Condition()
+        self._eof = False
+        self._error = None
+        self._times = [None] * LATENCY_RING
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="live-source", daemon=True)
+        if self.opened:
+            self._thread.start()
+
+    def _open(self):
+        # a pipe or a file that's about to be written may not open straight away
+        deadline = time.monotonic() + self.idle_timeout
+        while True:
+            cap = cv2.VideoCapture(self.source)
+            if cap.isOpened() or time.monotonic() >= deadline:
+                return cap
+            cap.release()
+            time.sleep(POLL_S)
+
+    def _reopen(self):
+        self._cap.release()
+        self._cap = cv2.VideoCapture(self.source)
+        if self.is_file and self._cap.isOpened():
+            # pick up after the last frame read; containers without an index can't seek, skip through instead
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, self.read_frames)
+            if int(self._cap.get(cv2.CAP_PROP_POS_FRAMES)) != self.read_frames:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                for _ in range(self.read_frames):
+                    if not self._cap.grab():
+                        break
+
+    def _run(self):
+        t0 = None
+        last_frame_t = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                ret, frame = self._cap.read()
+                if not ret:
+                    if self.realtime or time.monotonic() - last_frame_t > self.idle_timeout:
+                        break
+                    self._stop.wait(POLL_S)
+                    self._reopen()
+                    continue
+                last_frame_t = time.monotonic()
+                if self.realtime:
+                    # hand frames out no faster than the recording's own frame rate
+                    if t0 is None:
+                        t0 = last_frame_t
+                    due = t0 + self.read_frames / self.fps
+                    if due > last_frame_t:
+                        self._stop.wait(due - last_frame_t)
+                self.read_frames += 1
+                with self._cond:
+                    if len(self._buf) >= self.buffer_frames:
+                        self._buf.popleft()
+                        self.dropped += 1
+                    self._buf.append((time.perf_counter(), frame))
+                    self._cond.notify()
+        except Exception as e:
+            self._error = e
+        finally:
+            with self._cond:
+                self._eof = True
+                self._cond.notify_all()
+
+    # --- cv2.VideoCapture interface used by the engine ---
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0  # frame count / position: unknown for a live source
+
+    def set(self, prop, value):
+        return False
+
+    def read(self, image=None):
+        with self._cond:
+            while not self._buf and not self._eof:
+                self._cond.wait()
+            if not self._buf:
+                if self._error is not None:
+                    raise self._error
+                return False, None
+            captured, frame = self._buf.popleft()
+        self._times[self.delivered % LATENCY_RING] = (self.delivered, captured)
+        self.delivered += 1
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame
+
+    def grab(self):
+        return self.read()[0]
+
+    def release(self):
+        self._stop.set()
+        with self._cond:
+            self._buf.clear()
+        if self._thread.is_alive():
+            self._thread.join(timeout=self.idle_timeout)
+        self._cap.release()
+
+    # --- live extras ---
+
+    def lag_s(self, frame_idx):
+        """
+        Seconds since frame `frame_idx` was read from the source (None once it's too old to look up).
+        """
+        entry = self._times[frame_idx % LATENCY_RING]
+        if entry is None or entry[0] != frame_idx:
+            return None
+        return time.perf_counter() - entry[1]
+
+    def stats(self):
+        return {
+            "source": str(self.source),
+            "realtime": self.realtime,
+            "fps": self.fps,
+            "buffer_frames": self.buffer_frames,
+            "read_frames": self.read_frames,
+            "delivered_frames": self.delivered,
+            "dropped_frames": self.dropped,
+        }
+
+
+def live_source(realtime=False, buffer_s=LIVE_BUFFER_S, idle_timeout=5.0):
+    """
+    "source" stage for HighlightEngine reading through a LiveCapture.
+    """
+    def open_live(video_path, config):
+        return LiveCapture(video_path, realtime=realtime, buffer_s=buffer_s, idle_timeout=idle_timeout)
+    return open_live
+
+
+def run_live(source, out_root, ball_model_path, bat_model_path, config=None, realtime=False, buffer_s=LIVE_BUFFER_S,
+             idle_timeout=5.0, highlight=False, contact_cb=None, clip_cb=None, cancel_event=None):
+    """
+    Runs the pipeline on a live source until it ends (or cancel_event is set).
+    Clips and contact images go to <out_root>/contact_frames/; highlight=True
+    also builds one <out_root>/highlight.mp4 of the whole run.
+    """
+    config = config or PipelineConfig()
+    # a live source can't be re-read: pre-roll from the ring, highlight re-encoded
+    config = config.replace(clips=True, preroll="ring", highlight_mode="encode",
+                            max_latency_s=config.max_latency_s or LIVE_MAX_LATENCY_S)
+    engine = HighlightEngine(config, {"source": live_source(realtime, buffer_s, idle_timeout)})
+    out_highlight = os.path.join(out_root, "highlight.mp4") if highlight else None
+    return engine.run(source, out_highlight, os.path.join(out_root, "contact_frames"),
+                      ball_model_path, bat_model_path, cancel_event=cancel_event,
+                      contact_cb=contact_cb, clip_cb=clip_cb)
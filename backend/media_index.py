@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import cv2
+
+# -----------------------------------------------------
+# MEDIA & CONTACT INDEX
+# SQLite index of the uploads, the processing runs made on them (with
+# their highlight) and one row per contact, so listing and querying the
+# library never scans uploads/ or opens contact_info.json files. A run
+# and its contacts go in with one transaction when its job finishes; the
+# newest run of a video is its "current" one. The database sits next to
+# the uploads (uploads/.store/index.db) and is synced with the folder
+# once at startup.
+# -----------------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    name TEXT PRIMARY KEY,
+    sha256 TEXT,
+    size_bytes INTEGER,
+    fps REAL,
+    frames INTEGER,
+    width INTEGER,
+    height INTEGER,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video TEXT NOT NULL REFERENCES videos(name) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    current INTEGER NOT NULL DEFAULT 1,
+    finished_at REAL NOT NULL,
+    result_key TEXT,
+    highlight_path TEXT,
+    highlight_frames INTEGER,
+    frames INTEGER,
+    elapsed_s REAL,
+    contacts INTEGER NOT NULL DEFAULT 0,
+    contacts_json TEXT
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    video TEXT NOT NULL,
+    frame_idx INTEGER NOT NULL,
+    time_s REAL,
+    frame_highlight INTEGER,
+    img TEXT,
+    ball_conf REAL,
+    ball_x INTEGER,
+    ball_y INTEGER,
+    bat_conf REAL,
+    bat_pts TEXT
+);
+CREATE INDEX IF NOT EXISTS videos_added ON videos(added_at);
+CREATE INDEX IF NOT EXISTS runs_video ON runs(video, current);
+CREATE INDEX IF NOT EXISTS contacts_run ON contacts(run_id);
+CREATE INDEX IF NOT EXISTS contacts_video ON contacts(video, frame_idx);
+"""
+
+MAX_LIMIT = 500
+
+# sort keys /videos and /contacts accept -> SQL
+VIDEO_SORTS = {
+    "added": "v.added_at",
+    "name": "v.name",
+    "contacts": "COALESCE(r.contacts, -1)",
+    "duration": "v.frames / v.fps",
+    "processed": "r.finished_at",
+}
+CONTACT_SORTS = {
+    "time": "c.video, c.frame_idx",
+    "ball_conf": "c.ball_conf",
+    "bat_conf": "c.bat_conf",
+    "recent": "r.finished_at",
+}
+
+
+def probe_video(path):
+    """
+    (fps, frame count, width, height) read from the container header.
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None, None, None, None
+        return (cap.get(cv2.CAP_PROP_FPS) or None, int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0) or None,
+                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    finally:
+        cap.release()
+
+
+class MediaIndex:
+    """
+    One connection shared by the request and worker threads behind a lock
+    (the index is small and writes are one per upload / finished run).
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(SCHEMA)
+
+    # --- writes ---
+
+    def add_video(self, name, path, sha256=None):
+        """
+        Adds (or refreshes) uploads/<name>: hash, size and stream properties.
+        """
+        fps, frames, width, height = probe_video(path)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO videos (name, sha256, size_bytes, fps, frames, width, height, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET sha256 = excluded.sha256, "
+                "size_bytes = excluded.size_bytes, fps = excluded.fps, frames = excluded.frames, "
+                "width = excluded.width, height = excluded.height",
+                (name, sha256, os.path.getsize(path), fps, frames, width, height, time.time()))
+
+    def remove_video(self, name):
+        """
+        Drops a video with its runs and contacts.
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM videos WHERE name = ?", (name,))
+
+    def record_run(self, name, kind, result):
+        """
+        Stores a finished run (a process_video_for_highlight style result) and
+        its contacts as the video's current run. Returns the run id, or None
+        when the video isn't indexed.
+        """
+        with self._lock, self._db:
+            row = self._db.execute("SELECT fps FROM videos WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            fps = row["fps"]
+            contacts = result.get("contacts") or []
+            self._db.execute("UPDATE runs SET current = 0 WHERE video = ? AND current = 1", (name,))
+            run_id = self._db.execute(
+                "INSERT INTO runs (video, kind, finished_at, result_key, highlight_path, highlight_frames, "
+                "frames, elapsed_s, contacts, contacts_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, kind, time.time(), result.get("result_key"), result.get("highlight_path"),
+                 result.get("highlight_frames"), result.get("frames"), result.get("elapsed_s"),
+                 len(contacts), result.get("contacts_json"))).lastrowid
+            self._db.executemany(
+                "INSERT INTO contacts (run_id, video, frame_idx, time_s, frame_highlight, img, ball_conf, "
+                "ball_x, ball_y, bat_conf, bat_pts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._contact_row(run_id, name, c, fps) for c in contacts])
+        return run_id
+
+    @staticmethod
+    def _contact_row(run_id, name, c, fps):
+        ball = c.get("ball") or {}
+        bat = c.get("bat") or {}
+        return (run_id, name, c["frame_idx"], c["frame_idx"] / fps if fps else None, c.get("frame_highlight"),
+                c.get("img"), ball.get("conf"), ball.get("x_orig"), ball.get("y_orig"), bat.get("conf"),
+                json.dumps(bat["pts_orig"]) if bat.get("pts_orig") is not None else None)
+
+    def current_result_key(self, name):
+        with self._lock:
+            row = self._db.execute("SELECT result_key FROM runs WHERE video = ? AND current = 1", (name,)).fetchone()
+        return row["result_key"] if row is not None else None
+
+    def sync(self, upload_folder, extensions, digest_fn=None, output_suffix="_highlight.mp4"):
+        """
+        Brings the index in line with the folder: adds video files it doesn't
+        know (importing a <name>_contact_frames/contact_info.json left by an
+        earlier run) and drops rows whose file is gone. Highlight outputs
+        (*<output_suffix>) aren't uploads. digest_fn(name) gives a known sha256 or None.
+        """
+        on_disk = {name for name in os.listdir(upload_folder)
+                   if name.lower().endswith(extensions) and not name.endswith(output_suffix)}
+        with self._lock:
+            known = {row["name"] for row in self._db.execute("SELECT name FROM videos")}
+        for name in sorted(known - on_disk):
+            self.remove_video(name)
+        added = sorted(on_disk - known)
+        for name in added:
+            path = os.path.join(upload_folder, name)
+            self.add_video(name, path, digest_fn(name) if digest_fn is not None else None)
+            info = os.path.join(upload_folder, f"{os.path.splitext(name)[0]}_contact_frames", "contact_info.json")
+            if os.path.exists(info):
+                try:
+                    with open(info) as f:
+                        contacts = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"[WARN] Could not import {info}: {e}")
+                    continue
+                self.record_run(name, "import", {"contacts": contacts, "contacts_json": info})
+        if added or known - on_disk:
+            print(f"[INFO] Media index: {len(added)} video(s) added, {len(known - on_disk)} removed")
+
+    # --- queries ---
+
+    def list_videos(self, q=None, processed=None, min_contacts=None, sort="added", desc=True, limit=50, offset=0):
+        """
+        Page of videos with their current run: (rows, total).
+        """
+        where, args = [], []
+        if q:
+            where.append("v.name LIKE ? ESCAPE '\\'")
+            args.append("%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if processed is not None:
+            where.append("r.id IS NOT NULL" if processed else "r.id IS NULL")
+        if min_contacts is not None:
+            where.append("r.contacts >= ?")
+            args.append(min_contacts)
+        sql_from = "FROM videos v LEFT JOIN runs r ON r.video = v.name AND r.current = 1"
+        if where:
+            sql_from += " WHERE " + " AND ".join(where)
+        order = f"{VIDEO_SORTS[sort]} {'DESC' if desc else 'ASC'}, v.name"
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) {sql_from}", args).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT v.*, r.id AS run_id, r.kind, r.finished_at, r.highlight_path, r.highlight_frames, "
+                f"r.contacts {sql_from} ORDER BY {order} LIMIT ? OFFSET ?",
+                args + [min(limit, MAX_LIMIT), offset]).fetchall()
+        return [dict(row) for row in rows], total
+
+    def video_names(self):
+        with self._lock:
+            return [row["name"] for row in self._db.execute("SELECT name FROM videos ORDER BY added_at DESC, name")]
+
+    def query_contacts(self, video=None, min_ball_conf=None, min_bat_conf=None, from_s=None, to_s=None,
+                       all_runs=False, sort="time", desc=False, limit=100, offset=0):
+        """
+        Page of contacts across videos (current runs only unless all_runs): (rows, total).
+        """
+        where, args = [], []
+        if not all_runs:
+            where.append("r.current = 1")
+        if video:
+            where.append("c.video = ?")
+            args.append(video)
+        for column, op, value in (("c.ball_conf", ">=", min_ball_conf), ("c.bat_conf", ">=", min_bat_conf),
+                                  ("c.time_s", ">=", from_s), ("c.time_s", "<=", to_s)):
+            if value is not None:
+                where.append(f"{column} {op} ?")
+                args.append(value)
+        sql_from = "FROM contacts c JOIN runs r ON r.id = c.run_id"
+        if where:
+            sql_from += " WHERE " + " AND ".join(where)
+        direction = "DESC" if desc else "ASC"
+        order = ", ".join(f"{col} {direction}" for col in CONTACT_SORTS[sort].split(", ")) + ", c.id"
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) {sql_from}", args).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT c.*, r.kind, r.finished_at, r.highlight_path {sql_from} ORDER BY {order} LIMIT ? OFFSET ?",
+                args + [min(limit, MAX_LIMIT), offset]).fetchall()
+        out = []
+        for row in rows:
+            d = dict(row)
+            d["bat_pts"] = json.loads(d["bat_pts"]) if d["bat_pts"] else None
+            out.append(d)
+        return out, total
+
+    def stats(self):
+        with self._lock:
+            return {table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("videos", "runs", "contacts")}
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+
+# -----------------------------------------------------
+# PIPELINE METRICS
+# Each run collects a RunMetrics: one latency histogram per pipeline stage
+# (observed per call, with the number of frames the call covered) and
+# frame counters. Observing is a bisect and a few additions, cheap enough
+# for every frame. Finished runs are added to the process-wide
+# `pipeline_metrics`, which app.py serves in Prometheus text format on
+# /metrics; the run's own numbers go into its result as "metrics".
+# With a TraceWriter attached (profile=True) every observation is also a
+# span in a Chrome / Perfetto trace of the run. Live runs also keep a
+# histogram of end-to-end frame latency (capture to processed).
+# -----------------------------------------------------
+
+PREFIX = "batsmanpro"
+
+# frame-loop stages in pipeline order; "replay" is a contact replay over recorded
+# detections plus its highlight cut (parallel merge, /retune); "delivery" the
+# faststart / HLS pass over the finished highlight
+STAGES = ("decode", "resize", "ball_infer", "bat_infer", "contact", "jpeg_write", "video_write", "highlight_export",
+          "replay", "delivery")
+
+TRACE_FLUSH_EVENTS = 5000      # trace events buffered before they're written out
+TRACE_MAX_EVENTS = 2_000_000   # later events are dropped (about 200 MB of trace)
+
+# histogram bucket upper bounds, seconds per call
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = {
+    "frames": "Frames the frame loop went through",
+    "inferred": "Frames the ball detector ran on",
+    "skipped_cooldown": "Frames skipped inside a contact cooldown window",
+    "skipped_stride": "Frames left to the tracker by the detector stride",
+    "skipped_gate": "Static frames the motion gate kept from the ball detector",
+    "written": "Highlight frames written",
+    "bat_invocations": "Bat detector calls",
+    "contacts": "Contacts detected",
+    "dropped": "Live-source frames dropped because the pipeline fell behind",
+    "shed": "Frames kept from the detectors to stay within the live latency bound",
+    "clips": "Per-contact highlight clips written",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one: above the largest bound
+        self.calls = 0
+        self.items = 0
+        self.sum = 0.0
+
+    def observe(self, seconds, items=1):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.calls += 1
+        self.items += items
+        self.sum += seconds
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.calls += other.calls
+        self.items += other.items
+        self.sum += other.sum
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile (None if empty or above all buckets).
+        """
+        if not self.calls:
+            return None
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= q * self.calls:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "items": self.items,
+            "total_s": self.sum,
+            "mean_ms": 1000.0 * self.sum / self.calls if self.calls else None,
+            "p50_ms": None if self.quantile(0.5) is None else 1000.0 * self.quantile(0.5),
+            "p95_ms": None if self.quantile(0.95) is None else 1000.0 * self.quantile(0.95),
+            "fps": self.items / self.sum if self.sum > 0 else None,
+            "buckets": list(self.counts),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        h = cls()
+        h.counts = list(d["buckets"])
+        h.calls = d["calls"]
+        h.items = d["items"]
+        h.sum = d["total_s"]
+        return h
+
+
+class RunMetrics:
+    """
+    Stage histograms and frame counters of one run. A stage is only
+    observed from one thread at a time (the decode / write threads own theirs).
+    """
+
+    def __init__(self, trace=None):
+        self.stages = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.latency = Histogram()  # live sources only: capture -> processed, per frame
+        self.trace = trace
+
+    def observe(self, stage, seconds, items=1, frame=None, label=None):
+        """
+        Call right after the timed work. frame / label (trace name, default
+        the stage) only go into the trace.
+        """
+        h = self.stages.get(stage)
+        if h is None:
+            h = self.stages[stage] = Histogram()
+        h.observe(seconds, items)
+        if self.trace is not None:
+            self.trace.span(label or stage, time.perf_counter() - seconds, seconds, frame, items)
+
+    def observe_latency(self, seconds):
+        self.latency.observe(seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def merge(self, other):
+        for name, h in other.stages.items():
+            if name in self.stages:
+                self.stages[name].merge(h)
+            else:
+                self.stages[name] = Histogram.from_dict(h.to_dict())
+        for name, n in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + n
+        self.latency.merge(other.latency)
+
+    def to_dict(self):
+        frames = self.counters["frames"]
+        return {
+            "stages": {name: self.stages[name].to_dict() for name in STAGES if name in self.stages},
+            "counters": dict(self.counters),
+            "bat_invocation_rate": self.counters["bat_invocations"] / frames if frames else None,
+            "latency": self.latency.to_dict() if self.latency.calls else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        m = cls()
+        m.stages = {name: Histogram.from_dict(h) for name, h in d["stages"].items()}
+        m.counters.update(d["counters"])
+        if d.get("latency"):
+            m.latency = Histogram.from_dict(d["latency"])
+        return m
+
+
+class TraceWriter:
+    """
+    Chrome / Perfetto trace (JSON array format, open in ui.perfetto.dev or
+    chrome://tracing) written while the run goes: events are buffered and
+    flushed every TRACE_FLUSH_EVENTS, so memory stays bounded however long
+    the video is. Safe to call from the decode / write threads.
+    """
+
+    def __init__(self, path, max_events=TRACE_MAX_EVENTS):
+        self.path = path
+        self.max_events = max_events
+        self.t0 = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._buf = []
+        self._threads = set()
+        self._first = True
+        self._file = open(path, "w")
+        self._file.write("[\n")
+
+    def span(self, name, start, seconds, frame=None, items=1):
+        args = {"frame": frame} if frame is not None else {}
+        if items != 1:
+            args["items"] = items
+        self._add({"name": name, "ph": "X", "ts": round((start - self.t0) * 1e6, 1),
+                   "dur": round(seconds * 1e6, 1), "args": args})
+
+    def instant(self, name, frame=None):
+        self._add({"name": name, "ph": "i", "s": "p", "ts": round((time.perf_counter() - self.t0) * 1e6, 1),
+                   "args": {"frame": frame} if frame is not None else {}})
+
+    def _add(self, event):
+        tid = threading.get_ident()
+        event["pid"] = self.pid
+        event["tid"] = tid
+        with self._lock:
+            if self._file is None:
+                return
+            if tid not in self._threads:
+                self._threads.add(tid)
+                self._buf.append(json.dumps({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                                             "args": {"name": threading.current_thread().name}}))
+            if self.events >= self.max_events:
+                self.dropped += 1
+                return
+            self.events += 1
+            self._buf.append(json.dumps(event))
+            if len(self._buf) >= TRACE_FLUSH_EVENTS:
+                self._flush()
+
+    def _flush(self):
+        if self._buf:
+            self._file.write(("" if self._first else ",\n") + ",\n".join(self._buf))
+            self._first = False
+            self._buf = []
+
+    def close(self):
+        """
+        Writes the rest and closes the file. Returns {path, events, dropped}.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+                self._file.write("\n]\n")
+                self._file.close()
+                self._file = None
+        if self.dropped:
+            print(f"[WARN] Trace hit {self.max_events} events; {self.dropped} later events dropped")
+        return {"path": self.path, "events": self.events, "dropped": self.dropped}
+
+
+class PipelineMetrics:
+    """
+    Process-wide totals of all finished runs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._total = RunMetrics()
+        self.runs = 0
+
+    def record(self, run):
+        with self._lock:
+            self._total.merge(run)
+            self.runs += 1
+
+    def render(self, gauges=None):
+        """
+        Prometheus text exposition of the totals plus `gauges`:
+        {name: (help, value)} or {name: (help, {label value: value})} (label "status").
+        """
+        with self._lock:
+            total = RunMetrics()
+            total.merge(self._total)
+            runs = self.runs
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {PREFIX}_{name} {text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        header("runs_total", "counter", "Finished pipeline runs")
+        lines.append(f"{PREFIX}_runs_total {runs}")
+
+        header("stage_seconds", "histogram", "Time per stage call")
+        for name in STAGES:
+            h = total.stages.get(name)
+            if h is None:
+                continue
+            seen = 0
+            for bound, n in zip(h.buckets, h.counts):
+                seen += n
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {seen}')
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {h.calls}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{name}"}} {h.sum}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{name}"}} {h.calls}')
+
+        if total.latency.calls:
+            h = total.latency
+            header("frame_latency_seconds", "histogram", "Live sources: frame capture to processed")
+            seen = 0
+            for bound, n in zip(h.buckets, h.counts):
+                seen += n
+                lines.append(f'{PREFIX}_frame_latency_seconds_bucket{{le="{bound}"}} {seen}')
+            lines.append(f'{PREFIX}_frame_latency_seconds_bucket{{le="+Inf"}} {h.calls}')
+            lines.append(f'{PREFIX}_frame_latency_seconds_sum {h.sum}')
+            lines.append(f'{PREFIX}_frame_latency_seconds_count {h.calls}')
+
+        header("stage_frames_total", "counter", "Frames handled per stage")
+        for name in STAGES:
+            if name in total.stages:
+                lines.append(f'{PREFIX}_stage_frames_total{{stage="{name}"}} {total.stages[name].items}')
+
+        for name, text in COUNTERS.items():
+            header(f"{name}_total", "counter", text)
+            lines.append(f"{PREFIX}_{name}_total {total.counters[name]}")
+
+        for name, (text, value) in (gauges or {}).items():
+            header(name, "gauge", text)
+            if isinstance(value, dict):
+                for label, v in value.items():
+                    lines.append(f'{PREFIX}_{name}{{status="{label}"}} {v}')
+            else:
+                lines.append(f"{PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+pipeline_metrics = PipelineMetrics()
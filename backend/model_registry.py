@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+import numpy as np
+
+# -----------------------------------------------------
+# PROCESS-WIDE MODEL REGISTRY
+# Loads each YOLO weight file once per worker process, warms it up
+# and hands the same resident model to every request. A weight file
+# whose mtime changes on disk is reloaded on the next lookup.
+# -----------------------------------------------------
+
+WARMUP_SIZE = 640
+
+
+class ResidentModel:
+    """
+    Thin wrapper around a loaded YOLO model.
+    Ultralytics predictors keep per-call state, so inference calls are
+    serialized with a per-model lock; everything else is proxied as-is.
+    """
+
+    def __init__(self, model, path, device):
+        self.model = model
+        self.path = path
+        self.device = device
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            return self.model(*args, **kwargs)
+
+    def predict(self, *args, **kwargs):
+        with self._lock:
+            return self.model.predict(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class _Entry:
+    def __init__(self, path, device):
+        self.path = path
+        self.device = device
+        self.lock = threading.Lock()
+        self.resident = None
+        self.mtime = None
+        self.load_s = None
+        self.warmup_s = None
+        self.loaded_at = None
+        self.loads = 0
+        self.hits = 0
+
+
+class ModelRegistry:
+    """
+    Thread-safe cache of resident detectors keyed by (weight path, device).
+    """
+
+    def __init__(self, warmup=True, warmup_size=WARMUP_SIZE):
+        self.warmup = warmup
+        self.warmup_size = warmup_size
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, path, device='cpu'):
+        """
+        Returns the resident model for `path`, loading (or hot-reloading
+        when the weight file changed) under the entry lock.
+        """
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model weights not found: {path}")
+        mtime = os.path.getmtime(path)
+
+        with self._lock:
+            entry = self._entries.get((path, device))
+            if entry is None:
+                entry = _Entry(path, device)
+                self._entries[(path, device)] = entry
+
+        with entry.lock:
+            if entry.resident is None or entry.mtime != mtime:
+                if entry.resident is not None:
+                    print(f"🔄 Weights changed on disk, reloading {os.path.basename(path)}")
+                self._load(entry, mtime)
+            else:
+                entry.hits += 1
+            return entry.resident
+
+    def preload(self, paths, device='cpu'):
+        """
+        Loads every existing weight file up front (e.g. at server start).
+        """
+        for path in paths:
+            if os.path.exists(path):
+                self.get(path, device)
+            else:
+                print(f"[WARN] Skipping preload, weights missing: {path}")
+
+    def stats(self):
+        """
+        Load / warm-up timings for every entry, suitable for JSON.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+        return [{
+            "path": e.path,
+            "device": e.device,
+            "loaded": e.resident is not None,
+            "mtime": e.mtime,
+            "load_s": e.load_s,
+            "warmup_s": e.warmup_s,
+            "loaded_at": e.loaded_at,
+            "loads": e.loads,
+            "hits": e.hits,
+        } for e in entries]
+
+    def entry_stats(self, path, device='cpu'):
+        key = (os.path.abspath(path), device)
+        for s in self.stats():
+            if (s["path"], s["device"]) == key:
+                return s
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _load(self, entry, mtime):
+        from ultralytics import YOLO
+
+        print(f"🟢 Loading {os.path.basename(entry.path)} on {entry.device} ...")
+        t0 = time.perf_counter()
+        model = YOLO(entry.path)
+        if entry.device != 'cpu':
+            import torch
+            if torch.cuda.is_available():
+                model.to(entry.device)
+        entry.load_s = time.perf_counter() - t0
+
+        entry.warmup_s = 0.0
+        if self.warmup:
+            t0 = time.perf_counter()
+            dummy = np.zeros((self.warmup_size, self.warmup_size, 3), dtype=np.uint8)
+            try:
+                model.predict(source=dummy, imgsz=self.warmup_size, verbose=False)
+            except Exception as e:
+                print(f"[WARN] Warm-up failed for {entry.path}: {e}")
+            entry.warmup_s = time.perf_counter() - t0
+
+        entry.resident = ResidentModel(model, entry.path, entry.device)
+        entry.mtime = mtime
+        entry.loaded_at = time.time()
+        entry.loads += 1
+        print(f"[INFO] {os.path.basename(entry.path)} ready "
+              f"(load {entry.load_s:.2f}s, warm-up {entry.warmup_s:.2f}s)")
+
+
+# shared instance used by the Flask app and the pipeline
+registry = ModelRegistry()
+
+
+def get_model(path, device='cpu'):
+    return registry.get(path, device)
@@ -0,0 +1,97 @@
+import cv2
+import numpy as np
+
+# -----------------------------------------------------
+# MOTION GATE
+# Cheap frame differencing on a downscaled copy of the 640 crop. Frames
+# with (almost) nothing moving skip the ball detector and count as
+# "no detection" for the ball-visibility state machine.
+# -----------------------------------------------------
+
+DEFAULT_GATE = {
+    "size": 160,         # side of the downscaled grayscale frame
+    "pixel_delta": 15,   # per-pixel |diff| that counts as motion
+    "on": 6,             # changed pixels needed to open the gate
+    "off": 3,            # gate stays open while at least this many pixels change
+    "hold": 8,           # frames the gate stays open after motion drops below `off`
+}
+
+
+class MotionGate:
+    """
+    Hysteresis gate over motion energy (number of changed pixels between
+    consecutive evaluated frames). update(crop) returns True when the ball
+    detector should run on this frame.
+    """
+
+    def __init__(self, size=160, pixel_delta=15, on=6, off=3, hold=8):
+        self.size = size
+        self.pixel_delta = pixel_delta
+        self.on = on
+        self.off = off
+        self.hold = hold
+        self._prev = None
+        self._open = True
+        self._hold_left = hold
+        self.evaluated = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        config: None / False (no gate), True (defaults) or a dict overriding DEFAULT_GATE.
+        """
+        if not config:
+            return None
+        params = dict(DEFAULT_GATE)
+        if isinstance(config, dict):
+            unknown = set(config) - set(params)
+            if unknown:
+                raise ValueError(f"Unknown motion gate settings: {sorted(unknown)}")
+            params.update(config)
+        return cls(**params)
+
+    def energy(self, crop):
+        small = cv2.resize(crop, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        prev, self._prev = self._prev, gray
+        if prev is None:
+            return None
+        return int(np.count_nonzero(cv2.absdiff(gray, prev) > self.pixel_delta))
+
+    def update(self, crop):
+        self.evaluated += 1
+        e = self.energy(crop)
+        if e is None:
+            return True  # first frame: nothing to compare against
+        if e >= self.on or (self._open and e >= self.off):
+            self._open = True
+            self._hold_left = self.hold
+        elif self._hold_left > 0:
+            self._hold_left -= 1
+        else:
+            self._open = False
+        if not self._open:
+            self.skipped += 1
+        return self._open
+
+    def stats(self):
+        return {
+            "evaluated": self.evaluated,
+            "skipped": self.skipped,
+            "skip_rate": self.skipped / self.evaluated if self.evaluated else 0.0,
+        }
+
+
+def contact_recall(reference, candidate, tolerance=2):
+    """
+    Fraction of reference contact frames (e.g. from an ungated run) that have
+    a candidate contact within `tolerance` frames. Accepts lists of frame
+    indices or contact dicts with "frame_idx".
+    """
+    ref = [c["frame_idx"] if isinstance(c, dict) else c for c in reference]
+    cand = [c["frame_idx"] if isinstance(c, dict) else c for c in candidate]
+    if not ref:
+        return 1.0
+    found = sum(1 for r in ref if any(abs(r - c) <= tolerance for c in cand))
+    return found / len(ref)
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_EXCEPTION
+
+import cv2
+
+import batball_video
+from batball_video import process_video_for_highlight, ProcessingCancelled
+from detection_cache import FrameDetections, replay_outputs
+from model_registry import registry
+from metrics import RunMetrics, pipeline_metrics
+from delivery import deliver
+
+# -----------------------------------------------------
+# PARALLEL CHUNKED PROCESSING
+# The video is split into time chunks, one per worker process (each with
+# its own resident models). Workers run the normal frame loop on their
+# chunk, starting `overlap` frames early so their ball-active / cooldown
+# state is usually already right at the chunk start, and record the raw
+# detections of every frame they ran the detectors on.
+# The merge then replays the contact state machine over the whole video
+# in order (cheap: no decode, no inference). A frame the true sequential
+# run needs but no worker detected (its state differed there) is decoded
+# and detected on the spot. The contact list is therefore exactly the
+# sequential one; the highlight, the union of [contact - PRE_FRAMES,
+# contact + POST_FRAMES], is cut from it by seeking to each range.
+# -----------------------------------------------------
+
+MP_START_METHOD = "spawn"  # fresh interpreters: safe with torch / CUDA
+DEFAULT_OVERLAP = 300      # warm-up frames in front of every chunk but the first
+MIN_CHUNK_FRAMES = 600     # shorter videos (per worker) aren't worth splitting
+
+# options whose per-frame decisions the replay doesn't model
+UNSUPPORTED = {
+    "motion_gate": "motion gate",
+    "detect_stride": "detector stride",
+    "active_stride": "detector stride",
+    "roi_size": "ROI crop",
+    "tracker": "tracker",
+    "profile": "trace profiling",
+}
+
+
+def unsupported_options(options):
+    """
+    Names of the given pipeline options parallel mode can't reproduce exactly.
+    """
+    found = []
+    for key, label in UNSUPPORTED.items():
+        value = options.get(key)
+        if key in ("detect_stride", "active_stride"):
+            active = value is not None and int(value) > 1
+        else:
+            active = bool(value)
+        if active and label not in found:
+            found.append(label)
+    return found
+
+
+def plan_chunks(total_frames, workers, min_chunk_frames=MIN_CHUNK_FRAMES):
+    """
+    [(start, stop)] covering [0, total_frames); the last stop is None (read to EOF).
+    """
+    n = max(1, min(workers, total_frames // max(1, min_chunk_frames)))
+    starts = [round(i * total_frames / n) for i in range(n)]
+    return [(start, starts[i + 1] if i + 1 < n else None) for i, start in enumerate(starts)]
+
+
+# --- worker process side ---
+_cancel = None
+_progress = None
+
+
+def _init_worker(model_paths, device, threads, cancel, progress):
+    global _cancel, _progress
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _cancel = cancel
+    _progress = progress
+    registry.preload(model_paths, device)
+
+
+def _run_chunk(slot, kwargs):
+    def progress_cb(done, total):
+        _progress[slot] = done
+    res = process_video_for_highlight(progress_cb=progress_cb, cancel_event=_cancel, **kwargs)
+    return {"detections": res["detections"], "frames": res["frames"],
+            "first_frame": res["first_frame"], "elapsed_s": res["elapsed_s"], "metrics": res["metrics"]}
+
+
+# --- parent side ---
+def process_video_parallel(video_path, out_highlight_path, contact_frames_root, ball_model_path, bat_model_path,
+                           device='cpu', workers=None, overlap=DEFAULT_OVERLAP, progress_cb=None,
+                           cancel_event=None, detection_cache=None, contact_cb=None, **options):
+    """
+    process_video_for_highlight split across `workers` processes (default: CPU count).
+    Same contacts and highlight as the sequential run; falls back to it for
+    short videos or a single worker. `options` are passed through to every
+    chunk (batch_size, pipelined, ...; see unsupported_options).
+    """
+    t_start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    bad = unsupported_options(options)
+    if bad:
+        raise ValueError(f"Parallel mode doesn't support: {', '.join(bad)}")
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {video_path}")
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    plan = plan_chunks(total_frames, workers)
+    if len(plan) < 2:
+        print("[INFO] Video too short to split; processing sequentially")
+        return process_video_for_highlight(video_path, out_highlight_path, contact_frames_root,
+                                           ball_model_path, bat_model_path, device=device,
+                                           progress_cb=progress_cb, cancel_event=cancel_event,
+                                           detection_cache=detection_cache, contact_cb=contact_cb, **options)
+
+    print(f"[INFO] Processing {total_frames} frames in {len(plan)} chunks on {len(plan)} processes")
+    options.pop("preroll", None)  # chunks write no highlight, nothing to pre-roll
+    highlight_mode = options.pop("highlight_mode", "encode")
+    delivery = options.pop("delivery", "faststart")
+    os.makedirs(contact_frames_root, exist_ok=True)
+    os.makedirs(os.path.dirname(out_highlight_path), exist_ok=True)
+    scratch = os.path.join(contact_frames_root, ".chunks")
+
+    ctx = multiprocessing.get_context(MP_START_METHOD)
+    cancel = ctx.Event()
+    progress = ctx.Array('q', len(plan), lock=False)
+    threads = max(1, (os.cpu_count() or 1) // len(plan))
+    t_chunks = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(plan), mp_context=ctx, initializer=_init_worker,
+                             initargs=([ball_model_path, bat_model_path], device, threads, cancel, progress)) as pool:
+        futures = []
+        for i, (start, stop) in enumerate(plan):
+            futures.append(pool.submit(_run_chunk, i, dict(
+                video_path=video_path, out_highlight_path=None,
+                contact_frames_root=os.path.join(scratch, str(i)),
+                ball_model_path=ball_model_path, bat_model_path=bat_model_path, device=device,
+                frame_range=(max(0, start - overlap), stop), record_detections=True, **options)))
+        pending = set(futures)
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                cancel.set()
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+            if any(f.exception() is not None for f in done):
+                cancel.set()  # one chunk failed: stop the others early
+            if progress_cb is not None:
+                progress_cb(min(total_frames, sum(progress[:])), total_frames)
+        try:
+            results = [f.result() for f in futures]
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    chunks_s = time.perf_counter() - t_chunks
+    if cancel_event is not None and cancel_event.is_set():
+        raise ProcessingCancelled("Cancelled while merging chunks")
+
+    # --- merge: replay the sequential decisions over the recorded detections ---
+    t_merge = time.perf_counter()
+    balls_by_frame = {}
+    bats_by_frame = {}
+    for res in results:
+        balls_by_frame.update(res["detections"]["balls"])
+        bats_by_frame.update(res["detections"]["bats"])
+    n_frames = results[-1]["first_frame"] + results[-1]["frames"]
+
+    detections = FrameDetections(video_path, ball_model_path, bat_model_path, device,
+                                 balls=balls_by_frame, bats=bats_by_frame)
+    t_export = time.perf_counter()
+    contacts, written, json_path, mode_used = replay_outputs(video_path, out_highlight_path, contact_frames_root,
+                                                             n_frames, detections, highlight_mode=highlight_mode,
+                                                             contact_cb=contact_cb)
+    replay_s = time.perf_counter() - t_export
+    t_delivery = time.perf_counter()
+    delivered = deliver(out_highlight_path, delivery)
+    delivery_s = time.perf_counter() - t_delivery
+    missing = {"balls": len(detections.new_balls), "bats": len(detections.new_bats)}
+    # chunk metrics (gathered in the worker processes) + the merge's own work
+    metrics = RunMetrics()
+    for res in results:
+        metrics.merge(RunMetrics.from_dict(res["metrics"]))
+    metrics.observe("replay", replay_s, n_frames)
+    metrics.observe("delivery", delivery_s)
+    metrics.counters.update(written=written, contacts=len(contacts))
+    metrics.count("inferred", missing["balls"])
+    metrics.count("bat_invocations", missing["bats"])
+    pipeline_metrics.record(metrics)
+    if missing["balls"] or missing["bats"]:
+        print(f"[INFO] Merge detected {missing['balls']} ball / {missing['bats']} bat frames the chunks skipped")
+    if detection_cache is not None:
+        detection_cache.store(detection_cache.key(video_path, ball_model_path, bat_model_path), n_frames,
+                              balls_by_frame, bats_by_frame,
+                              meta={"record_conf": batball_video.CONF_THRESH, "fps": fps,
+                                    "width": width, "height": height})
+    merge_s = time.perf_counter() - t_merge
+
+    if progress_cb is not None:
+        progress_cb(n_frames, max(total_frames, n_frames))
+    elapsed = time.perf_counter() - t_start
+
+    print(f"✅ Done! Saved highlight: {out_highlight_path}")
+    print(f"✅ Contacts JSON: {json_path}")
+
+    return {
+        "highlight_path": out_highlight_path,
+        "contacts_json": json_path,
+        "contacts": contacts,
+        "frames": n_frames,
+        "highlight_frames": written,
+        "highlight_mode": mode_used,
+        "delivery": delivered,
+        "elapsed_s": elapsed,
+        "fps": n_frames / elapsed if elapsed > 0 else None,
+        "metrics": metrics.to_dict(),
+        "parallel": {
+            "workers": len(plan),
+            "overlap": overlap,
+            "chunks": [{"first": r["first_frame"], "start": start, "frames": r["frames"],
+                        "elapsed_s": r["elapsed_s"]} for (start, _), r in zip(plan, results)],
+            "merge_detected_frames": missing,
+            "chunks_s": chunks_s,
+            "merge_s": merge_s
+        },
+        "models": {
+            "ball": registry.entry_stats(ball_model_path, device),
+            "bat": registry.entry_stats(bat_model_path, device)
+        }
+    }
@@ -0,0 +1,140 @@
+import time
+import threading
+from collections import deque
+import cv2
+
+# -----------------------------------------------------
+# LOW-MEMORY PRE-ROLL
+# Instead of keeping PRE_FRAMES decoded frames around, only the frame
+# index and timestamp of recent frames are remembered. When a contact
+# needs its pre-roll, a second capture on the same file seeks back and
+# re-decodes just that range. Peak memory stays near one frame per job
+# at the cost of re-decoding ~PRE_FRAMES frames per contact.
+# -----------------------------------------------------
+
+PREROLL_MODES = ("ring", "seek")
+
+
+class SeekingReader:
+    """
+    cap.read() wrapper with the same pre-roll interface as frame_ring.RingReader
+    (unwritten / hold / unhold / stats), backed by seek + re-decode.
+    read() may run on the decoder thread while unwritten() runs on the
+    inference loop, ahead of it by up to the read-ahead; `history` (like the
+    ring's capacity) must cover pre_frames plus that read-ahead.
+    """
+
+    def __init__(self, cap, video_path, pre_frames, start_idx=0, history=None):
+        self.cap = cap
+        self.video_path = video_path
+        self.next_idx = start_idx
+        self.grabbed = 0
+        self.times = deque(maxlen=history or pre_frames + 1)  # (frame_idx, pos_msec), consecutive indices
+        self._times_lock = threading.Lock()
+        self.redecoded = 0
+        self.seeks = 0
+        self.redecode_s = 0.0
+        self._seek_cap = None
+        self._seek_pos = -1  # frame index the seek capture will return next
+
+    def read(self, need=True):
+        """
+        need=False only advances the stream (cap.grab(), no decode) and
+        returns (True, None); the frame can still be re-decoded later.
+        """
+        if need:
+            ret, frame = self.cap.read()
+        else:
+            ret, frame = self.cap.grab(), None
+            self.grabbed += ret
+        if not ret:
+            return False, None
+        with self._times_lock:
+            self.times.append((self.next_idx, self.cap.get(cv2.CAP_PROP_POS_MSEC)))
+        self.next_idx += 1
+        return True, frame
+
+    def unwritten(self, before_idx, count, last_written_idx):
+        start = max(before_idx - count, last_written_idx + 1, 0)
+        if start >= before_idx:
+            return []
+        t0 = time.perf_counter()
+        frames = self._decode_range(start, before_idx)
+        self.redecode_s += time.perf_counter() - t0
+        return frames
+
+    def hold(self, frame_idx):
+        pass  # re-decoded frames are fresh arrays, nothing to pin
+
+    def unhold(self, frame_idx):
+        pass
+
+    def stats(self):
+        return {
+            "mode": "seek",
+            "grabbed_frames": self.grabbed,
+            "redecoded_frames": self.redecoded,
+            "seeks": self.seeks,
+            "redecode_s": self.redecode_s,
+        }
+
+    def release(self):
+        self.cap.release()
+        if self._seek_cap is not None:
+            self._seek_cap.release()
+            self._seek_cap = None
+
+    def _expected_msec(self, frame_idx):
+        """
+        Timestamp the main capture gave frame_idx. Missing means the history
+        is too short for the read-ahead, and the seek could no longer be checked.
+        """
+        with self._times_lock:
+            pos = frame_idx - self.times[0][0] if self.times else -1
+            if 0 <= pos < len(self.times):
+                return self.times[pos][1]
+        raise RuntimeError(f"Pre-roll timestamp of frame {frame_idx} is no longer known "
+                           f"(history of {self.times.maxlen} frames is shorter than the read-ahead)")
+
+    def _open(self):
+        if self._seek_cap is not None:
+            self._seek_cap.release()
+        self._seek_cap = cv2.VideoCapture(self.video_path)
+        if not self._seek_cap.isOpened():
+            raise RuntimeError(f"Could not reopen video for pre-roll: {self.video_path}")
+        self._seek_pos = 0
+
+    def _decode_range(self, start, end):
+        if self._seek_cap is None:
+            self._open()
+        if self._seek_pos != start:
+            self.seeks += 1
+            self._seek_cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            self._seek_pos = start
+
+        frames = self._read_range(start, end)
+        if frames is None:
+            # inexact seek (timestamps disagree): decode forward from the start instead
+            print(f"[WARN] Pre-roll seek to frame {start} was inexact; re-decoding from the beginning")
+            self._open()
+            for _ in range(start):
+                if not self._seek_cap.grab():
+                    break
+            self._seek_pos = start
+            frames = self._read_range(start, end, check=False) or []
+        return frames
+
+    def _read_range(self, start, end, check=True):
+        frames = []
+        for idx in range(start, end):
+            ret, frame = self._seek_cap.read()
+            if not ret:
+                self._seek_pos = -1
+                return frames or None
+            if check and abs(self._seek_cap.get(cv2.CAP_PROP_POS_MSEC) - self._expected_msec(idx)) > 0.5:
+                self._seek_pos = -1
+                return None
+            frames.append((idx, frame))
+            self.redecoded += 1
+        self._seek_pos = end
+        return frames
@@ -0,0 +1,169 @@
+import cv2
+import stream_copy
+from contact import find_contact
+from stages import open_highlight_writer
+
+# -----------------------------------------------------
+# CONTACT STATE MACHINE / REPLAY
+# The decisions the frame loop makes on top of the detectors: the
+# ball-visible state with its linger, the contact test and the cooldown
+# after a contact. replay_contacts runs them over per-frame detections
+# that were recorded earlier, without decoding or inference; the highlight
+# is then cut straight from the contact list.
+# -----------------------------------------------------
+
+# "encode": decode and re-encode the highlight frames through cv2.VideoWriter;
+# "copy": cut them from the source with ffmpeg stream copy (see stream_copy.py)
+HIGHLIGHT_MODES = ("encode", "copy")
+
+
+class BallState:
+    """
+    Ball "in play" flag: on after `seen` net frames with a ball, off after
+    `miss` frames without one plus `linger` extra frames.
+    """
+
+    def __init__(self, seen=2, miss=5, linger=7):
+        self.seen = seen
+        self.miss = miss
+        self.linger = linger
+        self.visible_frames = 0
+        self.missing_frames = 0
+        self.linger_counter = 0
+        self.active = False
+
+    def update(self, has_ball):
+        if has_ball:
+            self.visible_frames += 1
+            self.missing_frames = 0
+        else:
+            self.missing_frames += 1
+            self.visible_frames = max(0, self.visible_frames - 1)
+
+        if self.visible_frames >= self.seen:
+            self.active = True
+            self.linger_counter = self.linger
+        elif self.missing_frames >= self.miss:
+            if self.linger_counter > 0:
+                self.linger_counter -= 1
+                self.active = True
+            else:
+                self.active = False
+        return self.active
+
+
+def replay_contacts(n_frames, get_balls, get_bats, radius, min_gap, ball_state):
+    """
+    Same contact decisions as process_video_for_highlight (default detector
+    path) for frames 0..n_frames-1. get_balls(idx) / get_bats(idx) return the
+    detections of a frame; they are only asked for frames the frame loop
+    would have run the detector on. Returns [(frame_idx, ball, bat)].
+    """
+    contacts = []
+    last_contact_frame = -9999
+    skip_until = -1
+    for frame_idx in range(n_frames):
+        if last_contact_frame < frame_idx <= skip_until:
+            continue
+        balls = get_balls(frame_idx)
+        ball_active = ball_state.update(bool(balls))
+        bats = get_bats(frame_idx) if ball_active else []
+        contact_ball, contact_bat = find_contact(balls, bats, radius)
+        if contact_ball is not None and frame_idx > last_contact_frame + min_gap:
+            last_contact_frame = frame_idx
+            skip_until = frame_idx + min_gap
+            contacts.append((frame_idx, contact_ball, contact_bat))
+    return contacts
+
+
+def highlight_ranges(contact_frames, n_frames, pre, post):
+    """
+    Merged inclusive (first, last) frame ranges the sequential writer would
+    output for these contacts.
+    """
+    ranges = []
+    for c in sorted(contact_frames):
+        a, b = max(0, c - pre), min(n_frames - 1, c + post)
+        if ranges and a <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], b))
+        else:
+            ranges.append((a, b))
+    return ranges
+
+
+class FrameFetcher:
+    """
+    Random access to single frames by index; consecutive requests don't seek.
+    """
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.cap = None
+        self.pos = 0
+        self.seeks = 0
+
+    def get(self, frame_idx):
+        if self.cap is None:
+            self.cap = cv2.VideoCapture(self.video_path)
+            if not self.cap.isOpened():
+                raise RuntimeError(f"Could not open video: {self.video_path}")
+        if self.pos != frame_idx:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            self.seeks += 1
+        ret, frame = self.cap.read()
+        if not ret:
+            raise RuntimeError(f"Could not decode frame {frame_idx} of {self.video_path}")
+        self.pos = frame_idx + 1
+        return frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+def write_highlight(video_path, out_path, ranges):
+    """
+    Decodes just the given frame ranges and writes them to out_path.
+    Returns the number of frames written.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    writer = open_highlight_writer(out_path, fps, size)
+    written = 0
+    pos = 0
+    try:
+        for a, b in ranges:
+            if writer is None:
+                break
+            if pos != a:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, a)
+                pos = a
+            while pos <= b:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+                written += 1
+                pos += 1
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+    return written
+
+
+def export_highlight(video_path, out_path, ranges, mode="encode"):
+    """
+    Writes the frame ranges to out_path, by stream copy when mode="copy"
+    (falling back to re-encoding if that fails). Returns (frames written, mode used).
+    """
+    if mode == "copy" and ranges:
+        try:
+            return stream_copy.assemble(video_path, out_path, ranges), "copy"
+        except (stream_copy.StreamCopyError, OSError) as e:
+            print(f"[WARN] Stream-copy highlight failed ({e}); re-encoding instead")
+    return write_highlight(video_path, out_path, ranges), "encode"
@@ -0,0 +1,155 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+import batball_video
+
+# -----------------------------------------------------
+# HIGHLIGHT RESULT CACHE
+# Finished highlights keyed by (video hash, model hashes, output-affecting
+# pipeline config). An entry is a directory under uploads/results/<key>/
+# holding highlight.mp4 (plus highlight_hls/ with HLS delivery),
+# contact_frames/ and result.json (written last, so a directory without it
+# is an unfinished run). Hits refresh the entry's
+# mtime; once the total size passes max_bytes the least recently used
+# entries are deleted.
+# -----------------------------------------------------
+
+RESULT_FILE = "result.json"
+# batball_video constants that change contacts or the highlight
+OUTPUT_CONSTANTS = ("CROP_SIZE", "CONF_THRESH", "IOU", "CONTACT_RADIUS", "CONTACT_MIN_GAP", "PRE_FRAMES",
+                    "POST_FRAMES", "BALL_SEEN_FRAMES", "BALL_MISS_FRAMES", "LINGER_FRAMES")
+
+
+def result_key(video_hash, model_hashes, config):
+    """
+    Stable key for one (video, models, config) combination.
+    """
+    blob = json.dumps({"video": video_hash, "models": list(model_hashes), "config": config}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:32]
+
+
+def output_config(options, params=None):
+    """
+    The part of a run's configuration its output depends on: the detector /
+    contact constants (overridden by re-tune `params`) and the options that
+    change which frames are detected. Pipelining, pre-roll mode and
+    parallelism give identical output and are left out, and so does batch
+    size unless a detector stride or ROI is on.
+    """
+    config = {name: getattr(batball_video, name) for name in OUTPUT_CONSTANTS}
+    for name, value in (params or {}).items():
+        config["CONF_THRESH" if name == "conf" else name.upper()] = value
+    config["motion_gate"] = options.get("motion_gate") or False
+    config["detect_stride"] = int(options.get("detect_stride") or 1)
+    config["active_stride"] = int(options.get("active_stride") or 1)
+    config["roi_size"] = int(options.get("roi_size") or 0)
+    if config["detect_stride"] > 1 or config["active_stride"] > 1 or config["roi_size"]:
+        # the stride reacts to ball_active one read-ahead batch late, so these runs depend on it
+        config["batch_size"] = int(options.get("batch_size") or 1)
+    config["highlight_mode"] = options.get("highlight_mode") or "encode"
+    config["delivery"] = options.get("delivery") or "faststart"
+    return config
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class ResultCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # directories left by runs that never finished
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if os.path.isdir(path) and not os.path.exists(os.path.join(path, RESULT_FILE)):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key):
+        """
+        Stored result dict of a finished entry (and marks it recently used), or None.
+        """
+        path = os.path.join(self.entry_dir(key), RESULT_FILE)
+        with self._lock:
+            try:
+                with open(path) as f:
+                    result = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                return None
+        return result
+
+    def produce(self, key, fn, **kwargs):
+        """
+        Runs fn with its outputs redirected into the entry for `key`, then
+        stores the result and evicts old entries. Used as the job callable.
+        """
+        entry = self.entry_dir(key)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.makedirs(entry)
+        kwargs["out_highlight_path"] = os.path.join(entry, "highlight.mp4")
+        kwargs["contact_frames_root"] = os.path.join(entry, "contact_frames")
+        try:
+            result = fn(**kwargs)
+        except BaseException:
+            shutil.rmtree(entry, ignore_errors=True)
+            raise
+        result = dict(result, result_key=key)
+        result["size_bytes"] = _dir_size(entry)
+        with open(os.path.join(entry, RESULT_FILE), "w") as f:
+            json.dump(result, f, indent=2, default=str)
+        self.evict(keep=key)
+        return result
+
+    def stats(self):
+        entries = self._entries()
+        return {"entries": len(entries), "bytes": sum(size for _, _, size in entries), "max_bytes": self.max_bytes}
+
+    def _entries(self):
+        """
+        [(mtime, key, size)] of finished entries, oldest first.
+        """
+        entries = []
+        for key in os.listdir(self.root):
+            path = os.path.join(self.root, key, RESULT_FILE)
+            try:
+                mtime = os.path.getmtime(path)
+                with open(path) as f:
+                    size = json.load(f).get("size_bytes", 0)
+            except (OSError, ValueError):
+                continue
+            entries.append((mtime, key, size))
+        entries.sort()
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Deletes least recently used entries until the cache fits in max_bytes.
+        """
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, _, size in entries)
+            for _, key, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+                total -= size
+                print(f"[INFO] Evicted cached highlight {key} ({size / 1e6:.1f} MB)")
+
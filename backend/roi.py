@@ -0,0 +1,49 @@
+import numpy as np
+
+# -----------------------------------------------------
+# REGION-OF-INTEREST CROP
+# While the ball is being tracked, the detectors look at a roi_size x
+# roi_size window of the 640 crop around the predicted ball (and bat)
+# instead of the whole crop, at imgsz=roi_size. The window is cut at the
+# 640 scale, so objects keep their pixel size and detections map back to
+# 640 space with a plain offset (map_to_original still applies from there).
+# -----------------------------------------------------
+
+ROI_MARGIN = 40  # px (640 space) kept around the predicted positions
+
+
+def roi_window(ball_xy, bat_pts=None, size=320, margin=ROI_MARGIN, bound=640):
+    """
+    Top-left (x0, y0) of a size x size window inside the bound x bound crop
+    that holds the predicted ball (and bat polygon, if given) plus margin.
+    None when they don't fit: the caller then uses the full crop.
+    """
+    xs = [ball_xy[0]]
+    ys = [ball_xy[1]]
+    if bat_pts is not None:
+        xs.extend(p[0] for p in bat_pts)
+        ys.extend(p[1] for p in bat_pts)
+    x_lo, x_hi = min(xs) - margin, max(xs) + margin
+    y_lo, y_hi = min(ys) - margin, max(ys) + margin
+    if x_hi - x_lo > size or y_hi - y_lo > size or size >= bound:
+        return None
+    x0 = int(round((x_lo + x_hi - size) / 2.0))
+    y0 = int(round((y_lo + y_hi - size) / 2.0))
+    x0 = min(max(x0, 0), bound - size)
+    y0 = min(max(y0, 0), bound - size)
+    return x0, y0
+
+
+def cut(crop, window, size):
+    x0, y0 = window
+    return np.ascontiguousarray(crop[y0:y0 + size, x0:x0 + size])
+
+
+def balls_to_crop(balls, window):
+    x0, y0 = window
+    return [(cx + x0, cy + y0, conf) for cx, cy, conf in balls]
+
+
+def bats_to_crop(bats, window):
+    x0, y0 = window
+    return [([[x + x0, y + y0] for x, y in pts], conf) for pts, conf in bats]
@@ -0,0 +1,222 @@
+import queue
+import threading
+import time
+import cv2
+
+# -----------------------------------------------------
+# PIPELINE STAGES
+# Decode and encode run on their own threads, connected to the
+# inference loop by bounded queues. The queue sizes are the backpressure:
+# a slow consumer blocks its producer instead of letting frames pile up.
+# -----------------------------------------------------
+
+_EOF = object()
+_STOP = object()
+
+
+class StageStats:
+    """
+    busy_s: time spent doing the stage's own work
+    wait_s: time spent blocked on an empty input or a full output queue
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.busy_s = 0.0
+        self.wait_s = 0.0
+        self.items = 0
+
+    def to_dict(self, wall_s):
+        return {
+            "items": self.items,
+            "busy_s": self.busy_s,
+            "wait_s": self.wait_s,
+            "utilization": self.busy_s / wall_s if wall_s > 0 else None,
+        }
+
+
+def _put(q, item, stop_event, stats):
+    t0 = time.perf_counter()
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            continue
+    stats.wait_s += time.perf_counter() - t0
+
+
+class FrameDecoder:
+    """
+    Reads frames from a cv2.VideoCapture (or anything with the same read())
+    on a background thread.
+    read() mirrors cap.read() and returns (False, None) at end of stream.
+    With need_fn, frame i is read as cap.read(need_fn(i)) so the source can
+    skip decoding frames nobody will look at (they come through as None);
+    i counts from start_idx, the index of the first frame cap returns.
+    Decoded frames are observed as the "decode" stage of `metrics` (a RunMetrics).
+    """
+
+    def __init__(self, cap, maxsize=8, need_fn=None, metrics=None, start_idx=0):
+        self.cap = cap
+        self.start_idx = start_idx
+        self.need_fn = need_fn
+        self.metrics = metrics
+        self.stats = StageStats("decode")
+        self.consumer_wait_s = 0.0  # time the inference loop spent waiting for frames
+        self._q = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._error = None
+        self._eof = False
+        self._thread = threading.Thread(target=self._run, name="frame-decoder", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        idx = self.start_idx
+        try:
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                if self.need_fn is None:
+                    ret, frame = self.cap.read()
+                else:
+                    ret, frame = self.cap.read(self.need_fn(idx))
+                dt = time.perf_counter() - t0
+                self.stats.busy_s += dt
+                if not ret:
+                    break
+                if self.metrics is not None and frame is not None:
+                    self.metrics.observe("decode", dt, frame=idx)
+                idx += 1
+                self.stats.items += 1
+                _put(self._q, frame, self._stop, self.stats)
+        except Exception as e:
+            self._error = e
+        finally:
+            _put(self._q, _EOF, self._stop, self.stats)
+
+    def read(self):
+        if self._eof:
+            return False, None
+        t0 = time.perf_counter()
+        item = self._q.get()
+        self.consumer_wait_s += time.perf_counter() - t0
+        if item is _EOF:
+            self._eof = True
+            if self._error is not None:
+                raise self._error
+            return False, None
+        return True, item
+
+    def close(self):
+        self._stop.set()
+        try:
+            while True:
+                self._q.get_nowait()
+        except queue.Empty:
+            pass
+        self._thread.join()
+
+
+class HighlightSink:
+    """
+    Writes highlight frames (cv2.VideoWriter), contact JPEGs (cv2.imwrite)
+    and clip frames (call) on a background thread, in submission order. `writer` may be None when
+    only contact images are produced. Writes are observed as the
+    "video_write" / "jpeg_write" stages of `metrics` (a RunMetrics).
+    """
+
+    def __init__(self, writer, maxsize=32, metrics=None):
+        self.writer = writer
+        self.metrics = metrics
+        self.stats = StageStats("write")
+        self.producer_wait_s = 0.0  # time the inference loop spent blocked on a full queue
+        self._q = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="highlight-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            t0 = time.perf_counter()
+            item = self._q.get()
+            self.stats.wait_s += time.perf_counter() - t0
+            if item is _STOP:
+                break
+            t0 = time.perf_counter()
+            try:
+                if self._error is not None:
+                    continue
+                if item[0] == "frame":
+                    self.writer.write(item[1])
+                elif item[0] == "call":
+                    item[1]()
+                else:
+                    cv2.imwrite(item[1], item[2])
+                    if item[3] is not None:
+                        item[3]()
+            except Exception as e:
+                self._error = e
+            finally:
+                if item[0] != "image" and item[2] is not None:
+                    item[2]()  # hand the frame buffer back (e.g. ring slot)
+            dt = time.perf_counter() - t0
+            self.stats.busy_s += dt
+            if self.metrics is not None:
+                if item[0] != "image":
+                    self.metrics.observe("video_write", dt, frame=item[3], label=item[4])
+                else:
+                    self.metrics.observe("jpeg_write", dt)
+            self.stats.items += 1
+
+    def _submit(self, item):
+        t0 = time.perf_counter()
+        self._q.put(item)
+        self.producer_wait_s += time.perf_counter() - t0
+
+    def write(self, frame, done=None, frame_idx=None, label=None):
+        """
+        Queues a highlight frame. `done()` is called once the frame has been
+        written (or dropped after an error) and its buffer may be reused.
+        frame_idx / label only go into the metrics trace.
+        """
+        self._submit(("frame", frame, done, frame_idx, label))
+
+    def call(self, fn, done=None, frame_idx=None, label=None):
+        """
+        Queues fn() to run on the writer thread, in order with the frame
+        writes (e.g. a per-contact clip write); `done()` as for write().
+        """
+        self._submit(("call", fn, done, frame_idx, label))
+
+    def imwrite(self, path, img, done=None):
+        """
+        Queues a JPEG write; `done()` is called once the file is written.
+        """
+        self._submit(("image", path, img, done))
+        return True
+
+    def release(self):
+        """
+        Flushes queued work, stops the thread and releases the VideoWriter.
+        """
+        self._q.put(_STOP)
+        self._thread.join()
+        if self.writer is not None:
+            self.writer.release()
+        if self._error is not None:
+            raise self._error
+
+
+def open_highlight_writer(path, fps, size):
+    """
+    VideoWriter for the highlight using the first codec that opens, or None.
+    """
+    for codec in ['mp4v', 'XVID', 'avc1']:
+        fourcc = cv2.VideoWriter_fourcc(*codec)
+        writer_try = cv2.VideoWriter(path, fourcc, fps, size)
+        if writer_try.isOpened():
+            print(f"[INFO] Highlight writer opened using codec {codec}")
+            return writer_try
+    print("[WARN] Could not initialize VideoWriter; highlights won't be saved.")
+    return None
@@ -0,0 +1,187 @@
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+
+# -----------------------------------------------------
+# STREAM-COPY HIGHLIGHT ASSEMBLY (ffmpeg)
+# Cuts the highlight's frame ranges out of the source container without
+# re-encoding them. Inside a range, whole GOPs (keyframe to keyframe) are
+# copied packet for packet; only the partial GOPs at the cut edges are
+# re-encoded, with the source codec so the pieces can be joined. Pieces
+# are MPEG-TS (parameter sets in-band) and concatenated into an MP4 once
+# their stream parameters are checked to match. Frame i is the i-th
+# packet in presentation (PTS) order and pieces are cut at real PTS, so
+# variable frame rate footage (phones) is cut at the right frames.
+# Needs ffmpeg/ffprobe on PATH (or FFMPEG_BIN / FFPROBE_BIN); callers fall
+# back to re-encoding the whole highlight when this raises.
+# -----------------------------------------------------
+
+FFMPEG = os.environ.get("FFMPEG_BIN", "ffmpeg")
+FFPROBE = os.environ.get("FFPROBE_BIN", "ffprobe")
+
+# source codec -> encoder for the re-encoded edges (must produce the same codec)
+EDGE_ENCODERS = {
+    "h264": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "16"],
+    "hevc": ["-c:v", "libx265", "-preset", "veryfast", "-crf", "18"],
+    "mpeg4": ["-c:v", "mpeg4", "-q:v", "2"],
+}
+
+
+class StreamCopyError(Exception):
+    pass
+
+
+def available():
+    return shutil.which(FFMPEG) is not None and shutil.which(FFPROBE) is not None
+
+
+def _run(cmd):
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        tail = proc.stderr.decode(errors="replace").strip().splitlines()[-3:]
+        raise StreamCopyError(f"{os.path.basename(cmd[0])} failed: {' | '.join(tail)}")
+    return proc.stdout.decode(errors="replace")
+
+
+def _rate(text):
+    num, _, den = text.partition("/")
+    return float(num) / float(den or 1) if float(den or 1) else 0.0
+
+
+def probe(video_path):
+    """
+    Codec, pixel format, frame rate and start time of the first video stream,
+    and the container's start time (input -ss is relative to it).
+    """
+    out = _run([FFPROBE, "-v", "error", "-select_streams", "v:0",
+                "-show_entries", "stream=codec_name,pix_fmt,avg_frame_rate,r_frame_rate,start_time:format=start_time",
+                "-of", "json", video_path])
+    data = json.loads(out)
+    streams = data.get("streams") or []
+    if not streams:
+        raise StreamCopyError(f"No video stream in {video_path}")
+    s = streams[0]
+    fps = _rate(s.get("avg_frame_rate") or "0/0") or _rate(s.get("r_frame_rate") or "0/0")
+    if fps <= 0:
+        raise StreamCopyError("Unknown frame rate")
+    return {
+        "codec": s.get("codec_name"),
+        "pix_fmt": s.get("pix_fmt") or "yuv420p",
+        "fps": fps,
+        "start": float(s.get("start_time") or 0.0),
+        "format_start": float((data.get("format") or {}).get("start_time") or 0.0),
+    }
+
+
+def frame_times(video_path):
+    """
+    (pts of every frame in presentation order, indices of the keyframes),
+    from the packets (nothing is decoded). Frame i is the i-th frame a
+    decoder returns, whatever the frame rate does in between.
+    """
+    out = _run([FFPROBE, "-v", "error", "-select_streams", "v:0",
+                "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video_path])
+    packets = []
+    for line in out.splitlines():
+        pts, _, flags = line.partition(",")
+        if pts in ("", "N/A"):
+            raise StreamCopyError("Video packets without timestamps")
+        packets.append((float(pts), "K" in flags))
+    packets.sort()
+    return [pts for pts, _ in packets], [i for i, (_, key) in enumerate(packets) if key]
+
+
+def stream_params(path):
+    """
+    Parameters of the first video stream two pieces must share to be joined with -c copy.
+    """
+    out = _run([FFPROBE, "-v", "error", "-select_streams", "v:0",
+                "-show_entries", "stream=codec_name,profile,width,height,pix_fmt",
+                "-of", "json", path])
+    streams = json.loads(out).get("streams") or []
+    if not streams:
+        raise StreamCopyError(f"No video stream in {path}")
+    return {k: streams[0].get(k) for k in ("codec_name", "profile", "width", "height", "pix_fmt")}
+
+
+def plan_pieces(ranges, key_frames):
+    """
+    Splits inclusive frame ranges into ("copy" | "encode", first, count)
+    pieces: whole GOPs are copied, partial GOPs at the edges re-encoded.
+    """
+    pieces = []
+    for a, b in ranges:
+        inside = [k for k in key_frames if a <= k <= b + 1]
+        if len(inside) < 2:
+            pieces.append(("encode", a, b - a + 1))
+            continue
+        head, tail = inside[0], inside[-1]
+        if head > a:
+            pieces.append(("encode", a, head - a))
+        pieces.append(("copy", head, tail - head))
+        if tail <= b:
+            pieces.append(("encode", tail, b - tail + 1))
+    return pieces
+
+
+def assemble(video_path, out_path, ranges):
+    """
+    Writes the frame ranges of video_path to out_path (video only).
+    Returns the number of frames in the highlight; raises StreamCopyError.
+    """
+    if not ranges:
+        raise StreamCopyError("No frame ranges to cut")
+    info = probe(video_path)
+    encoder = EDGE_ENCODERS.get(info["codec"])
+    if encoder is None:
+        raise StreamCopyError(f"No edge encoder for codec {info['codec']}")
+    times, key_frames = frame_times(video_path)
+    if ranges[-1][1] >= len(times):
+        raise StreamCopyError(f"Cut past the last frame ({ranges[-1][1]} >= {len(times)})")
+    pieces = plan_pieces(ranges, key_frames)
+
+    tmp = tempfile.mkdtemp(prefix="highlight-", dir=os.path.dirname(os.path.abspath(out_path)))
+    try:
+        parts = []
+        for n, (kind, first, count) in enumerate(pieces):
+            part = os.path.join(tmp, f"{n:04d}.ts")
+            # copy: seeking lands on the keyframe at or before -ss, so aim between it and
+            # the next frame; encode: frames before -ss are decoded and dropped, so aim
+            # between the first frame kept and the one before it
+            if kind == "copy":
+                at = (times[first] + times[first + 1]) / 2 if first + 1 < len(times) else times[first]
+            else:
+                at = (times[first - 1] + times[first]) / 2 if first > 0 else times[first]
+            seek = ["-ss", f"{max(0.0, at - info['format_start']):.6f}", "-i", video_path,
+                    "-frames:v", str(count), "-an"]
+            if kind == "copy":
+                cmd = [FFMPEG, "-v", "error", "-y"] + seek + ["-c:v", "copy"]
+            else:
+                cmd = [FFMPEG, "-v", "error", "-y"] + seek + encoder + ["-pix_fmt", info["pix_fmt"]]
+            _run(cmd + ["-f", "mpegts", part])
+            parts.append(part)
+
+        # re-encoded edges joined to copied GOPs with different parameters give a broken MP4
+        params = [stream_params(part) for part in parts]
+        for (kind, first, _), p in zip(pieces, params):
+            if p != params[0]:
+                raise StreamCopyError(f"{kind} piece at frame {first} doesn't match the other pieces "
+                                      f"({p} vs {params[0]})")
+
+        list_path = os.path.join(tmp, "parts.txt")
+        with open(list_path, "w") as f:
+            for part in parts:
+                f.write(f"file '{part}'\n")
+        out_tmp = os.path.join(tmp, "highlight.mp4")
+        _run([FFMPEG, "-v", "error", "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+              "-c", "copy", "-movflags", "+faststart", out_tmp])
+        os.replace(out_tmp, out_path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    copied = sum(count for kind, _, count in pieces if kind == "copy")
+    total = sum(count for _, _, count in pieces)
+    print(f"[INFO] Highlight stream-copied: {copied}/{total} frames copied, {len(pieces)} pieces")
+    return total
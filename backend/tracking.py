@@ -0,0 +1,171 @@
+import numpy as np
+
+# -----------------------------------------------------
+# CONSTANT-VELOCITY KALMAN TRACKING
+# Replaces the two-point linear extrapolation of last_ball / last_bat.
+# The ball is tracked as a point, the bat as its polygon centroid (the
+# last detected polygon is translated to the predicted centroid).
+# Trackers are stepped once per frame; frames without a detector pass
+# (stride mode) just advance the prediction.
+# -----------------------------------------------------
+
+
+class KalmanPoint:
+    """
+    State [x, y, vx, vy], unit time step, white-acceleration process noise.
+    """
+
+    def __init__(self, x, y, process_noise=1.0, measurement_noise=4.0):
+        self.x = np.array([x, y, 0.0, 0.0])
+        self.P = np.diag([measurement_noise, measurement_noise, 100.0, 100.0])
+        self.F = np.array([[1, 0, 1, 0],
+                           [0, 1, 0, 1],
+                           [0, 0, 1, 0],
+                           [0, 0, 0, 1]], dtype=float)
+        self.H = np.array([[1, 0, 0, 0],
+                           [0, 1, 0, 0]], dtype=float)
+        q = process_noise
+        self.Q = q * np.array([[0.25, 0, 0.5, 0],
+                               [0, 0.25, 0, 0.5],
+                               [0.5, 0, 1, 0],
+                               [0, 0.5, 0, 1]])
+        self.R = measurement_noise * np.eye(2)
+
+    def predict(self):
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        return self.x[0], self.x[1]
+
+    def update(self, x, y):
+        z = np.array([x, y], dtype=float)
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self.H @ self.x)
+        self.P = (np.eye(4) - K @ self.H) @ self.P
+
+    @property
+    def position(self):
+        return self.x[0], self.x[1]
+
+
+class _Track:
+    """
+    Shared bookkeeping: confidence decays by `decay` for every detector
+    pass that misses the object; frames without a detector pass only age
+    the track. The track is dropped after `max_age` frames without a
+    measurement or once its confidence falls below `min_conf`.
+    """
+
+    def __init__(self, min_conf, decay=0.9, max_age=15, process_noise=1.0, measurement_noise=4.0):
+        self.min_conf = min_conf
+        self.decay = decay
+        self.max_age = max_age
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.kf = None
+        self.conf = 0.0
+        self.misses = 0
+        self.age = 0
+
+    @property
+    def alive(self):
+        return (self.kf is not None and self.age <= self.max_age
+                and self.conf * (self.decay ** self.misses) >= self.min_conf)
+
+    def _step(self):
+        if self.kf is not None:
+            self.kf.predict()
+            self.age += 1
+
+    def _measure(self, x, y, conf):
+        if self.kf is None:
+            self.kf = KalmanPoint(x, y, self.process_noise, self.measurement_noise)
+        else:
+            self.kf.update(x, y)
+        self.conf = conf
+        self.misses = 0
+        self.age = 0
+
+    def position_ahead(self, ahead=0):
+        """
+        Predicted position `ahead` frames after the last step (constant velocity).
+        """
+        x, y, vx, vy = self.kf.x
+        return x + ahead * vx, y + ahead * vy
+
+    def reset(self):
+        self.kf = None
+        self.conf = 0.0
+        self.misses = 0
+        self.age = 0
+
+
+class BallTracker(_Track):
+
+    def step(self, balls, detected):
+        """
+        Advance one frame. balls: detections [(cx, cy, conf)] of this frame,
+        detected: whether the detector actually ran on it.
+        """
+        self._step()
+        if balls:
+            if self.kf is None:
+                cx, cy, conf = balls[0]
+            else:
+                px, py = self.kf.position
+                cx, cy, conf = min(balls, key=lambda b: (b[0] - px) ** 2 + (b[1] - py) ** 2)
+            self._measure(cx, cy, conf)
+        elif detected and self.kf is not None:
+            self.misses += 1
+        if self.kf is not None and not self.alive:
+            self.reset()
+
+    def estimate(self, ahead=0):
+        """
+        Predicted (cx, cy, conf) for the current frame (or `ahead` frames later), or None.
+        """
+        if not self.alive:
+            return None
+        x, y = self.position_ahead(ahead)
+        return int(round(x)), int(round(y)), float(self.conf * (self.decay ** self.misses))
+
+
+class BatTracker(_Track):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pts = None
+        self.centroid = None
+
+    def step(self, bats, detected):
+        """
+        Advance one frame. bats: detections [(pts, conf)] of this frame.
+        """
+        self._step()
+        if bats:
+            pts, conf = bats[0]
+            arr = np.asarray(pts, dtype=float)
+            cx, cy = float(arr[:, 0].mean()), float(arr[:, 1].mean())
+            self._measure(cx, cy, conf)
+            self.pts = pts
+            self.centroid = (cx, cy)
+        elif detected and self.kf is not None:
+            self.misses += 1
+        if self.kf is not None and not self.alive:
+            self.reset()
+
+    def reset(self):
+        super().reset()
+        self.pts = None
+        self.centroid = None
+
+    def estimate(self, ahead=0):
+        """
+        Last detected polygon moved to the predicted centroid: (pts, conf) or None.
+        """
+        if not self.alive or self.pts is None:
+            return None
+        x, y = self.position_ahead(ahead)
+        dx, dy = x - self.centroid[0], y - self.centroid[1]
+        pts = [[int(round(px + dx)), int(round(py + dy))] for px, py in self.pts]
+        return pts, float(self.conf * (self.decay ** self.misses))
@@ -0,0 +1,145 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from detection_cache import file_hash, remember_hash
+
+# -----------------------------------------------------
+# CONTENT-ADDRESSED UPLOAD STORE
+# Uploads are hashed while they stream to disk and kept once per content
+# as .store/<sha256><ext>. The names clients use (uploads/<name>) are hard
+# links to that blob, so re-uploading the same video under another name
+# costs no disk and no rehash, and a different video with a taken name
+# gets a suffixed name instead of overwriting it. names.json maps each
+# name to its hash.
+# -----------------------------------------------------
+
+STORE_DIR = ".store"
+CHUNK = 1 << 20
+
+
+class UploadStore:
+    def __init__(self, upload_folder):
+        self.upload_folder = upload_folder
+        self.store_dir = os.path.join(upload_folder, STORE_DIR)
+        self.index_path = os.path.join(self.store_dir, "names.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._names = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path) as f:
+                    self._names = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Could not read upload index ({e}); hashes will be recomputed")
+
+    def _save_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._names, f, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def blob_path(self, digest, ext):
+        return os.path.join(self.store_dir, digest + ext.lower())
+
+    def save(self, stream, filename):
+        """
+        Streams an upload into the store and links it under a free name.
+        Returns (name, sha256, deduplicated) where deduplicated means the
+        content was already stored.
+        """
+        h = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.store_dir, prefix="upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for block in iter(lambda: stream.read(CHUNK), b""):
+                    h.update(block)
+                    out.write(block)
+            digest = h.hexdigest()
+            name, deduplicated = self.adopt(tmp, filename, digest)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return name, digest, deduplicated
+
+    def adopt(self, tmp, filename, digest):
+        """
+        Moves a finished file (same filesystem, already hashed) into the store
+        and links it under a free name. Returns (name, deduplicated).
+        """
+        filename = os.path.basename(filename)
+        base, ext = os.path.splitext(filename)
+        blob = self.blob_path(digest, ext)
+        with self._lock:
+            deduplicated = os.path.exists(blob)
+            if deduplicated:
+                os.remove(tmp)
+            else:
+                os.replace(tmp, blob)
+            name = filename
+            if self._occupied(name, digest):
+                name = f"{base}_{digest[:8]}{ext}"
+            path = os.path.join(self.upload_folder, name)
+            if not os.path.exists(path):
+                self._link(blob, path)
+            self._names[name] = digest
+            self._save_index()
+        remember_hash(path, digest)
+        return name, deduplicated
+
+    def _occupied(self, name, digest):
+        """
+        True when uploads/<name> holds different content.
+        """
+        path = os.path.join(self.upload_folder, name)
+        if not os.path.exists(path):
+            return False
+        known = self._names.get(name)
+        if known is None:
+            known = file_hash(path)
+        return known != digest
+
+    def _link(self, blob, path):
+        try:
+            os.link(blob, path)
+        except OSError:
+            # no hard links on this filesystem: fall back to a copy
+            shutil.copyfile(blob, path)
+
+    def known_digest(self, name):
+        """
+        sha256 of uploads/<name> if the index has it, else None (never hashes).
+        """
+        with self._lock:
+            return self._names.get(os.path.basename(name))
+
+    def digest(self, name):
+        """
+        sha256 of uploads/<name> (from the index; hashed for files added outside the store).
+        """
+        name = os.path.basename(name)
+        with self._lock:
+            digest = self._names.get(name)
+        path = os.path.join(self.upload_folder, name)
+        if digest is None:
+            digest = file_hash(path)
+        remember_hash(path, digest)
+        return digest
+
+    def delete(self, name):
+        """
+        Removes uploads/<name>; the blob goes too once no other name links to it.
+        """
+        name = os.path.basename(name)
+        path = os.path.join(self.upload_folder, name)
+        with self._lock:
+            digest = self._names.pop(name, None)
+            os.remove(path)
+            if digest is not None:
+                self._save_index()
+                blob = self.blob_path(digest, os.path.splitext(name)[1])
+                if os.path.exists(blob) and os.stat(blob).st_nlink <= 1 and digest not in self._names.values():
+                    os.remove(blob)
@@ -178,7 +178,7 @@ class _VideosPageState extends State<VideosPage> {
 
   // ✅ Navigate + process video before showing Dashboard
   Future<void> _navigateToAnalytics(String videoId) async {
-    final String apiUrl = "$serverUrl/generatehighlight/$videoId";
+    final String apiUrl = "$serverUrl/generatehighlight/$videoId?wait=1";
 
     // Simulate log stream (backend live logs)
     final logStreamController = StreamController<String>();